@@ -0,0 +1,521 @@
+import math
+import numbers
+
+import torch
+import torch.nn.functional as F
+
+from ivadomed.keywords import TransformationKW
+
+
+def gaussian_smooth(data, sigma, truncate=4.0):
+    """Smooth each sample of a batch with a Gaussian filter of its own standard deviation.
+
+    As ``scipy.ndimage.gaussian_filter`` with ``mode="constant"``, the data is zero-padded. The spatial axes are
+    filtered one after the other with 1D kernels, all the samples at once with a grouped convolution.
+
+    Args:
+        data (Tensor): Batch, of shape (N, C, *spatial).
+        sigma (Tensor): Standard deviation of each sample, in voxels, of shape (N, ). 0 leaves the sample unchanged.
+        truncate (float): Radius of the kernels, in standard deviations.
+
+    Returns:
+        Tensor: Smoothed batch.
+    """
+    n, c = data.shape[:2]
+    sigma = sigma.to(device=data.device, dtype=data.dtype).reshape(-1, 1)
+    radii = torch.floor(truncate * sigma + 0.5)
+    radius = int(radii.max()) if n else 0
+    if radius == 0:
+        return data
+
+    x = torch.arange(-radius, radius + 1, device=data.device, dtype=data.dtype)
+    kernels = torch.exp(-0.5 * (x / sigma.clamp(min=1e-6)) ** 2) * (x.abs() <= radii)
+    kernels = kernels / kernels.sum(dim=1, keepdim=True)
+    weight = kernels.repeat_interleave(c, dim=0).unsqueeze(1)
+    for axis in range(2, data.dim()):
+        moved = data.movedim(axis, -1)
+        # The channels of the samples are the groups of the convolution, the other spatial axes its batch
+        lines = moved.reshape(n * c, -1, moved.shape[-1]).transpose(0, 1)
+        lines = F.conv1d(lines, weight, padding=radius, groups=n * c)
+        data = lines.transpose(0, 1).reshape(moved.shape).movedim(-1, axis)
+    return data
+
+
+def get_bspline_basis(size, spacing, phase):
+    """Get the cubic B-spline bases of the grids of control points of a batch along an axis, see
+    :func:`ivadomed.transforms.get_bspline_basis`.
+
+    The bases are padded to the largest number of control points with zero weights.
+
+    Args:
+        size (int): Number of voxels along the axis.
+        spacing (Tensor): Spacing of the control points of each sample, in voxels, of shape (N, ).
+        phase (Tensor): Shift of the grid of control points of each sample, in voxels, of shape (N, ).
+
+    Returns:
+        Tensor: Weight of each control point (last axis) for each voxel (second axis), of shape (N, size, n_points).
+    """
+    n_points = int(torch.ceil((size - 1 + phase) / spacing).max()) + 3
+    voxels = torch.arange(size, device=spacing.device, dtype=spacing.dtype).reshape(1, -1, 1)
+    points = torch.arange(n_points, device=spacing.device, dtype=spacing.dtype).reshape(1, 1, -1)
+    t = torch.abs((voxels + phase.reshape(-1, 1, 1)) / spacing.reshape(-1, 1, 1) - (points - 1))
+    return torch.where(t < 1, 2 / 3 - t ** 2 + t ** 3 / 2, torch.where(t < 2, (2 - t) ** 3 / 6, torch.zeros_like(t)))
+
+
+def get_control_grid_field(n, n_fields, shape, sigma, device):
+    """Draw smooth random fields from coarse grids of random control points, see
+    :func:`ivadomed.transforms.get_control_grid_field`.
+
+    The random phases of the grids, the B-spline bases and the control points are drawn and computed with torch, on
+    ``device``, for all the samples at once.
+
+    Args:
+        n (int): Number of samples.
+        n_fields (int): Number of fields of each sample.
+        shape (tuple): Spatial shape of the fields.
+        sigma (Tensor): Standard deviation of the equivalent Gaussian filter of each sample, in voxels, of shape (N, ).
+        device (torch.device): Device of the fields.
+
+    Returns:
+        Tensor: Fields, of shape (N, n_fields, *shape).
+    """
+    sigma = sigma.to(device=device, dtype=torch.float32).reshape(-1)
+    spacing = sigma.clamp(min=1e-6) * math.sqrt(3)
+    # Gaussian kernels of gaussian_smooth, whose statistics the fields match
+    radii = torch.floor(4.0 * sigma + 0.5).reshape(-1, 1)
+    radius = int(radii.max()) if n else 0
+    x = torch.arange(-radius, radius + 1, device=device, dtype=torch.float32)
+    kernels = torch.exp(-0.5 * (x / sigma.clamp(min=1e-6).reshape(-1, 1)) ** 2) * (x.abs() <= radii)
+    kernels = kernels / kernels.sum(dim=1, keepdim=True)
+
+    bases, std = [], torch.full((n, ), math.sqrt(1 / 3), device=device)
+    for size in shape:
+        if size == 1:
+            # Only the centre of the kernel is in the axis
+            bases.append(torch.ones(n, 1, 1, device=device))
+            std = std * kernels[:, radius]
+        else:
+            phase = torch.rand(n).to(device) * spacing
+            basis = get_bspline_basis(size, spacing, phase)
+            bases.append(basis)
+            std = std * torch.sqrt((kernels ** 2).sum(dim=1) / (basis ** 2).sum(dim=2).mean(dim=1))
+
+    field = torch.randn(n, n_fields, *[basis.shape[2] for basis in bases], device=device) * \
+        std.reshape(n, 1, *[1] * len(shape))
+    for axis, basis in enumerate(bases):
+        field = torch.einsum('nc...m,nim->nc...i', field.movedim(2 + axis, -1), basis).movedim(-1, 2 + axis)
+    return field
+
+
+def get_identity_coordinates(n, shape, device):
+    """Get the coordinates of the voxels of a batch.
+
+    Args:
+        n (int): Number of samples.
+        shape (tuple): Spatial shape of the samples.
+        device (torch.device): Device of the batch.
+
+    Returns:
+        Tensor: Coordinates along each spatial axis, of shape (N, len(shape), *shape).
+    """
+    coords = torch.stack(torch.meshgrid(*[torch.arange(size, device=device, dtype=torch.float32) for size in shape],
+                                        indexing='ij'))
+    return coords.unsqueeze(0).expand(n, *coords.shape)
+
+
+def resample(data, coords, padding_mode='zeros'):
+    """Linearly interpolate a batch at given coordinates with ``torch.nn.functional.grid_sample``.
+
+    Args:
+        data (Tensor): Batch, of shape (N, C, *spatial), with 2 or 3 spatial axes.
+        coords (Tensor): Coordinates in voxels along each spatial axis, of shape (N, n_spatial, *output_spatial).
+        padding_mode (str): Values of the coordinates out of the samples: "zeros", "border" or "reflection".
+
+    Returns:
+        Tensor: Interpolated batch, of shape (N, C, *output_spatial).
+    """
+    shape = torch.tensor(data.shape[2:], device=coords.device, dtype=coords.dtype)
+    shape = shape.reshape(1, -1, *[1] * (coords.dim() - 2))
+    # Normalized coordinates of the voxel centres, with the last spatial axis first as expected by grid_sample
+    grid = ((2 * coords + 1) / shape - 1).flip(1).movedim(1, -1)
+    return F.grid_sample(data, grid.to(data.dtype), mode='bilinear', padding_mode=padding_mode, align_corners=False)
+
+
+class BatchTransform(object):
+    """Base class for the transformations of batches."""
+
+    def __call__(self, data):
+        raise NotImplementedError("You need to implement the transform() method.")
+
+
+class BatchRandomAffine(BatchTransform):
+    """Apply a random affine transformation to each sample of a batch, as :class:`ivadomed.transforms.RandomAffine`.
+
+    Args:
+        degrees (float): Positive float or list (or tuple) of length two. Angles in degrees. If only a float is
+            provided, then rotation angle is selected within the range [-degrees, degrees]. Otherwise, the list / tuple
+            defines this range.
+        translate (list of float): List of floats between 0 and 1, of length 2 or 3. These floats defines the maximum
+            range of translation along each axis, as a fraction of the size of the axis.
+        scale (list of float): List of floats between 0 and 1, of length 2 or 3. These floats defines the maximum
+            range of scaling along each axis.
+
+    Attributes:
+        degrees (tuple of floats): Range of the rotation angle, in degrees.
+        translate (list of float): Maximum translation along each axis.
+        scale (list of float): Maximum scaling along each axis.
+        padding_mode (str): Values of the coordinates out of the samples, see :func:`resample`.
+    """
+
+    padding_mode = 'zeros'
+
+    def __init__(self, degrees=0, translate=None, scale=None):
+        if isinstance(degrees, numbers.Number):
+            if degrees < 0:
+                raise ValueError("If degrees is a single number, it must be positive.")
+            self.degrees = (-degrees, degrees)
+        else:
+            if not (isinstance(degrees, (tuple, list)) and len(degrees) == 2):
+                raise ValueError("degrees should be a list or tuple and it must be of length 2.")
+            self.degrees = tuple(degrees)
+
+        for name, values in [('scale', scale), ('translate', translate)]:
+            if values is not None and not (isinstance(values, (tuple, list)) and len(values) in [2, 3]
+                                           and all(0.0 <= v <= 1.0 for v in values)):
+                raise ValueError(f"{name} should be a list or tuple of length 2 or 3, of values between 0 and 1.")
+        self.scale = list(scale) + [0.0] * (3 - len(scale)) if scale is not None else [0.0] * 3
+        self.translate = list(translate) + [0.0] * (3 - len(translate)) if translate is not None else [0.0] * 3
+
+    def transform_coordinates(self, coords, n, shape, device):
+        """Map coordinates of the output of the transformation to the samples, drawing the parameters of each sample.
+
+        Args:
+            coords (Tensor): Coordinates, of shape (N, len(shape), *shape). None for the voxels of the output.
+            n (int): Number of samples.
+            shape (tuple): Spatial shape of the samples.
+            device (torch.device): Device of the batch.
+
+        Returns:
+            Tensor: Coordinates in the samples.
+        """
+        ndim = len(shape)
+        angle = torch.empty(n).uniform_(*self.degrees) * math.pi / 180
+        # Plane of the rotation, the last axis is not rotated if the samples are 2D slices
+        planes = [(0, 1), (0, 2), (1, 2)] if ndim == 3 and shape[2] > 1 else [(0, 1)]
+        plane = torch.tensor(planes)[torch.randint(len(planes), (n,))]
+        samples = torch.arange(n)
+        rotate = torch.eye(ndim).repeat(n, 1, 1)
+        i, j = plane[:, 0], plane[:, 1]
+        rotate[samples, i, i] = torch.cos(angle)
+        rotate[samples, j, j] = torch.cos(angle)
+        rotate[samples, i, j] = -torch.sin(angle)
+        rotate[samples, j, i] = torch.sin(angle)
+
+        scale = torch.tensor(self.scale[:ndim])
+        scale = 1 + (torch.rand(n, ndim) * 2 - 1) * scale
+        max_translation = torch.tensor(self.translate[:ndim]) * torch.tensor(shape, dtype=torch.float32)
+        translation = torch.round((torch.rand(n, ndim) * 2 - 1) * max_translation)
+
+        # input = scale^-1 @ rotate^T @ (output - centre) + centre + translation
+        matrix = (torch.diag_embed(1 / scale) @ rotate.transpose(1, 2)).to(device)
+        spatial = [1] * ndim
+        centre = ((torch.tensor(shape, dtype=torch.float32) - 1) / 2).to(device).reshape(1, ndim, *spatial)
+        translation = translation.to(device).reshape(n, ndim, *spatial)
+        if coords is None:
+            coords = get_identity_coordinates(n, shape, device)
+        return torch.einsum('nij,nj...->ni...', matrix, coords - centre) + centre + translation
+
+
+class BatchElasticTransform(BatchTransform):
+    """Apply a random elastic deformation to the samples of a batch, as :class:`ivadomed.transforms.ElasticTransform`.
+
+    Args:
+        alpha_range (tuple of floats): Deformation coefficient. Length equals 2.
+        sigma_range (tuple of floats): Standard deviation. Length equals 2.
+        p (float): Probability of deforming each sample.
+        control_grid (bool): If True, the displacement fields are interpolated from coarse grids of random control
+            points, see :func:`get_control_grid_field`.
+
+    Attributes:
+        alpha_range (tuple of floats): Deformation coefficient range.
+        sigma_range (tuple of floats): Standard deviation range.
+        p (float): Probability of deforming each sample.
+        control_grid (bool): If True, the displacement fields are interpolated from coarse grids of control points.
+        padding_mode (str): Values of the coordinates out of the samples, see :func:`resample`.
+    """
+
+    padding_mode = 'reflection'
+
+    def __init__(self, alpha_range, sigma_range, p=0.1, control_grid=False):
+        self.alpha_range = alpha_range
+        self.sigma_range = sigma_range
+        self.p = p
+        self.control_grid = control_grid
+
+    def transform_coordinates(self, coords, n, shape, device):
+        """Map coordinates of the output of the transformation to the samples, drawing the field of each sample.
+
+        Args:
+            coords (Tensor): Coordinates, of shape (N, len(shape), *shape). None for the voxels of the output.
+            n (int): Number of samples.
+            shape (tuple): Spatial shape of the samples.
+            device (torch.device): Device of the batch.
+
+        Returns:
+            Tensor: Coordinates in the samples, None if no sample is deformed and ``coords`` is None.
+        """
+        applied = torch.rand(n) < self.p
+        if not applied.any():
+            return coords
+        alpha = torch.empty(n).uniform_(*self.alpha_range) * applied
+        sigma = torch.empty(n).uniform_(*self.sigma_range)
+
+        ndim = len(shape)
+        if self.control_grid:
+            field = get_control_grid_field(n, ndim, shape, sigma, device)
+        else:
+            field = gaussian_smooth(torch.rand(n, ndim, *shape, device=device) * 2 - 1, sigma)
+        displacement = field * alpha.to(device).reshape(n, 1, *[1] * ndim)
+        if ndim == 3 and shape[2] == 1:
+            # No deformation along the last dimension
+            displacement[:, 2] = 0
+        if coords is None:
+            return get_identity_coordinates(n, shape, device) + displacement
+        # The displacement is defined on the voxels: it is interpolated at the coordinates
+        return coords + resample(displacement, coords, padding_mode='border')
+
+
+class BatchRandomGamma(BatchTransform):
+    """Randomly change the contrast of the samples of a batch, as :class:`ivadomed.transforms.RandomGamma`.
+
+    Args:
+        log_gamma_range (tuple of floats): Log gamma range for changing contrast. Length equals 2.
+        p (float): Probability of changing the contrast of each sample.
+    """
+
+    def __init__(self, log_gamma_range, p=0.5):
+        self.log_gamma_range = log_gamma_range
+        self.p = p
+
+    def __call__(self, data):
+        n = data.shape[0]
+        gamma = torch.exp(torch.empty(n).uniform_(*self.log_gamma_range))
+        gamma = torch.where(torch.rand(n) < self.p, gamma, torch.ones(n))
+        gamma = gamma.to(device=data.device, dtype=data.dtype).reshape(n, *[1] * (data.dim() - 1))
+        # Clip +/- inf values to the max/min of the dtype, as with NumPy
+        return torch.nan_to_num(torch.sign(data) * data.abs() ** gamma)
+
+
+class BatchAdditiveGaussianNoise(BatchTransform):
+    """Add Gaussian noise to the samples of a batch, as :class:`ivadomed.transforms.AdditiveGaussianNoise`.
+
+    Args:
+        mean (float): Gaussian noise mean.
+        std (float): Gaussian noise standard deviation.
+    """
+
+    def __init__(self, mean=0.0, std=0.01):
+        self.mean = mean
+        self.std = std
+
+    def __call__(self, data):
+        return data + torch.randn_like(data) * self.std + self.mean
+
+
+class BatchRandomBiasField(BatchTransform):
+    """Multiply the samples of a batch by a random MRI bias field, as :class:`ivadomed.transforms.RandomBiasField`.
+
+    As ``torchio.RandomBiasField``, the bias field is the exponential of a polynomial of the normalized coordinates,
+    whose coefficients are drawn in [-coefficients, coefficients].
+
+    Args:
+        coefficients (float): Maximum magnitude of polynomial coefficients, or range of the coefficients.
+        order (int): Order of the basis polynomial functions.
+        p (float): Probability of applying the bias field to each sample.
+    """
+
+    def __init__(self, coefficients, order, p=0.5):
+        if isinstance(coefficients, numbers.Number):
+            coefficients = (-coefficients, coefficients)
+        self.coefficients = tuple(coefficients)
+        self.order = order
+        self.p = p
+
+    def __call__(self, data):
+        n, shape = data.shape[0], data.shape[2:]
+        axes = [torch.linspace(-1, 1, size, device=data.device, dtype=data.dtype) if size > 1
+                else torch.zeros(1, device=data.device, dtype=data.dtype) for size in shape]
+        coords = torch.meshgrid(*axes, indexing='ij')
+
+        # Monomials of the coordinates up to the order
+        exponents = [[]]
+        for _ in shape:
+            exponents = [e + [k] for e in exponents for k in range(self.order + 1)]
+        monomials = torch.stack([math.prod(c ** k for c, k in zip(coords, exponent))
+                                 for exponent in exponents if sum(exponent) <= self.order])
+
+        applied = (torch.rand(n) < self.p).to(data.dtype)
+        coefficients = torch.empty(n, len(monomials)).uniform_(*self.coefficients) * applied.reshape(-1, 1)
+        log_field = torch.tensordot(coefficients.to(device=data.device, dtype=data.dtype), monomials, dims=1)
+        return data * torch.exp(log_field).unsqueeze(1)
+
+
+class BatchRandomBlur(BatchTransform):
+    """Apply a random Gaussian blur to the samples of a batch, as :class:`ivadomed.transforms.RandomBlur`.
+
+    Args:
+        sigma_range (tuple of floats): Standard deviation range for the gaussian filter.
+        p (float): Probability of blurring each sample.
+    """
+
+    def __init__(self, sigma_range, p=0.5):
+        self.sigma_range = sigma_range
+        self.p = p
+
+    def __call__(self, data):
+        n = data.shape[0]
+        sigma = torch.empty(n).uniform_(*self.sigma_range) * (torch.rand(n) < self.p)
+        return gaussian_smooth(data, sigma)
+
+
+class BatchNormalizeInstance(BatchTransform):
+    """Normalize the samples of a batch with their own mean and standard deviation, as
+    :class:`ivadomed.transforms.NormalizeInstance`.
+
+    As for the samples, the channels of 2D batches are normalized one by one, and those of 3D batches, stacked in one
+    array by the dataset, together.
+    """
+
+    def __call__(self, data):
+        dims = tuple(range(2 if data.dim() == 4 else 1, data.dim()))
+        mean = data.mean(dim=dims, keepdim=True)
+        std = data.std(dim=dims, unbiased=False, keepdim=True)
+        return (data - mean) / std
+
+
+# Batch transformation of each transformation of the configuration file that can be applied to batches
+BATCH_TRANSFORMS = {
+    "RandomAffine": BatchRandomAffine,
+    "ElasticTransform": BatchElasticTransform,
+    "RandomGamma": BatchRandomGamma,
+    "AdditiveGaussianNoise": BatchAdditiveGaussianNoise,
+    "RandomBiasField": BatchRandomBiasField,
+    "RandomBlur": BatchRandomBlur,
+    "NormalizeInstance": BatchNormalizeInstance,
+}
+
+# Transformations of the samples that can follow the batched transformations: NormalizeInstance is applied to the
+# batches after them, the preprocessing transformations and NumpyToTensor run when the samples are loaded anyway
+SAMPLE_TRANSFORMS_BEFORE_BATCH = [TransformationKW.RESAMPLE, TransformationKW.CENTERCROP, TransformationKW.ROICROP,
+                                  "NumpyToTensor"]
+
+
+class BatchCompose(object):
+    """Apply the transformations marked as ``batched`` in the configuration file to whole batches of tensors.
+
+    The transformations run as torch operations on the device of the batch, e.g. the GPU of the model, with random
+    parameters drawn for each sample. Consecutive spatial transformations (``RandomAffine`` and ``ElasticTransform``)
+    are composed into a single coordinate map, applied to the input and the ground truth with one interpolation
+    (``grid_sample``), with the padding of the first one. The spatial transformations are always applied to both, and
+    the intensity transformations to the types of ``applied_to``, as for the transformations of the samples.
+
+    The batched transformations run after the transformations of the samples, so they cannot be followed by another
+    transformation of the samples, which would then be applied before them, except ``NormalizeInstance``: it is applied
+    to the batches after the batched transformations, as in the configuration file.
+
+    Args:
+        dict_transforms (dict): Transformations of the configuration file, where the keys are the transform names and
+            the value their parameters. Only the transformations with ``"batched": true``, and ``NormalizeInstance``
+            after them, are used.
+        soft_gt (bool): If False, the ground truths are binarized after the transformations.
+
+    Attributes:
+        transforms (list): Transformations, in the order they are applied. Runs of spatial transformations are lists.
+        soft_gt (bool): If False, the ground truths are binarized after the transformations.
+    """
+
+    def __init__(self, dict_transforms, soft_gt=False):
+        self.transforms = []
+        self.soft_gt = soft_gt
+        is_after_batched = False
+        for name, parameters in dict_transforms.items():
+            if not parameters.get(TransformationKW.BATCHED) and \
+                    not (is_after_batched and name == TransformationKW.NORMALIZEINSTANCE):
+                if is_after_batched and name not in SAMPLE_TRANSFORMS_BEFORE_BATCH:
+                    raise ValueError(f"{name} transform cannot follow a batched transform: the batched transforms are "
+                                     f"applied to the training batches, after the transforms of the samples. Only "
+                                     f"{TransformationKW.NORMALIZEINSTANCE} can follow them, batch {name} or move it "
+                                     f"before them.")
+                continue
+            is_after_batched = True
+            if name not in BATCH_TRANSFORMS:
+                raise ValueError(f"{name} transform cannot be applied to batches, the batched transforms are "
+                                 f"{list(BATCH_TRANSFORMS)}.")
+            params_cur = {k: parameters[k] for k in parameters
+                          if k not in ["applied_to", "preprocessing", "dataset_type", TransformationKW.BATCHED]}
+            transform = BATCH_TRANSFORMS[name](**params_cur)
+            if hasattr(transform, 'transform_coordinates'):
+                if self.transforms and isinstance(self.transforms[-1], list):
+                    self.transforms[-1].append(transform)
+                else:
+                    self.transforms.append([transform])
+            else:
+                transform.applied_to = parameters.get("applied_to", ["im", "gt", "roi"])
+                self.transforms.append(transform)
+
+    def __len__(self):
+        return len(self.transforms)
+
+    def __call__(self, input_samples, gt_samples):
+        """Transform a batch.
+
+        Args:
+            input_samples (Tensor): Inputs, of shape (N, C, *spatial).
+            gt_samples (Tensor): Ground truths, of shape (N, n_labels, *spatial). Not transformed if their shape
+                differs from the inputs, e.g. for classification.
+
+        Returns:
+            Tensor, Tensor: Transformed inputs and ground truths.
+        """
+        n, shape = input_samples.shape[0], tuple(input_samples.shape[2:])
+        is_gt = torch.is_tensor(gt_samples) and tuple(gt_samples.shape[2:]) == shape \
+            and gt_samples.shape[0] == n
+        if is_gt:
+            gt_dtype = gt_samples.dtype
+            gt_samples = gt_samples.float()
+
+        for transform in self.transforms:
+            if isinstance(transform, list):
+                # The coordinates of the output are mapped through the last transformation first
+                coords = None
+                for spatial_transform in transform[::-1]:
+                    coords = spatial_transform.transform_coordinates(coords, n, shape, input_samples.device)
+                if coords is None:
+                    continue
+                input_samples = resample(input_samples, coords, transform[0].padding_mode)
+                if is_gt:
+                    gt_samples = resample(gt_samples, coords, transform[0].padding_mode)
+            else:
+                if "im" in transform.applied_to:
+                    input_samples = transform(input_samples)
+                if is_gt and "gt" in transform.applied_to:
+                    gt_samples = transform(gt_samples)
+
+        # Make sure the ground truths are binarized, as after the transformations of the samples
+        if is_gt and not self.soft_gt:
+            gt_samples = (gt_samples > 0.5).to(gt_dtype)
+        return input_samples, gt_samples
+
+
+def get_batch_transforms(dict_transforms, soft_gt=False):
+    """Get the transformations applied to the training batches, see :class:`BatchCompose`.
+
+    Args:
+        dict_transforms (dict): Training transformations of the configuration file.
+        soft_gt (bool): If False, the ground truths are binarized after the transformations.
+
+    Returns:
+        BatchCompose: Batch transformations, None if no transformation is batched.
+    """
+    batch_transforms = BatchCompose(dict_transforms, soft_gt=soft_gt)
+    return batch_transforms if len(batch_transforms) else None
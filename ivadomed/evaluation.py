@@ -43,15 +43,11 @@ def evaluate(bids_df, path_output, target_suffix, eval_params):
     # LIST PREDS
     subj_acq_lst = [f.name.split('_pred')[0] for f in path_preds.iterdir() if f.name.endswith('_pred.nii.gz')]
 
-    # Get all derivatives filenames
-    all_deriv = bids_df.get_deriv_fnames()
-
     # LOOP ACROSS PREDS
     for subj_acq in tqdm(subj_acq_lst, desc="Evaluation"):
         # Fnames of pred and ground-truth
         fname_pred = path_preds.joinpath(subj_acq + '_pred.nii.gz')
-        derivatives = bids_df.df[bids_df.df['filename']
-                          .str.contains('|'.join(bids_df.get_derivatives(subj_acq, all_deriv)))]['path'].to_list()
+        derivatives = bids_df.get_derivative_paths(subj_acq)
         # Ordering ground-truth the same as target_suffix
         fname_gt = [None] * len(target_suffix)
         for deriv in derivatives:
@@ -4,7 +4,9 @@ import onnxruntime
 import torch
 import imageio
 import joblib
-from typing import List
+import threading
+from collections import OrderedDict
+from typing import List, Union
 from pathlib import Path
 
 from loguru import logger
@@ -28,6 +30,109 @@ from ivadomed.keywords import ConfigKW, ModelParamsKW, ObjectDetectionParamsKW,
     ROIParamsKW, SliceFilterParamsKW, TrainingParamsKW, MetadataKW, OptionKW
 
 
+# Process-wide registry of loaded models / ONNX sessions, ordered from least to most recently used.
+# Keys are (resolved path, modification time in ns, device); values are (model, estimated size in bytes).
+_MODEL_CACHE = OrderedDict()
+_MODEL_CACHE_LOCK = threading.RLock()
+_MODEL_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def _get_model_size(model: Union[torch.nn.Module, onnxruntime.InferenceSession], model_path: Path) -> int:
+    """Estimate the memory footprint of a loaded model, in bytes.
+
+    For PyTorch models, the size of the parameters and buffers is used. For ONNX sessions, the size of the model file
+    is used as an approximation.
+    """
+    if isinstance(model, torch.nn.Module):
+        return sum(t.nelement() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+    return model_path.stat().st_size
+
+
+def set_model_cache_limit(max_bytes: int) -> None:
+    """Set the maximum memory used by the model registry.
+
+    Least recently used models are evicted until the registry fits within the new limit. A limit of 0 disables
+    caching: the registry is emptied, and :func:`get_cached_model` loads the model at each call without keeping it.
+
+    Args:
+        max_bytes (int): Maximum cumulated size of cached models, in bytes. Must be non-negative, 0 disables caching.
+    """
+    global _MODEL_CACHE_MAX_BYTES
+    if max_bytes < 0:
+        raise ValueError(f"Model cache limit must be non-negative, got {max_bytes}.")
+    with _MODEL_CACHE_LOCK:
+        _MODEL_CACHE_MAX_BYTES = max_bytes
+        _evict_models(0)
+
+
+def _evict_models(n_bytes_needed: int) -> None:
+    """Evict least recently used models until `n_bytes_needed` bytes can be added under the registry limit."""
+    cache_size = sum(size for _, size in _MODEL_CACHE.values())
+    while _MODEL_CACHE and cache_size + n_bytes_needed > _MODEL_CACHE_MAX_BYTES:
+        key, (_, size) = _MODEL_CACHE.popitem(last=False)
+        cache_size -= size
+        logger.debug(f"Evicting model from cache: {key[0]}")
+
+
+def clear_model_cache(model_path: str = None) -> None:
+    """Evict models from the process-wide model registry.
+
+    Args:
+        model_path (str): If provided, only the entries loaded from this file are evicted. Otherwise, the registry is
+            emptied.
+    """
+    with _MODEL_CACHE_LOCK:
+        if model_path is None:
+            _MODEL_CACHE.clear()
+            return
+        path = str(Path(model_path).resolve())
+        for key in [key for key in _MODEL_CACHE if key[0] == path]:
+            del _MODEL_CACHE[key]
+
+
+def get_cached_model(model_path: str, device: torch.device = None) -> Union[torch.nn.Module,
+                                                                             onnxruntime.InferenceSession]:
+    """Return a warm model from the process-wide registry, loading it if needed.
+
+    Entries are keyed by the model path, its modification time and the device, so that a model file overwritten on disk
+    (e.g. ``best_model.pt`` during training) is reloaded. The registry is bounded by a memory limit (see
+    :func:`set_model_cache_limit`) and evicts the least recently used models first.
+
+    Args:
+        model_path (str): Path to a PyTorch (``.pt``) or ONNX model.
+        device (torch.device): Device on which the PyTorch model is mapped. Ignored for ONNX models.
+
+    Returns:
+        torch.nn.Module or onnxruntime.InferenceSession: Loaded model.
+    """
+    path = Path(model_path).resolve()
+    is_pytorch = path.suffix.lower() == '.pt'
+    key = (str(path), path.stat().st_mtime_ns, str(device) if is_pytorch else None)
+
+    with _MODEL_CACHE_LOCK:
+        if key in _MODEL_CACHE:
+            _MODEL_CACHE.move_to_end(key)
+            return _MODEL_CACHE[key][0]
+
+        # Drop stale entries of the same file, they will never be hit again
+        for stale_key in [k for k in _MODEL_CACHE if k[0] == key[0] and k[1] != key[1]]:
+            del _MODEL_CACHE[stale_key]
+
+        logger.debug(f"Loading model from: {path}")
+        if is_pytorch:
+            model = torch.load(str(path), map_location=device)
+        else:
+            model = onnxruntime.InferenceSession(str(path))
+
+        size = _get_model_size(model, path)
+        if _MODEL_CACHE_MAX_BYTES and size <= _MODEL_CACHE_MAX_BYTES:
+            _evict_models(size)
+            _MODEL_CACHE[key] = (model, size)
+        else:
+            logger.debug(f"Model {path} exceeds the model cache limit, it will not be cached.")
+        return model
+
+
 def onnx_inference(model_path: str, inputs: tensor) -> tensor:
     """Run ONNX inference
 
@@ -39,7 +144,7 @@ def onnx_inference(model_path: str, inputs: tensor) -> tensor:
         Tensor: Network output.
     """
     inputs = np.array(inputs.cpu())
-    ort_session = onnxruntime.InferenceSession(model_path)
+    ort_session = get_cached_model(model_path)
     ort_inputs = {ort_session.get_inputs()[0].name: inputs}
     ort_outs = ort_session.run(None, ort_inputs)
     return torch.tensor(ort_outs[0])
@@ -69,8 +174,7 @@ def get_preds(context: dict, fname_model: str, model_params: dict, gpu_id: int,
         # Load the PyTorch model and evaluate if model files exist.
         if fname_model.lower().endswith('.pt'):
             logger.debug(f"PyTorch model detected at: {fname_model}")
-            logger.debug(f"Loading model from: {fname_model}")
-            model = torch.load(fname_model, map_location=device)
+            model = get_cached_model(fname_model, device)
             # Inference time
             logger.debug(f"Evaluating model: {fname_model}")
             model.eval()
@@ -322,7 +426,8 @@ def segment_volume(folder_model: str, fname_images: list, gpu_id: int = 0, optio
     """Segment an image.
 
     Segment an image (`fname_image`) using a pre-trained model (`folder_model`). If provided, a region of interest
-    (`fname_roi`) is used to crop the image prior to segment it.
+    (`fname_roi`) is used to crop the image prior to segment it. The model is kept warm in the process-wide model
+    registry (see :func:`get_cached_model`), so that successive calls with the same model do not reload it.
 
     Args:
         folder_model (str): foldername which contains
@@ -463,7 +568,9 @@ def segment_volume(folder_model: str, fname_images: list, gpu_id: int = 0, optio
     data_loader = DataLoader(ds, batch_size=context[ConfigKW.TRAINING_PARAMETERS][TrainingParamsKW.BATCH_SIZE],
                              shuffle=False, pin_memory=True,
                              collate_fn=imed_loader_utils.imed_collate,
-                             num_workers=0)
+                             **imed_loader_utils.get_dataloader_worker_params(
+                                 context[ConfigKW.TRAINING_PARAMETERS].get(TrainingParamsKW.NUM_WORKERS),
+                                 persistent_workers=False))
 
     # Loop across batches
     preds_list, slice_idx_list = [], []
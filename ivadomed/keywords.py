@@ -53,6 +53,29 @@ class LoaderParamsKW:
     IS_INPUT_DROPOUT: str = "is_input_dropout"
     SLICE_FILTER_PARAMS: str = "slice_filter_params"
     SUBJECT_SELECTION: str = "subject_selection"
+    N_JOBS: str = "n_jobs"
+    BIDS_INDEX_DIR: str = "bids_index_dir"
+    PREPROCESSING_CACHE_DIR: str = "preprocessing_cache_dir"
+    PREPROCESSING_CACHE_SIZE_GB: str = "preprocessing_cache_size_GB"
+    PATCH_SAMPLING_PARAMS: str = "patch_sampling_params"
+    STREAMING_PARAMS: str = "streaming_params"
+    BACKGROUND_LOADING: str = "background_loading"
+    COMPOSE_GEOMETRY: str = "compose_geometry"
+    TRANSFORM_TIMING: str = "transform_timing"
+    SOFT_GT: str = "soft_gt"
+
+
+@dataclass
+class PatchSamplingParamsKW:
+    RANDOM: str = "random"
+    FOREGROUND_RATIO: str = "foreground_ratio"
+    N_PATCHES: str = "n_patches"
+
+
+@dataclass
+class StreamingParamsKW:
+    APPLIED: str = "applied"
+    SHUFFLE_BUFFER_SIZE: str = "shuffle_buffer_size"
 
 
 @dataclass
@@ -76,6 +99,8 @@ class DataTestingKW:
 class TrainingParamsKW:
     BALANCE_SAMPLES: str = "balance_samples"
     BATCH_SIZE: str = "batch_size"
+    NUM_WORKERS: str = "num_workers"
+    BUCKET_BY_SHAPE: str = "bucket_by_shape"
 
 
 @dataclass
@@ -83,6 +108,8 @@ class TransformationKW:
     ROICROP: str = "ROICrop"
     CENTERCROP: str = "CenterCrop"
     RESAMPLE: str = "Resample"
+    NORMALIZEINSTANCE: str = "NormalizeInstance"
+    BATCHED: str = "batched"
 
 
 @dataclass
@@ -190,6 +217,8 @@ class MetadataKW:
     REVERSE: str = "reverse"
     OFFSET: str = "offset"
     ELASTIC: str = "elastic"
+    COMPOSED_GEOMETRY: str = "composed_geometry"
+    TRANSFORM_TIMINGS: str = "transform_timings"
     GAUSSIAN_NOISE: str = "gaussian_noise"
     GAMMA: str = "gamma"
     BIAS_FIELD: str = "bias_field"
@@ -199,6 +228,7 @@ class MetadataKW:
     MISSING_MOD: str = "missing_mod"
     METADATA_DICT: str = "metadata_dict"
     INDEX_SHAPE: str = "index_shape"
+    DATA_SCALING: str = "data_scaling"
     GT_METADATA: str = "gt_metadata"
     GT_FILENAMES: str = "gt_filenames"
     INPUT_METADATA: str = "input_metadata"
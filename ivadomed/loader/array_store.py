@@ -0,0 +1,201 @@
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# Alignment of the arrays in the store file, in bytes, so that memory-mapped arrays are aligned for any dtype
+ALIGNMENT = 64
+
+# Default size of the compressed chunks, in bytes
+CHUNK_BYTES = 2 ** 20
+
+
+class ArrayRef(object):
+    """Reference to an array written in an :class:`ArrayStore`.
+
+    Args:
+        key (int): Index of the array in the store.
+    """
+    __slots__ = ['key']
+
+    def __init__(self, key):
+        self.key = key
+
+    def __getstate__(self):
+        return self.key
+
+    def __setstate__(self, state):
+        self.key = state
+
+    def __repr__(self):
+        return f"ArrayRef({self.key})"
+
+
+class ArrayStore(object):
+    """Store of numpy arrays in a single file, used as disk cache by the datasets.
+
+    The arrays are appended to one file and located with an in-memory index of offsets, shapes and dtypes. Without
+    compression, arrays are read through a read-only memory map of the file: reading a region of an array only
+    copies the corresponding bytes, and the returned arrays can be modified without altering the store. With
+    compression, arrays are split along their first axis in zlib-compressed chunks, and only the chunks overlapping
+    the requested region are decompressed.
+
+    The store can be pickled (e.g. to DataLoader workers): the file is reopened lazily by each process.
+
+    Args:
+        path (str): Filename of the store, created if it does not exist.
+        compress (bool): If True, arrays are compressed.
+        chunk_bytes (int): Approximate size of the uncompressed chunks, in bytes. Only used with compression.
+
+    Attributes:
+        path (Path): Filename of the store.
+        compress (bool): If True, arrays are compressed.
+        chunk_bytes (int): Approximate size of the uncompressed chunks, in bytes.
+        index (list): For each array, tuple (shape, dtype, chunks), where chunks is a list of (offset, number of bytes,
+            number of rows along the first axis) tuples.
+    """
+
+    def __init__(self, path, compress=False, chunk_bytes=CHUNK_BYTES):
+        self.path = Path(path)
+        self.compress = compress
+        self.chunk_bytes = chunk_bytes
+        self.index = []
+        self.path.touch()
+        self._size = self.path.stat().st_size
+        self._file = None
+        self._mmap = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_mmap'] = None
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+    def _write(self, data):
+        """Append bytes at an aligned offset and return the offset."""
+        if self._file is None:
+            self._file = self.path.open(mode="ab")
+        padding = -self._size % ALIGNMENT
+        if padding:
+            self._file.write(b"\0" * padding)
+        offset = self._size + padding
+        self._file.write(data)
+        self._size = offset + len(data)
+        # The memory map no longer covers the whole file
+        self._mmap = None
+        return offset
+
+    def put(self, array):
+        """Append an array to the store.
+
+        Args:
+            array (ndarray): Array to store.
+
+        Returns:
+            ArrayRef: Reference to the stored array.
+        """
+        array = np.asarray(array, order="C")
+        if self.compress and array.ndim:
+            rows = max(self.chunk_bytes // max(array[0].nbytes, 1), 1)
+            chunks = []
+            for start in range(0, len(array), rows):
+                data = zlib.compress(array[start:start + rows].tobytes(), 1)
+                chunks.append((self._write(data), len(data), len(array[start:start + rows])))
+        else:
+            chunks = [(self._write(array.tobytes()), array.nbytes, len(array) if array.ndim else 1)]
+        self.index.append((array.shape, array.dtype.str, chunks))
+        return ArrayRef(len(self.index) - 1)
+
+    def get(self, ref, region=None):
+        """Read an array, or a region of it.
+
+        Args:
+            ref (ArrayRef): Reference returned by :meth:`put`.
+            region (tuple): Slices of the region to read, one per axis. If None, the whole array is read.
+
+        Returns:
+            ndarray: Array, writable.
+        """
+        shape, dtype, chunks = self.index[ref.key]
+        dtype = np.dtype(dtype)
+        region = tuple(region) if region is not None else ()
+        mmap = self._get_mmap()
+        if not self.compress or not shape:
+            offset, n_bytes, _ = chunks[0]
+            return np.array(mmap[offset:offset + n_bytes].view(dtype).reshape(shape)[region])
+
+        # Decompress only the chunks overlapping the region along the first axis
+        start, stop, _ = region[0].indices(shape[0]) if region else (0, shape[0], 1)
+        parts, first_row, row = [], 0, 0
+        for offset, n_bytes, n_rows in chunks:
+            if row + n_rows <= start:
+                first_row = row + n_rows
+            elif row < stop:
+                data = zlib.decompress(mmap[offset:offset + n_bytes])
+                parts.append(np.frombuffer(data, dtype=dtype).reshape((n_rows,) + shape[1:]))
+            row += n_rows
+        array = np.concatenate(parts) if parts else np.empty((0,) + shape[1:], dtype=dtype)
+        if region:
+            region = (slice(start - first_row, stop - first_row, region[0].step),) + region[1:]
+        return array[region]
+
+    def _get_mmap(self):
+        if self._file is not None:
+            self._file.flush()
+        if self._mmap is None:
+            if not self._size:
+                return np.empty(0, dtype=np.uint8)
+            self._mmap = np.memmap(self.path, dtype=np.uint8, mode="r", shape=(self._size,))
+        return self._mmap
+
+    def dump(self, obj, memo=None):
+        """Write the arrays of a nested structure of dicts, lists and tuples in the store.
+
+        An array found several times in the structure, e.g. the inputs shared by a seg_pair and its roi_pair, is
+        written once and all its occurrences refer to it.
+
+        Args:
+            obj: Structure containing arrays, e.g. a seg_pair dict.
+            memo (dict): References of the arrays already written, by array id. Used by the recursive calls.
+
+        Returns:
+            Same structure where the arrays are replaced by :class:`ArrayRef`. Other objects (e.g. metadata) are kept.
+        """
+        if memo is None:
+            memo = {}
+        if isinstance(obj, np.ndarray):
+            if id(obj) not in memo:
+                memo[id(obj)] = self.put(obj)
+            return memo[id(obj)]
+        if isinstance(obj, dict):
+            return {key: self.dump(value, memo) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.dump(value, memo) for value in obj)
+        return obj
+
+    def load(self, obj, region=None):
+        """Read the arrays of a structure returned by :meth:`dump`.
+
+        Args:
+            obj: Structure returned by :meth:`dump`.
+            region (tuple): Slices of the region to read in each array. If None, the whole arrays are read.
+
+        Returns:
+            Same structure where the :class:`ArrayRef` are replaced by the arrays. The other objects are not copied.
+        """
+        if isinstance(obj, ArrayRef):
+            return self.get(obj, region)
+        if isinstance(obj, dict):
+            return {key: self.load(value, region) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.load(value, region) for value in obj)
+        return obj
+
+    def close(self):
+        """Close the store file. The store can still be read."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -6,6 +6,10 @@ class BalancedSampler(torch.utils.data.sampler.Sampler):
     """Estimate sampling weights in order to rebalance the
     class distributions from an imbalanced dataset.
 
+    The label of each element is read once. Datasets implementing ``get_sample_label`` (e.g.
+    ``MRI2DSegmentationDataset``) return labels computed when the dataset is loaded, without loading the elements nor
+    applying their transformations. For other datasets, each element is loaded.
+
     Args:
         dataset (BidsDataset): Dataset containing input, gt and metadata.
         metadata (str): Indicates which metadata to use to balance the sampler.
@@ -26,16 +30,15 @@ class BalancedSampler(torch.utils.data.sampler.Sampler):
         self.metadata_dict = {}
         self.label_idx = 0
 
+        labels = [self._get_label(dataset, idx, metadata) for idx in self.indices]
         cmpt_label = {}
-        for idx in self.indices:
-            label = self._get_label(dataset, idx, metadata)
+        for label in labels:
             if label in cmpt_label:
                 cmpt_label[label] += 1
             else:
                 cmpt_label[label] = 1
 
-        weights = [1.0 / cmpt_label[self._get_label(dataset, idx, metadata)]
-                   for idx in self.indices]
+        weights = [1.0 / cmpt_label[label] for label in labels]
 
         self.weights = torch.DoubleTensor(weights)
 
@@ -45,17 +48,24 @@ class BalancedSampler(torch.utils.data.sampler.Sampler):
         Args:
             dataset (BidsDataset): Dataset containing input, gt and metadata.
             idx (int): Element index.
+            metadata (str): Indicates which metadata to use to balance the sampler.
 
         Returns:
             int: 0 or 1.
         """
         if metadata != 'gt':
-            label_str = dataset[idx]['input_metadata'][0][metadata]
+            if hasattr(dataset, 'get_sample_label'):
+                label_str = dataset.get_sample_label(idx, metadata)
+            else:
+                label_str = dataset[idx]['input_metadata'][0][metadata]
             if label_str not in self.metadata_dict:
                 self.metadata_dict[label_str] = self.label_idx
                 self.label_idx += 1
             return self.metadata_dict[label_str]
 
+        elif hasattr(dataset, 'get_sample_label'):
+            return dataset.get_sample_label(idx, metadata)
+
         else:
             # For now, only supported with single label
             sample_gt = np.array(dataset[idx]['gt'][0])
@@ -69,4 +79,4 @@ class BalancedSampler(torch.utils.data.sampler.Sampler):
             self.weights, self.nb_samples, replacement=True))
 
     def __len__(self):
-        return self.num_samples
+        return self.nb_samples
@@ -22,12 +22,19 @@ class Bids3DDataset(MRI3DSubVolumeSegmentationDataset):
             contrast is processed individually (ie different sample / tensor).
         object_detection_params (dict): Object dection parameters.
         is_input_dropout (bool): Return input with missing modalities.
+        n_jobs (int): Number of processes used to load the subjects. -1 uses all the available CPUs.
+        preprocessing_cache (PreprocessingCache): Cache of the preprocessed subjects shared across runs. If None,
+            subjects are preprocessed at each run.
+        patch_sampling_params (dict): Random patch sampling parameters, see :class:`RandomPatchSampler`. If None, the
+            subvolumes of the stride grid are used.
+        load (bool): If False, the subjects are not loaded, e.g. when the dataset is streamed.
     """
 
     def __init__(self, bids_df, subject_file_lst, target_suffix, model_params, contrast_params, slice_axis=2,
                  cache=True, transform=None, metadata_choice=False, roi_params=None,
                  multichannel=False, object_detection_params=None, task="segmentation", soft_gt=False,
-                 is_input_dropout=False):
+                 is_input_dropout=False, n_jobs=1, preprocessing_cache=None,
+                 patch_sampling_params=None, load=True):
         dataset = BidsDataset(bids_df=bids_df,
                               subject_file_lst=subject_file_lst,
                               target_suffix=target_suffix,
@@ -44,4 +51,6 @@ class Bids3DDataset(MRI3DSubVolumeSegmentationDataset):
         super().__init__(dataset.filename_pairs, length=model_params[ModelParamsKW.LENGTH_3D],
                          stride=model_params[ModelParamsKW.STRIDE_3D],
                          transform=transform, slice_axis=slice_axis, task=task, soft_gt=soft_gt,
-                         is_input_dropout=is_input_dropout)
+                         is_input_dropout=is_input_dropout, n_jobs=n_jobs,
+                         preprocessing_cache=preprocessing_cache,
+                         patch_sampling_params=patch_sampling_params, load=load)
@@ -1,12 +1,15 @@
 import copy
 import itertools
 import os
+import tempfile
 
 import bids as pybids
 import pandas as pd
 from loguru import logger
 from pathlib import Path
 
+from ivadomed.loader import bids_index as imed_bids_index
+
 
 class BidsDataframe:
     """
@@ -28,7 +31,11 @@ class BidsDataframe:
         contrast_lst (list of str): List of the contrasts of interest.
         derivatives (bool): If True, derivatives are indexed.
         split_method (str): split_method from Split Dataset parameters
+        bids_index_dir (str): Folder where the index of each dataset is persisted. If None, datasets are indexed at each
+            run.
         df (pd.DataFrame): Dataframe containing dataset information
+        deriv_index (dict): Rows of the derivative files in ``df``, keyed by the filename prefixes of their source
+            files, see :meth:`index_derivatives`.
     """
 
     def __init__(self, loader_params: dict, path_output: str, derivatives: bool, split_method: str = None):
@@ -54,6 +61,9 @@ class BidsDataframe:
 
         self.bids_validate = loader_params.get('bids_validate', True)
 
+        # Persisted index folder from loader parameters
+        self.bids_index_dir = loader_params.get('bids_index_dir')
+
         # extensions from loader parameters
         self.extensions = loader_params['extensions'] if loader_params['extensions'] else [".nii", ".nii.gz"]
 
@@ -69,6 +79,7 @@ class BidsDataframe:
 
         # Create dataframe
         self.df = pd.DataFrame()
+        self.deriv_index = {}
         self.create_bids_dataframe()
 
         # Save dataframe as csv file
@@ -80,45 +91,13 @@ class BidsDataframe:
         for path_data in self.paths_data:
             path_data = Path(path_data, '')
 
-            # Initialize BIDSLayoutIndexer and BIDSLayout
-            # validate=True by default for both indexer and layout, BIDS-validator is not skipped
-            # Force index for samples tsv and json files, and for subject subfolders containing microscopy files based on extensions.
-            # Force index of subject subfolders containing CT-scan files under "anat" or "ct" folder based on extensions and modality suffix.
-            # TODO: remove force indexing of microscopy files after Microscopy-BIDS is integrated in pybids
-            # TODO: remove force indexing of CT-scan files after BEP CT-scan is merged in BIDS
-            ext_microscopy = ('.png', '.tif', '.ome.tif', '.ome.btf')
-            ext_ct = ('.nii.gz', '.nii')
-            suffix_ct = ('ct', 'CT')
-            force_index = []
-            for path_object in path_data.glob('**/*'):
-                if path_object.is_file():
-                    # Microscopy
-                    subject_path_index = len(path_data.parts)
-                    subject_path = path_object.parts[subject_path_index]
-                    if path_object.name == "samples.tsv" or path_object.name == "samples.json":
-                        force_index.append(path_object.name)
-                    if (path_object.name.endswith(ext_microscopy) and path_object.parent.name == "micr" and
-                        subject_path.startswith('sub')):
-                        force_index.append(str(Path(*path_object.parent.parts[subject_path_index:])))
-                    # CT-scan
-                    if (path_object.name.endswith(ext_ct) and path_object.name.split('.')[0].endswith(suffix_ct) and
-                            (path_object.parent.name == "anat" or path_object.parent.name == "ct") and
-                            subject_path.startswith('sub')):
-                        force_index.append(str(Path(*path_object.parent.parts[subject_path_index:])))
-            indexer = pybids.BIDSLayoutIndexer(force_index=force_index, validate=self.bids_validate)
-
             if self.derivatives:
                 self.write_derivatives_dataset_description(path_data)
 
-            layout = pybids.BIDSLayout(str(path_data), config=self.bids_config, indexer=indexer,
-                                       derivatives=self.derivatives)
-
-            # Transform layout to dataframe with all entities and json metadata
-            # As per pybids, derivatives don't include parsed entities, only the "path" column
-            df_next = layout.to_df(metadata=True)
-
-            # Add filename column
-            df_next.insert(1, 'filename', df_next['path'].apply(os.path.basename))
+            # Single crawl of the dataset, used for the fingerprint, the forced indexing and the scans.tsv files
+            files = imed_bids_index.list_files(path_data)
+            tables = self.get_index_tables(path_data, files)
+            df_next = tables['df']
 
             # Drop rows with json, tsv and LICENSE files in case no extensions are provided in config file for filtering
             df_next = df_next[~df_next['filename'].str.endswith(tuple(['.json', '.tsv', 'LICENSE']))]
@@ -141,7 +120,8 @@ class BidsDataframe:
                 logger.warning(f"No subject files were found in '{path_data}' dataset. Skipping dataset.")
             else:
                 # Add tsv files metadata to dataframe
-                df_next = self.add_tsv_metadata(df_next, path_data, layout)
+                scans_files = [rel_path for rel_path, _, _ in files if rel_path.endswith("scans.tsv")]
+                df_next = self.add_tsv_metadata(df_next, path_data, tables, scans_files)
 
                 # TODO: check if other files are needed for EEG and DWI
 
@@ -182,8 +162,7 @@ class BidsDataframe:
 
             # Filter dataframe to keep subjects files with available derivatives only
             if has_deriv:
-                self.df = self.df[self.df['filename'].str.contains('|'.join(has_deriv))
-                                  | self.df['filename'].str.contains('|'.join(deriv))]
+                self.df = self.df[self.df['filename'].isin(has_deriv) | self.df['filename'].isin(deriv)]
             else:
                 # Raise error and exit if no derivatives are found for any subject files
                 raise RuntimeError("Derivatives not found.")
@@ -194,13 +173,175 @@ class BidsDataframe:
         # Drop columns with all null values
         self.df.dropna(axis=1, inplace=True, how='all')
 
-    def add_tsv_metadata(self, df: pd.DataFrame, path_data: str, layout: pybids.BIDSLayout):
+        # Index the derivatives of the final dataframe
+        self.index_derivatives()
+
+    def get_force_index(self, files: list):
+        """Get the paths to force in the pybids index.
+
+        Force index for samples tsv and json files, and for subject subfolders containing microscopy files based on
+        extensions. Force index of subject subfolders containing CT-scan files under "anat" or "ct" folder based on
+        extensions and modality suffix.
+        TODO: remove force indexing of microscopy files after Microscopy-BIDS is integrated in pybids
+        TODO: remove force indexing of CT-scan files after BEP CT-scan is merged in BIDS
+
+        Args:
+            files (list): Files of the dataset, see :func:`ivadomed.loader.bids_index.list_files`.
+
+        Returns:
+            list: Paths to force in the index.
+        """
+        ext_microscopy = ('.png', '.tif', '.ome.tif', '.ome.btf')
+        ext_ct = ('.nii.gz', '.nii')
+        suffix_ct = ('ct', 'CT')
+        force_index = []
+        for rel_path, _, _ in files:
+            path_object = Path(rel_path)
+            # Microscopy
+            subject_path = path_object.parts[0]
+            if path_object.name == "samples.tsv" or path_object.name == "samples.json":
+                force_index.append(path_object.name)
+            if (path_object.name.endswith(ext_microscopy) and path_object.parent.name == "micr" and
+                    subject_path.startswith('sub')):
+                force_index.append(str(path_object.parent))
+            # CT-scan
+            if (path_object.name.endswith(ext_ct) and path_object.name.split('.')[0].endswith(suffix_ct) and
+                    (path_object.parent.name == "anat" or path_object.parent.name == "ct") and
+                    subject_path.startswith('sub')):
+                force_index.append(str(path_object.parent))
+        return force_index
+
+    def index_dataset(self, path_data: str, files: list):
+        """Index a dataset with pybids.
+
+        Args:
+            path_data (str): Path to the BIDS dataset.
+            files (list): Files of the dataset, see :func:`ivadomed.loader.bids_index.list_files`.
+
+        Returns:
+            dict: Indexed tables of the dataset: "df" (all files and their entities and json metadata), "participants"
+                and "sessions" (tsv metadata, None if absent) and "root" (dataset root used in the "path" column).
+        """
+        # Initialize BIDSLayoutIndexer and BIDSLayout
+        # validate=True by default for both indexer and layout, BIDS-validator is not skipped
+        indexer = pybids.BIDSLayoutIndexer(force_index=self.get_force_index(files), validate=self.bids_validate)
+        layout = pybids.BIDSLayout(str(path_data), config=self.bids_config, indexer=indexer,
+                                   derivatives=self.derivatives)
+
+        # Transform layout to dataframe with all entities and json metadata
+        # As per pybids, derivatives don't include parsed entities, only the "path" column
+        df = layout.to_df(metadata=True)
+
+        # Add filename column
+        df.insert(1, 'filename', df['path'].apply(os.path.basename))
+
+        # Metadata from 'participants.tsv' and all _sessions.tsv files, if present
+        # Uses pybids function
+        df_participants, df_sessions = None, None
+        if layout.get_collections(level='dataset'):
+            df_participants = layout.get_collections(level='dataset', merge=True).to_df()
+            df_participants.insert(1, 'participant_id', "sub-" + df_participants['subject'])
+            df_participants.drop(['suffix'], axis=1, inplace=True)
+        if layout.get_collections(level='subject'):
+            df_sessions = layout.get_collections(level='subject', merge=True).to_df()
+            df_sessions.drop(['suffix'], axis=1, inplace=True)
+
+        return {'df': df, 'participants': df_participants, 'sessions': df_sessions, 'root': str(layout.root)}
+
+    def index_subjects(self, path_data: str, files: list, subjects: set, tables: dict):
+        """Update the indexed tables of a dataset for a subset of subjects.
+
+        The dataset-level files and the files of the given subjects are linked in a temporary dataset, which is indexed
+        with pybids. Its rows replace the rows of these subjects in ``tables``.
+
+        Args:
+            path_data (str): Path to the BIDS dataset.
+            files (list): Files of the dataset, see :func:`ivadomed.loader.bids_index.list_files`.
+            subjects (set): Subject folder names (e.g. "sub-01") to re-index.
+            tables (dict): Indexed tables of the dataset, see :meth:`index_dataset`.
+
+        Returns:
+            dict: Updated indexed tables.
+        """
+        files_subset = [f for f in files if imed_bids_index.get_subject_group(f[0]) in
+                        subjects | {imed_bids_index.DATASET_GROUP}]
+        with tempfile.TemporaryDirectory(prefix="ivadomed_") as path_tmp:
+            for rel_path, _, _ in files_subset:
+                path_link = Path(path_tmp, rel_path)
+                path_link.parent.mkdir(parents=True, exist_ok=True)
+                os.symlink(Path(path_data, rel_path).absolute(), path_link)
+            tables_subset = self.index_dataset(path_tmp, files_subset)
+
+        # Update the paths from the temporary dataset to the dataset
+        df_subset = tables_subset['df']
+        df_subset['path'] = df_subset['path'].apply(
+            lambda x: tables['root'] + x[len(tables_subset['root']):] if x.startswith(tables_subset['root']) else x)
+        is_updated = df_subset['path'].apply(
+            lambda x: imed_bids_index.get_subject_group(Path(x).relative_to(tables['root']).as_posix()) in subjects)
+        is_kept = ~tables['df']['path'].apply(
+            lambda x: imed_bids_index.get_subject_group(Path(x).relative_to(tables['root']).as_posix()) in subjects)
+        df = pd.concat([tables['df'][is_kept], df_subset[is_updated]], ignore_index=True)
+        df = df.sort_values('path', kind='stable').reset_index(drop=True)
+
+        df_sessions = tables['sessions']
+        if df_sessions is not None:
+            df_sessions = df_sessions[~("sub-" + df_sessions['subject']).isin(subjects)]
+        if tables_subset['sessions'] is not None:
+            df_sessions = pd.concat([df_sessions, tables_subset['sessions']], ignore_index=True)
+
+        return {'df': df, 'participants': tables['participants'], 'sessions': df_sessions, 'root': tables['root']}
+
+    def get_index_tables(self, path_data: str, files: list):
+        """Get the indexed tables of a dataset, from the persisted index when it is up to date.
+
+        The persisted index is keyed by a fingerprint of the paths, sizes and modification times of the files of each
+        subject. If only some subjects changed, only these subjects are re-indexed. If dataset-level files changed
+        (e.g. participants.tsv), the whole dataset is re-indexed.
+
+        Args:
+            path_data (str): Path to the BIDS dataset.
+            files (list): Files of the dataset, see :func:`ivadomed.loader.bids_index.list_files`.
+
+        Returns:
+            dict: Indexed tables of the dataset, see :meth:`index_dataset`.
+        """
+        if not self.bids_index_dir:
+            return self.index_dataset(path_data, files)
+
+        fingerprint = imed_bids_index.get_fingerprint(files)
+        path_index = imed_bids_index.get_index_path(self.bids_index_dir, path_data, bids_config=self.bids_config,
+                                                    bids_validate=self.bids_validate, derivatives=self.derivatives)
+        index = imed_bids_index.load_index(path_index)
+
+        if index is None:
+            tables = self.index_dataset(path_data, files)
+        else:
+            changed = imed_bids_index.get_changed_groups(fingerprint, index['fingerprint'])
+            if not changed:
+                logger.info(f"BIDS index of {path_data} is up to date: {path_index}.")
+                return index['tables']
+            if imed_bids_index.DATASET_GROUP in changed:
+                tables = self.index_dataset(path_data, files)
+            else:
+                logger.info(f"Re-indexing {len(changed)} modified subjects of {path_data}.")
+                try:
+                    tables = self.index_subjects(path_data, files, changed, index['tables'])
+                except OSError as e:
+                    # e.g. symbolic links not supported
+                    logger.warning(f"Could not re-index the modified subjects only ({e}), re-indexing {path_data}.")
+                    tables = self.index_dataset(path_data, files)
+
+        imed_bids_index.save_index(path_index, fingerprint, tables)
+        return tables
+
+    def add_tsv_metadata(self, df: pd.DataFrame, path_data: str, tables: dict, scans_files: list):
         """Add tsv files metadata to dataframe.
 
         Args:
             df (pd.DataFrame): Dataframe containing dataset information
             path_data (str): Path to the BIDS dataset
-            layout (pybids.BIDSLayout): pybids BIDSLayout of the indexed files of the path_data
+            tables (dict): Indexed tables of the path_data, see :meth:`index_dataset`
+            scans_files (list): Paths of the _scans.tsv files, relative to path_data
 
         Returns:
             pd.DataFrame: Dataframe containing datasets information
@@ -211,12 +352,8 @@ class BidsDataframe:
         df.dropna(axis=1, inplace=True, how='all')
 
         # Add metadata from 'participants.tsv' file if present
-        # Uses pybids function
-        if layout.get_collections(level='dataset'):
-            df_participants = layout.get_collections(level='dataset', merge=True).to_df()
-            df_participants.insert(1, 'participant_id', "sub-" + df_participants['subject'])
-            df_participants.drop(['suffix'], axis=1, inplace=True)
-            df = pd.merge(df, df_participants, on='subject', suffixes=("_x", None), how='left')
+        if tables['participants'] is not None:
+            df = pd.merge(df, tables['participants'], on='subject', suffixes=("_x", None), how='left')
 
         # Add metadata from 'samples.tsv' file if present
         # The 'participant_id' column is added only if not already present from the 'participants.tsv' file.
@@ -232,21 +369,16 @@ class BidsDataframe:
             df = pd.merge(df, df_samples[columns], on=['subject', 'sample'], suffixes=("_x", None), how='left')
 
         # Add metadata from all _sessions.tsv files, if present
-        # Uses pybids function
-        if layout.get_collections(level='subject'):
-            df_sessions = layout.get_collections(level='subject', merge=True).to_df()
-            df_sessions.drop(['suffix'], axis=1, inplace=True)
-            df = pd.merge(df, df_sessions, on=['subject', 'session'], suffixes=("_x", None), how='left')
+        if tables['sessions'] is not None:
+            df = pd.merge(df, tables['sessions'], on=['subject', 'session'], suffixes=("_x", None), how='left')
 
         # Add metadata from all _scans.tsv files, if present
         # TODO: use pybids function after Microscopy-BIDS is integrated in pybids
         # TODO: verify merge behavior with EEG and DWI scans files, tested with anat and microscopy only
         df_scans = pd.DataFrame()
-        for path_object in Path(path_data).glob("**/*"):
-            if path_object.is_file():
-                if path_object.name.endswith("scans.tsv"):
-                    df_temp = pd.read_csv(str(path_object), sep='\t')
-                    df_scans = pd.concat([df_scans, df_temp], ignore_index=True)
+        for rel_path in scans_files:
+            df_temp = pd.read_csv(str(Path(path_data, rel_path)), sep='\t')
+            df_scans = pd.concat([df_scans, df_temp], ignore_index=True)
         if not df_scans.empty:
             df_scans['filename'] = df_scans['filename'].apply(os.path.basename)
             df = pd.merge(df, df_scans, on=['filename'], suffixes=("_x", None), how='left')
@@ -260,12 +392,12 @@ class BidsDataframe:
             list, list: subject filenames having derivatives, available derivatives filenames.
         """
         subject_fnames = self.get_subject_fnames()
-        deriv_fnames = self.get_deriv_fnames()
+        self.index_derivatives()
         has_deriv = []
         deriv = []
 
         for subject_fname in subject_fnames:
-            available = self.get_derivatives(subject_fname, deriv_fnames)
+            available = self.get_derivatives(subject_fname)
             if available:
                 if self.roi_suffix is not None:
                     if self.roi_suffix in ('|'.join(available)):
@@ -300,18 +432,44 @@ class BidsDataframe:
         """
         return self.df[self.df['path'].str.contains('derivatives')]['filename'].tolist()
 
-    def get_derivatives(self, subject_fname: str, deriv_fnames: list):
+    def index_derivatives(self):
+        """Index the derivative rows of the dataframe by the filename prefixes of their source files.
+
+        A derivative filename (e.g. ``sub-01_T2w_seg-manual.nii.gz``) is indexed under each of its prefixes ending
+        at an entity boundary (``sub-01``, ``sub-01_T2w`` and ``sub-01_T2w_seg-manual``), so that the derivatives of a
+        subject file are found with a single lookup of its filename without extension.
+        """
+        self.deriv_index = {}
+        if self.df.empty:
+            return
+        for row, fname in self.df[self.df['path'].str.contains('derivatives')]['filename'].items():
+            parts = fname.split('.')[0].split('_')
+            for i in range(1, len(parts) + 1):
+                self.deriv_index.setdefault('_'.join(parts[:i]), []).append(row)
+
+    def get_derivatives(self, subject_fname: str):
         """Return list of available derivative filenames for a subject filename.
 
         Args:
-            subject_fname (str): Subject filename.
-            deriv_fnames (list of str): List of derivative filenames.
+            subject_fname (str): Subject filename, with or without extension.
 
         Returns:
             list: derivative filenames
         """
-        prefix_fname = subject_fname.split('.')[0]
-        return [d for d in deriv_fnames if prefix_fname in d]
+        rows = self.deriv_index.get(subject_fname.split('.')[0], [])
+        return self.df.loc[rows, 'filename'].tolist()
+
+    def get_derivative_paths(self, subject_fname: str):
+        """Return list of available derivative paths for a subject filename.
+
+        Args:
+            subject_fname (str): Subject filename, with or without extension.
+
+        Returns:
+            list: derivative paths
+        """
+        rows = self.deriv_index.get(subject_fname.split('.')[0], [])
+        return self.df.loc[rows, 'path'].tolist()
 
     def save(self, path: str):
         """Save the dataframe into a csv file.
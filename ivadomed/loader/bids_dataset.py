@@ -33,6 +33,11 @@ class BidsDataset(MRI2DSegmentationDataset):
         soft_gt (bool): If True, ground truths are not binarized before being fed to the network. Otherwise, ground
         truths are thresholded (0.5) after the data augmentation operations.
         is_input_dropout (bool): Return input with missing modalities.
+        n_jobs (int): Number of processes used to load the subjects. -1 uses all the available CPUs.
+        preprocessing_cache (PreprocessingCache): Cache of the preprocessed subjects shared across runs. If None,
+            subjects are preprocessed at each run.
+        patch_sampling_params (dict): Random patch sampling parameters, see :class:`RandomPatchSampler`. If None, the
+            patches of the stride grid are used.
 
     Attributes:
         filename_pairs (list): A list of tuples in the format (input filename list containing all modalities,ground \
@@ -47,7 +52,8 @@ class BidsDataset(MRI2DSegmentationDataset):
     def __init__(self, bids_df, subject_file_lst, target_suffix, contrast_params, model_params, slice_axis=2,
                  nibabel_cache=True, transform=None, metadata_choice=False, slice_filter_fn=None, patch_filter_fn=None,
                  roi_params=None, multichannel=False, object_detection_params=None, task="segmentation",
-                 soft_gt=False, is_input_dropout=False):
+                 soft_gt=False, is_input_dropout=False, n_jobs=1, preprocessing_cache=None,
+                 patch_sampling_params=None):
 
         self.roi_params = roi_params if roi_params is not None else \
             {ROIParamsKW.SUFFIX: None, ROIParamsKW.SLICE_FILTER_ROI: None}
@@ -88,7 +94,7 @@ class BidsDataset(MRI2DSegmentationDataset):
 
         # Get all subjects path from bids_df for bounding box
         get_all_subj_path = bids_df.df[bids_df.df['filename']
-                                .str.contains('|'.join(bids_df.get_subject_fnames()))]['path'].to_list()
+                                .isin(bids_df.get_subject_fnames())]['path'].to_list()
 
         # Load bounding box from list of path
         bounding_box_dict = imed_obj_detect.load_bounding_boxes(object_detection_params,
@@ -96,15 +102,12 @@ class BidsDataset(MRI2DSegmentationDataset):
                                                                 slice_axis,
                                                                 contrast_params[ContrastParamsKW.CONTRAST_LST])
 
-        # Get all derivatives filenames from bids_df
-        all_deriv = bids_df.get_deriv_fnames()
-
         # Create filename_pairs
         for subject in tqdm(subject_file_lst, desc="Loading dataset"):
             df_sub, roi_filename, target_filename, metadata = self.create_filename_pair(multichannel_subjects, subject,
                                                                                         c, tot, multichannel, df_subjects,
                                                                                         contrast_params, target_suffix,
-                                                                                        all_deriv, bids_df, bounding_box_dict,
+                                                                                        bids_df, bounding_box_dict,
                                                                                         idx_dict, metadata_choice)
             # Fill multichannel dictionary
             # subj_id is the filename without modality suffix and extension
@@ -129,7 +132,9 @@ class BidsDataset(MRI2DSegmentationDataset):
         stride = model_params[ModelParamsKW.STRIDE_2D] if ModelParamsKW.STRIDE_2D in model_params else []
 
         super().__init__(self.filename_pairs, length, stride, slice_axis, nibabel_cache, transform, slice_filter_fn, patch_filter_fn,
-                         task, self.roi_params, self.soft_gt, is_input_dropout)
+                         task, self.roi_params, self.soft_gt, is_input_dropout, n_jobs=n_jobs,
+                         preprocessing_cache=preprocessing_cache,
+                         patch_sampling_params=patch_sampling_params)
 
     def get_target_filename(self, target_suffix, target_filename, derivative):
         for idx, suffix_list in enumerate(target_suffix):
@@ -168,7 +173,7 @@ class BidsDataset(MRI2DSegmentationDataset):
 
 
     def create_filename_pair(self, multichannel_subjects, subject, c, tot, multichannel, df_subjects, contrast_params,
-                            target_suffix, all_deriv, bids_df, bounding_box_dict, idx_dict, metadata_choice):
+                            target_suffix, bids_df, bounding_box_dict, idx_dict, metadata_choice):
         df_sub = df_subjects.loc[df_subjects['filename'] == subject]
 
         # Training & Validation: do not consider the contrasts over the threshold contained in contrast_balance
@@ -182,8 +187,7 @@ class BidsDataset(MRI2DSegmentationDataset):
         else:
             target_filename, roi_filename = [[] for _ in range(len(target_suffix))], None
 
-        derivatives = bids_df.df[bids_df.df['filename']
-                        .str.contains('|'.join(bids_df.get_derivatives(subject, all_deriv)))]['path'].to_list()
+        derivatives = bids_df.get_derivative_paths(subject)
 
         for derivative in derivatives:
             self.get_target_filename(target_suffix, target_filename, derivative)
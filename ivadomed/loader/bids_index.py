@@ -0,0 +1,143 @@
+import hashlib
+import os
+from pathlib import Path
+
+import joblib
+from loguru import logger
+
+# Version of the persisted index format, bumped when the content of the index changes
+INDEX_VERSION = 1
+
+# Group of the files that are not specific to a subject (e.g. dataset_description.json, participants.tsv)
+DATASET_GROUP = ''
+
+
+def list_files(path_data):
+    """List the files of a dataset with their size and modification time.
+
+    Args:
+        path_data (str): Path to the BIDS dataset.
+
+    Returns:
+        list: Tuples (path relative to ``path_data`` in POSIX format, size in bytes, modification time in ns), sorted
+            by path.
+    """
+    files = []
+    for root, dirs, filenames in os.walk(path_data):
+        dirs.sort()
+        path_root = Path(root)
+        for filename in filenames:
+            path_file = path_root / filename
+            try:
+                stat = path_file.stat()
+            except OSError:
+                # Broken symbolic link
+                continue
+            files.append((path_file.relative_to(path_data).as_posix(), stat.st_size, stat.st_mtime_ns))
+    return sorted(files)
+
+
+def get_subject_group(rel_path):
+    """Return the subject folder a file belongs to, either in the raw data or in the derivatives.
+
+    Args:
+        rel_path (str): Path of the file relative to the dataset, e.g. ``derivatives/labels/sub-01/anat/x.nii.gz``.
+
+    Returns:
+        str: Subject folder name (e.g. ``sub-01``), or ``DATASET_GROUP`` for the dataset-level files.
+    """
+    for part in rel_path.split('/')[:-1]:
+        if part.startswith('sub-'):
+            return part
+    return DATASET_GROUP
+
+
+def get_fingerprint(files):
+    """Compute the fingerprint of a dataset, per subject.
+
+    Args:
+        files (list): Output of :func:`list_files`.
+
+    Returns:
+        dict: Digest of the paths, sizes and modification times of the files of each subject (keys are the subject
+            folder names, see :func:`get_subject_group`).
+    """
+    hashes = {}
+    for rel_path, size, mtime in files:
+        group = get_subject_group(rel_path)
+        if group not in hashes:
+            hashes[group] = hashlib.sha1()
+        hashes[group].update(f"{rel_path}\0{size}\0{mtime}\n".encode())
+    return {group: h.hexdigest() for group, h in hashes.items()}
+
+
+def get_index_path(index_dir, path_data, **settings):
+    """Return the file where the index of a dataset is persisted.
+
+    Args:
+        index_dir (str): Folder containing the persisted indexes.
+        path_data (str): Path to the BIDS dataset.
+        **settings: Indexing settings, the index is specific to their values.
+
+    Returns:
+        Path: Index filename.
+    """
+    key = repr((str(Path(path_data).absolute()), sorted(settings.items())))
+    return Path(index_dir).expanduser() / f"{hashlib.sha1(key.encode()).hexdigest()}.joblib"
+
+
+def load_index(path_index):
+    """Load a persisted index.
+
+    Args:
+        path_index (Path): Index filename.
+
+    Returns:
+        dict: Index with keys "fingerprint" and "tables", or None if the index does not exist or is invalid.
+    """
+    if not path_index.is_file():
+        return None
+    try:
+        index = joblib.load(path_index)
+    except Exception as e:
+        logger.warning(f"Could not load the BIDS index {path_index}: {e}")
+        return None
+    if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+        return None
+    return index
+
+
+def save_index(path_index, fingerprint, tables):
+    """Persist the index of a dataset.
+
+    The index is first written in a temporary file, then moved, so that concurrent processes never read a partially
+    written index.
+
+    Args:
+        path_index (Path): Index filename.
+        fingerprint (dict): Fingerprint of the dataset, see :func:`get_fingerprint`.
+        tables (dict): Indexed tables of the dataset.
+    """
+    path_tmp = path_index.with_name(f"{path_index.name}.{os.getpid()}.tmp")
+    try:
+        path_index.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump({'version': INDEX_VERSION, 'fingerprint': fingerprint, 'tables': tables}, path_tmp)
+        os.replace(path_tmp, path_index)
+    except OSError as e:
+        logger.warning(f"Could not save the BIDS index {path_index}: {e}")
+        if path_tmp.exists():
+            path_tmp.unlink()
+
+
+def get_changed_groups(fingerprint, fingerprint_ref):
+    """Return the subjects whose files differ between two fingerprints.
+
+    Args:
+        fingerprint (dict): Current fingerprint.
+        fingerprint_ref (dict): Fingerprint of the persisted index.
+
+    Returns:
+        set: Subject folder names that were added, removed or modified, possibly including ``DATASET_GROUP``.
+    """
+    return {group for group in set(fingerprint) | set(fingerprint_ref)
+            if fingerprint.get(group) != fingerprint_ref.get(group)}
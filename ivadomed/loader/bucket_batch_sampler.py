@@ -0,0 +1,72 @@
+import numpy as np
+from torch.utils.data import RandomSampler, SequentialSampler
+from torch.utils.data.sampler import Sampler
+
+
+class BucketBatchSampler(Sampler):
+    """Group the elements of a dataset into batches of elements of the same shape.
+
+    The elements are grouped into shape buckets, computed when the dataset is loaded (see the ``sample_shapes``
+    attribute of ``MRI2DSegmentationDataset``), so that each batch can be stacked without padding nor cropping the
+    elements to a common size. The elements are drawn by another sampler, e.g. ``RandomSampler`` or
+    ``BalancedSampler``, and appended to the batch of their bucket, which is returned once it holds ``batch_size``
+    elements. The incomplete batches are returned at the end of the epoch.
+
+    The shapes are those of the elements before the training transforms: these transforms must return the same shape
+    for elements of the same shape, e.g. the resampling should be done at preprocessing.
+
+    Args:
+        sampler (Sampler): Sampler of the elements of the dataset.
+        sample_shapes (ndarray): Shape of each element of the dataset, one row per element.
+        batch_size (int): Size of the batches.
+        drop_last (bool): If True, the incomplete batches are dropped.
+
+    Attributes:
+        sampler (Sampler): Sampler of the elements of the dataset.
+        buckets (ndarray): Bucket of each element of the dataset.
+        n_buckets (int): Number of distinct shapes.
+        batch_size (int): Size of the batches.
+        drop_last (bool): If True, the incomplete batches are dropped.
+    """
+
+    def __init__(self, sampler, sample_shapes, batch_size, drop_last=False):
+        if batch_size < 1:
+            raise ValueError(f"The batch size must be strictly positive, got {batch_size}.")
+        self.sampler = sampler
+        sample_shapes = np.asarray(sample_shapes).reshape(len(sample_shapes), -1)
+        if len(sample_shapes):
+            _, buckets = np.unique(sample_shapes, axis=0, return_inverse=True)
+        else:
+            buckets = np.zeros(0, dtype=int)
+        self.buckets = buckets.reshape(-1)
+        self.n_buckets = int(self.buckets.max()) + 1 if len(self.buckets) else 0
+        self.batch_size = batch_size
+        self.drop_last = drop_last
+
+    def __iter__(self):
+        batches = [[] for _ in range(self.n_buckets)]
+        for index in self.sampler:
+            batch = batches[self.buckets[index]]
+            batch.append(index)
+            if len(batch) == self.batch_size:
+                yield batch[:]
+                batch.clear()
+
+        if not self.drop_last:
+            for batch in batches:
+                if batch:
+                    yield batch
+
+    def __len__(self):
+        # Exact number of batches when each element is drawn once, else upper bound
+        if isinstance(self.sampler, (RandomSampler, SequentialSampler)) and \
+                not getattr(self.sampler, 'replacement', False) and len(self.sampler) == len(self.buckets):
+            counts = np.bincount(self.buckets, minlength=self.n_buckets)
+            if self.drop_last:
+                return int(np.sum(counts // self.batch_size))
+            return int(np.sum(-(-counts // self.batch_size)))
+
+        n_samples = len(self.sampler)
+        if self.drop_last:
+            return n_samples // self.batch_size
+        return min(n_samples, -(-n_samples // self.batch_size) + max(self.n_buckets - 1, 0))
@@ -4,7 +4,9 @@ from ivadomed import transforms as imed_transforms
 from ivadomed import utils as imed_utils
 from ivadomed.loader.bids3d_dataset import Bids3DDataset
 from ivadomed.loader.bids_dataset import BidsDataset
-from ivadomed.keywords import ROIParamsKW, TransformationKW, ModelParamsKW, ConfigKW
+from ivadomed.loader.preprocessing_cache import PreprocessingCache
+from ivadomed.loader.streaming_dataset import StreamingDataset
+from ivadomed.keywords import ROIParamsKW, TransformationKW, ModelParamsKW, ConfigKW, StreamingParamsKW
 from ivadomed.loader.slice_filter import SliceFilter
 from ivadomed.loader.patch_filter import PatchFilter
 
@@ -13,7 +15,10 @@ def load_dataset(bids_df, data_list, transforms_params, model_params, target_suf
                  contrast_params, slice_filter_params, patch_filter_params, slice_axis, multichannel,
                  dataset_type="training", requires_undo=False, metadata_type=None,
                  object_detection_params=None, soft_gt=False, device=None,
-                 cuda_available=None, is_input_dropout=False, **kwargs):
+                 cuda_available=None, is_input_dropout=False, n_jobs=1, preprocessing_cache_dir=None,
+                 preprocessing_cache_size_GB=20, patch_sampling_params=None, streaming_params=None,
+                 background_loading=False, compose_geometry=False, transform_timing=False, for_training=False,
+                 **kwargs):
     """Get loader appropriate loader according to model type. Available loaders are Bids3DDataset for 3D data,
     BidsDataset for 2D data and HDF5Dataset for HeMIS.
 
@@ -39,16 +44,54 @@ def load_dataset(bids_df, data_list, transforms_params, model_params, target_suf
         soft_gt (bool): If True, ground truths are not binarized before being fed to the network. Otherwise, ground
         truths are thresholded (0.5) after the data augmentation operations.
         is_input_dropout (bool): Return input with missing modalities.
+        n_jobs (int): Number of processes used to load the subjects. -1 uses all the available CPUs.
+        preprocessing_cache_dir (str): Folder of the preprocessing cache shared across runs. If None, subjects are
+            preprocessed at each run.
+        preprocessing_cache_size_GB (float): Maximum size of the preprocessing cache, in GB.
+        patch_sampling_params (dict): Random patch sampling parameters, used when ``for_training`` only, see
+            :doc:`configuration_file` for more details.
+        streaming_params (dict): Parameters of the streaming of the training set, used when ``for_training`` only, see
+            :doc:`configuration_file` for more details.
+        background_loading (bool): If True, the subjects of the 2D training set are loaded in the background while
+            training, when ``for_training`` only, see :doc:`configuration_file` for more details.
+        compose_geometry (bool): If True, consecutive spatial transforms are applied with a single resampling, see
+            :doc:`configuration_file` for more details.
+        transform_timing (bool): If True, the calls of the transforms of the training and validation sets are
+            recorded in a ``TransformTimer``, available as the ``timer`` attribute of the ``transform`` of the dataset.
+        for_training (bool): If True, the dataset is the one the model is trained on: its patches are drawn randomly
+            with ``patch_sampling_params``, and it is streamed with ``streaming_params`` or loaded in the background with
+            ``background_loading``. The other datasets, including a training set used for evaluation, use the stride
+            grid and are fully loaded. The batched transforms are applied to the batches of this dataset only, see
+            :class:`ivadomed.batch_transforms.BatchCompose`: the other datasets apply them to the samples.
 
     Returns:
-        BidsDataset
+        BidsDataset, or StreamingDataset when the training set is streamed
 
     Note: For more details on the parameters transform_params, target_suffix, roi_params, contrast_params,
     slice_filter_params, patch_filter_params and object_detection_params see :doc:`configuration_file`.
     """
 
     # Compose transforms
-    tranform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy(transforms_params), requires_undo)
+    # The durations of the transforms are reported by the training
+    timer = imed_transforms.TransformTimer() if transform_timing and dataset_type != "testing" else None
+    tranform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy(transforms_params), requires_undo,
+                                                         compose_geometry, timer, skip_batched=for_training)
+
+    preprocessing_cache = None
+    if preprocessing_cache_dir is not None:
+        preprocessing_cache = PreprocessingCache(preprocessing_cache_dir,
+                                                 max_bytes=int(preprocessing_cache_size_GB * 1024 ** 3))
+
+    # Patches are drawn randomly to train the model only, the datasets used for evaluation use the stride grid
+    if not for_training:
+        patch_sampling_params = None
+
+    # The dataset the model is trained on can be streamed, the datasets used for evaluation are indexed
+    is_streaming = bool(streaming_params and streaming_params.get(StreamingParamsKW.APPLIED)) and for_training
+
+    # The dataset the model is trained on can be loaded while training, the datasets used for evaluation are loaded
+    # before
+    is_background = background_loading and for_training and not is_streaming
 
     # If ROICrop is not part of the transforms, then enforce no slice filtering based on ROI data.
     if TransformationKW.ROICROP not in transforms_params:
@@ -56,6 +99,9 @@ def load_dataset(bids_df, data_list, transforms_params, model_params, target_suf
 
     if model_params[ModelParamsKW.NAME] == ConfigKW.MODIFIED_3D_UNET \
             or (ModelParamsKW.IS_2D in model_params and not model_params[ModelParamsKW.IS_2D]):
+        if is_background:
+            logger.warning("Background loading is only supported with 2D models: the subjects are loaded before "
+                           "training.")
         dataset = Bids3DDataset(bids_df=bids_df,
                                 subject_file_lst=data_list,
                                 target_suffix=target_suffix,
@@ -68,7 +114,11 @@ def load_dataset(bids_df, data_list, transforms_params, model_params, target_suf
                                 model_params=model_params,
                                 object_detection_params=object_detection_params,
                                 soft_gt=soft_gt,
-                                is_input_dropout=is_input_dropout)
+                                is_input_dropout=is_input_dropout,
+                                n_jobs=n_jobs,
+                                preprocessing_cache=preprocessing_cache,
+                                patch_sampling_params=patch_sampling_params,
+                                load=not is_streaming)
     # elif model_params[ModelParamsKW.NAME] == ConfigKW.HEMIS_UNET:
     #     dataset = imed_adaptative.HDF5Dataset(bids_df=bids_df,
     #                                           subject_file_lst=data_list,
@@ -105,10 +155,23 @@ def load_dataset(bids_df, data_list, transforms_params, model_params, target_suf
                               soft_gt=soft_gt,
                               object_detection_params=object_detection_params,
                               task=task,
-                              is_input_dropout=is_input_dropout)
-        dataset.load_filenames()
+                              is_input_dropout=is_input_dropout,
+                              n_jobs=n_jobs,
+                              preprocessing_cache=preprocessing_cache,
+                              patch_sampling_params=patch_sampling_params)
+        if not is_streaming:
+            dataset.load_filenames(background=is_background)
+
+    if is_streaming:
+        logger.info(f"Streaming {len(dataset.filename_pairs)} subjects for the {dataset_type} set.")
+        return StreamingDataset(dataset, shuffle_buffer_size=streaming_params.get(
+            StreamingParamsKW.SHUFFLE_BUFFER_SIZE, 1000))
 
-    if model_params[ModelParamsKW.NAME] == ConfigKW.MODIFIED_3D_UNET:
+    if getattr(dataset, 'background_loading', None) is not None:
+        logger.info(f"Loaded {dataset.background_loading.n_loaded} of {len(dataset.filename_pairs)} subjects "
+                    f"({len(dataset)} samples) for the {dataset_type} set, the other subjects are loaded while "
+                    f"training.")
+    elif model_params[ModelParamsKW.NAME] == ConfigKW.MODIFIED_3D_UNET:
         logger.info(f"Loaded {len(dataset)} volumes of shape {dataset.length} for the {dataset_type} set.")
     elif model_params[ModelParamsKW.NAME] != ConfigKW.HEMIS_UNET and dataset.length:
         logger.info(f"Loaded {len(dataset)} {slice_axis} patches of shape {dataset.length} for the {dataset_type} set.")
@@ -1,7 +1,5 @@
-import copy
 import random
 from pathlib import Path
-import pickle
 
 from typing import Tuple
 
@@ -12,11 +10,14 @@ from loguru import logger
 
 from ivadomed import transforms as imed_transforms, postprocessing as imed_postpro
 from ivadomed.loader import utils as imed_loader_utils
+from ivadomed.loader.array_store import ArrayStore
+from ivadomed.loader.patch_filter import get_patch_grid, get_patch_statistics
+from ivadomed.loader.random_patch_sampler import RandomPatchSampler
 from ivadomed.loader.utils import dropout_input, get_obj_size, create_temp_directory
 from ivadomed.loader.segmentation_pair import SegmentationPair
 from ivadomed.object_detection import utils as imed_obj_detect
-from ivadomed.keywords import ROIParamsKW, MetadataKW
-from ivadomed.utils import get_timestamp, get_system_memory
+from ivadomed.keywords import ROIParamsKW, MetadataKW, PatchSamplingParamsKW
+from ivadomed.utils import get_system_memory
 
 
 class MRI2DSegmentationDataset(Dataset):
@@ -39,10 +40,27 @@ class MRI2DSegmentationDataset(Dataset):
         soft_gt (bool): If True, ground truths are not binarized before being fed to the network. Otherwise, ground
         truths are thresholded (0.5) after the data augmentation operations.
         is_input_dropout (bool): Return input with missing modalities.
+        disk_cache (bool): determines whether the items in the segmentation pairs for the entire dataset are cached on
+            disk (True) or in memory (False). Default to None to automatically determine it.
+        n_jobs (int): Number of processes used to load the subjects. -1 uses all the available CPUs.
+        preprocessing_cache (PreprocessingCache): Cache of the preprocessed subjects shared across runs. If None,
+            subjects are preprocessed at each run.
+        patch_sampling_params (dict): Random patch sampling parameters, with keys "random", "foreground_ratio" and
+            "n_patches", see :class:`RandomPatchSampler`. Only used with patches. If None or "random" is False, the
+            patches of the stride grid are used.
 
     Attributes:
-        indexes (list): List of indices corresponding to each slice or patch in the dataset.
+        indexes (list or ndarray): List of the slices of the dataset or, with patches, structured array of the
+            patches with their handler index and coordinates (see ``create_coord_index``).
         handlers (list): List of indices corresponding to each slice in the dataset, used for indexing patches.
+        gt_labels (ndarray): For each slice or patch in ``indexes``, 1 if its first ground truth class is not empty,
+            else 0. Computed when loading the dataset, before the training transforms, see :meth:`get_sample_label`.
+            With random patch sampling, 1 for the patches centred on the foreground.
+        sample_shapes (ndarray): Shape of each slice or patch in ``indexes``, one row per sample. Computed when loading
+            the dataset, after the preprocessing transforms, e.g. to batch samples of the same shape (see
+            ``BucketBatchSampler``).
+        cache_store (ArrayStore): Disk cache holding the arrays of the slices when ``disk_cache`` is True. The
+            slices in ``indexes`` or ``handlers`` then refer to the arrays of the store.
         filename_pairs (list): List of tuples in the format (input filename list containing all modalities,ground \
             truth filename, ROI filename, metadata).
         length (list): Size of each dimensions of the patches, length equals 0 (no patching) or 2 (2d patching).
@@ -69,18 +87,28 @@ class MRI2DSegmentationDataset(Dataset):
         disk_cache (bool): determines whether the items in the segmentation pairs for the entire dataset are cached on
             disk (True) or in memory (False). Default to None to automatically determine based on guesstimated size of
             the entire datasets naively assuming that first image in first volume is representative.
+        n_jobs (int): Number of processes used to load the subjects.
+        preprocessing_cache (PreprocessingCache): Cache of the preprocessed subjects shared across runs.
+        random_patch_sampler (RandomPatchSampler): Draws the patches when random patch sampling is used, else None.
+            The patch filter is then not applied.
+        background_loading (BackgroundLoading): Loads the subjects not yet added to the dataset when it is loaded in
+            the background, else None. See :meth:`load_filenames`.
+        n_indexed_handlers (int): Number of slices of ``handlers`` whose patches are indexed.
 
     """
 
     def __init__(self, filename_pairs, length=None, stride=None, slice_axis=2, nibabel_cache=True, transform=None,
                  slice_filter_fn=None, patch_filter_fn=None, task="segmentation", roi_params=None, soft_gt=False,
-                 is_input_dropout=False, disk_cache=None):
+                 is_input_dropout=False, disk_cache=None, n_jobs=1, preprocessing_cache=None,
+                 patch_sampling_params=None):
         if length is None:
             length = []
         if stride is None:
             stride = []
         self.indexes: list = []
         self.handlers: list = []
+        self.gt_labels: list = []
+        self.sample_shapes: list = []
         self.filename_pairs = filename_pairs
         self.length = length
         self.stride = stride
@@ -100,124 +128,328 @@ class MRI2DSegmentationDataset(Dataset):
         self.task = task
         self.is_input_dropout = is_input_dropout
         self.disk_cache: bool = disk_cache
+        self.cache_store = None
+        self.n_jobs = n_jobs
+        self.background_loading = None
+        self.n_indexed_handlers = 0
+        self.preprocessing_cache = preprocessing_cache
+        self.random_patch_sampler = None
+        if self.is_2d_patch and patch_sampling_params and patch_sampling_params.get(PatchSamplingParamsKW.RANDOM):
+            self.random_patch_sampler = RandomPatchSampler(
+                self.length,
+                foreground_ratio=patch_sampling_params.get(PatchSamplingParamsKW.FOREGROUND_RATIO, 0.33),
+                n_patches=patch_sampling_params.get(PatchSamplingParamsKW.N_PATCHES))
+
+    def load_filenames(self, background=False):
+        """Load preprocessed pair data (input and gt) in handler.
+
+        Subjects are loaded by :meth:`load_subject`, in parallel if ``n_jobs`` > 1, and merged in the order of
+        ``filename_pairs``.
+
+        Args:
+            background (bool): If True, the subjects are loaded in a pool of processes while the dataset is used, and
+                this method returns as soon as the first subject is loaded. The dataset then only holds the subjects
+                loaded so far: the other subjects are added by :meth:`update_loaded`, e.g. at each epoch.
+        """
+        n_jobs = self.n_jobs
+        if n_jobs != 1 and self.slice_filter_fn and self.slice_filter_fn.filter_classification:
+            logger.warning("Subjects are loaded sequentially when slices are filtered with a classifier.")
+            n_jobs = 1
+            background = False
+
+        if background:
+            self.background_loading = imed_loader_utils.BackgroundLoading(self, self.filename_pairs, n_jobs)
+            self.update_loaded(block=True)
+            return
+
+        for subject in imed_loader_utils.load_subjects(self, self.filename_pairs, n_jobs):
+            self.add_subject(*subject)
+        self.finish_loading()
+
+    def add_subject(self, items, n_slice, has_bounding_box):
+        """Add the slices of a subject loaded by :meth:`load_subject` to the dataset.
+
+        The patches of the slices are indexed by :meth:`prepare_indices`, called by :meth:`finish_loading`.
+
+        Args:
+            items (list): Preprocessed (seg_pair, roi_pair) slices.
+            n_slice (int): Number of slices of the volume.
+            has_bounding_box (bool): Whether the 'bounding_box' metadata is present across the slices.
+        """
+        self.has_bounding_box &= has_bounding_box
+
+        for item in items:
+            # Run once code to keep track if disk cache is used
+            if self.disk_cache is None:
+                self.determine_cache_need(item, n_slice)
 
-    def load_filenames(self):
-        """Load preprocessed pair data (input and gt) in handler."""
-        for input_filenames, gt_filenames, roi_filename, metadata in self.filename_pairs:
-            roi_pair = SegmentationPair(input_filenames, roi_filename, metadata=metadata, slice_axis=self.slice_axis,
-                                        cache=self.cache, prepro_transforms=self.prepro_transforms)
-
-            seg_pair = SegmentationPair(input_filenames, gt_filenames, metadata=metadata, slice_axis=self.slice_axis,
-                                        cache=self.cache, prepro_transforms=self.prepro_transforms,
-                                        soft_gt=self.soft_gt)
-
-            input_data_shape, _ = seg_pair.get_pair_shapes()
-
-            path_temp = Path(create_temp_directory())
-
-            for idx_pair_slice in range(input_data_shape[-1]):
-                slice_seg_pair = seg_pair.get_pair_slice(idx_pair_slice, gt_type=self.task)
-                self.has_bounding_box = imed_obj_detect.verify_metadata(slice_seg_pair, self.has_bounding_box)
-
-                if self.has_bounding_box:
-                    self.prepro_transforms = imed_obj_detect.adjust_transforms(self.prepro_transforms, slice_seg_pair)
-
-                if self.slice_filter_fn and not self.slice_filter_fn(slice_seg_pair):
-                    continue
-
-                # Note: we force here gt_type=segmentation since ROI slice is needed to Crop the image
-                slice_roi_pair = roi_pair.get_pair_slice(idx_pair_slice, gt_type="segmentation")
-
-                if self.slice_filter_roi and imed_loader_utils.filter_roi(slice_roi_pair['gt'], self.roi_thr):
-                    continue
-
-                item: Tuple[dict, dict] = imed_transforms.apply_preprocessing_transforms(self.prepro_transforms,
-                                                                      slice_seg_pair,
-                                                                      slice_roi_pair)
-                # Run once code to keep track if disk cache is used
-                if self.disk_cache is None:
-                    self.determine_cache_need(item, input_data_shape[-1])
-
-                # If is_2d_patch, create handlers list for indexing patch
-                if self.is_2d_patch:
-                    for metadata in item[0][MetadataKW.INPUT_METADATA]:
-                        metadata[MetadataKW.INDEX_SHAPE] = item[0]['input'][0].shape
-                    if self.disk_cache:
-                        path_item = path_temp / f"item_{get_timestamp()}.pkl"
-                        with path_item.open(mode="wb") as f:
-                            pickle.dump(item, f)
-                        self.handlers.append((path_item))
-                    else:
-                        self.handlers.append((item))
-                # else, append the whole slice to self.indexes
-                else:
-
-                    if self.disk_cache:
-                        path_item = path_temp / f"item_{get_timestamp()}.pkl"
-                        with path_item.open(mode="wb") as f:
-                            pickle.dump(item, f)
-                        self.indexes.append(path_item)
-                    else:
-                        self.indexes.append(item)
+            if self.is_2d_patch:
+                for metadata in item[0][MetadataKW.INPUT_METADATA]:
+                    metadata[MetadataKW.INDEX_SHAPE] = item[0]['input'][0].shape
+
+            if not self.is_2d_patch:
+                self.gt_labels.append(imed_loader_utils.get_gt_label(item[0]['gt']))
+                self.sample_shapes.append(item[0]['input'][0].shape)
+
+            # Write the arrays of the slice in the disk cache, only their metadata is kept in memory
+            if self.disk_cache:
+                if self.cache_store is None:
+                    self.cache_store = ArrayStore(Path(create_temp_directory(), "cache.bin"))
+                item = self.cache_store.dump(item)
+            else:
+                imed_loader_utils.set_read_only(item)
+
+            # If is_2d_patch, create handlers list for indexing patch
+            if self.is_2d_patch:
+                self.handlers.append(item)
+            # else, append the whole slice to self.indexes
+            else:
+                self.indexes.append(item)
+
+    def finish_loading(self):
+        """Index the slices or patches once all the subjects are added by :meth:`add_subject`."""
+        if self.cache_store is not None:
+            self.cache_store.close()
 
         # If is_2d_patch, prepare indices of patches
         if self.is_2d_patch:
             self.prepare_indices()
+            self.sample_shapes = np.tile(np.array(self.length, dtype=np.int32), (len(self.indexes), 1))
+        else:
+            self.gt_labels = np.array(self.gt_labels, dtype=np.uint8)
+            self.sample_shapes = np.array(self.sample_shapes, dtype=np.int32).reshape(-1, 2)
+
+    def update_loaded(self, block=False):
+        """Add the subjects loaded in the background since the previous call, see :meth:`load_filenames`.
+
+        The slices or patches of the dataset are those of the subjects loaded so far: samplers created afterwards
+        (e.g. the ``RandomSampler`` of a DataLoader at each epoch) draw them only. Once all the subjects are added, the
+        dataset is the same as when loaded in the foreground.
+
+        Args:
+            block (bool): If True, wait until at least one subject is loaded, unless all the subjects were added.
+
+        Returns:
+            int: Number of subjects added.
+        """
+        if self.background_loading is None:
+            return 0
+        subjects = self.background_loading.get_loaded(block)
+        for subject in subjects:
+            self.add_subject(*subject)
+        # Flush the disk cache, so that the DataLoader workers forked from this process do not inherit pending writes
+        if self.cache_store is not None:
+            self.cache_store.close()
+
+        if self.background_loading.is_done:
+            self.background_loading = None
+            self.finish_loading()
+            logger.info(f"All the {len(self.filename_pairs)} subjects are loaded: {len(self)} samples.")
+        elif self.is_2d_patch and subjects:
+            self.prepare_indices()
+        return len(subjects)
+
+    def wait_loaded(self):
+        """Wait until all the subjects loaded in the background are added to the dataset, see :meth:`load_filenames`.
+        """
+        while self.background_loading is not None:
+            self.update_loaded(block=True)
+
+    def load_subject(self, filename_pair):
+        """Load, filter and preprocess the slices of one subject.
+
+        Args:
+            filename_pair (tuple): Input filenames, ground truth filenames, ROI filename and metadata of the subject.
+
+        Returns:
+            list, int, bool: Preprocessed (seg_pair, roi_pair) slices, number of slices of the volume, and whether
+                the 'bounding_box' metadata is present across the slices.
+        """
+        input_filenames, gt_filenames, roi_filename, metadata = filename_pair
+        roi_pair = SegmentationPair(input_filenames, roi_filename, metadata=metadata, slice_axis=self.slice_axis,
+                                    cache=self.cache, prepro_transforms=self.prepro_transforms)
+
+        # The input volumes are read and decoded once, by the roi_pair, and shared with the seg_pair
+        seg_pair = SegmentationPair(input_filenames, gt_filenames, metadata=metadata, slice_axis=self.slice_axis,
+                                    cache=self.cache, prepro_transforms=self.prepro_transforms,
+                                    soft_gt=self.soft_gt, input_pair=roi_pair)
+
+        input_data_shape, _ = seg_pair.get_pair_shapes()
+
+        has_bounding_box = self.has_bounding_box
+        items = []
+        for idx_pair_slice in range(input_data_shape[-1]):
+            slice_seg_pair = seg_pair.get_pair_slice(idx_pair_slice, gt_type=self.task)
+            has_bounding_box = imed_obj_detect.verify_metadata(slice_seg_pair, has_bounding_box)
+
+            if has_bounding_box:
+                self.prepro_transforms = imed_obj_detect.adjust_transforms(self.prepro_transforms, slice_seg_pair)
+
+            if self.slice_filter_fn and not self.slice_filter_fn(slice_seg_pair):
+                continue
+
+            # Note: we force here gt_type=segmentation since ROI slice is needed to Crop the image
+            slice_roi_pair = roi_pair.get_pair_slice(idx_pair_slice, gt_type="segmentation",
+                                                     input_slices=slice_seg_pair['input'])
+
+            if self.slice_filter_roi and imed_loader_utils.filter_roi(slice_roi_pair['gt'], self.roi_thr):
+                continue
+
+            item: Tuple[dict, dict] = imed_transforms.apply_preprocessing_transforms(self.prepro_transforms,
+                                                                                     slice_seg_pair,
+                                                                                     slice_roi_pair)
+            # Keep the arrays in compact dtypes, converted back to float32 by get_sample
+            items.append(imed_loader_utils.compact_sample(item))
+
+        # All the slices have been extracted: free the volumes
+        seg_pair.release_pair_data()
+        roi_pair.release_pair_data()
+
+        return items, input_data_shape[-1], has_bounding_box
+
+    def get_cache_params(self):
+        """Return the parameters of :meth:`load_subject`, used to key the preprocessing cache.
+
+        Returns:
+            tuple: Parameters, or None if the subjects cannot be cached (slices filtered with a classifier).
+        """
+        if self.slice_filter_fn and self.slice_filter_fn.filter_classification:
+            return None
+        return (type(self).__name__, self.prepro_transforms, self.slice_axis, self.task, self.soft_gt,
+                self.slice_filter_fn, self.slice_filter_roi, self.roi_thr, self.has_bounding_box)
 
     def prepare_indices(self):
-        """Stores coordinates of 2d patches for training."""
-        for i in range(0, len(self.handlers)):
+        """Stores coordinates of 2d patches for training.
+
+        Only the slices added to ``handlers`` since the previous call are indexed, e.g. when the subjects are loaded in
+        the background.
+        """
+        # Patches of each slice, concatenated at the end
+        if self.n_indexed_handlers:
+            indexes, gt_labels = [self.indexes], [self.gt_labels]
+        else:
+            indexes = [imed_loader_utils.create_coord_index(0, [[], []], self.length)]
+            gt_labels = [np.zeros(0, dtype=np.uint8)]
+        for i in range(self.n_indexed_handlers, len(self.handlers)):
 
             if self.disk_cache:
-                with self.handlers[i].open(mode="rb") as f:
-                    item = pickle.load(f)
-                    primary_handle = item[0]
+                primary_handle = self.cache_store.load(self.handlers[i][0])
             else:
                 primary_handle = self.handlers[i][0]
 
             input_img = primary_handle.get('input')
             gt_img = primary_handle.get('gt')
-            input_metadata = primary_handle.get('input_metadata')
-            gt_metadata = primary_handle.get('gt_metadata')
 
             shape = input_img[0].shape
 
-            if len(self.length) != 2 or len(self.stride) != 2:
-                raise RuntimeError('"length_2D" and "stride_2D" must be of length 2.')
-            for length, stride, size in zip(self.length, self.stride, shape):
-                if stride > length or stride <= 0:
-                    raise RuntimeError('"stride_2D" must be greater than 0 and smaller or equal to "length_2D".')
-                if length > size:
-                    raise RuntimeError('"length_2D" must be smaller or equal to image dimensions after resampling.')
-
-            for x_min in range(0, (shape[0] - self.length[0] + self.stride[0]), self.stride[0]):
-                if x_min + self.length[0] > shape[0]:
-                    x_min = (shape[0] - self.length[0])
-                x_max = x_min + self.length[0]
-                for y_min in range(0, (shape[1] - self.length[1] + self.stride[1]), self.stride[1]):
-                    if y_min + self.length[1] > shape[1]:
-                        y_min = (shape[1] - self.length[1])
-                    y_max = y_min + self.length[1]
-
-                    # Extract patch from handlers for patch filter
-                    patch = {'input': list(np.asarray(input_img)[:, x_min:x_max, y_min:y_max]),
-                             'gt': list(np.asarray(gt_img)[:, x_min:x_max, y_min:y_max]) \
-                                   if gt_img else [],
-                             'input_metadata': input_metadata,
-                             'gt_metadata': gt_metadata}
-                    if self.patch_filter_fn and not self.patch_filter_fn(patch):
-                        continue
-
-                    self.indexes.append({
-                        'x_min': x_min,
-                        'x_max': x_max,
-                        'y_min': y_min,
-                        'y_max': y_max,
-                        'handler_index': i})
+            if self.random_patch_sampler is not None:
+                if len(self.length) != 2:
+                    raise RuntimeError('"length_2D" must be of length 2.')
+                self.random_patch_sampler.add(shape, gt_img)
+                continue
+
+            index, labels = self.get_patch_index(primary_handle, i)
+            indexes.append(index)
+            gt_labels.append(labels)
+
+        self.n_indexed_handlers = len(self.handlers)
+        if self.random_patch_sampler is not None:
+            self.indexes, self.gt_labels = self.random_patch_sampler.get_index()
+        else:
+            self.indexes = np.concatenate(indexes)
+            self.gt_labels = np.concatenate(gt_labels).astype(np.uint8)
+
+    def get_patch_index(self, seg_pair, handler_index):
+        """Return the patches of the stride grid of a slice that are kept by the patch filter.
+
+        Args:
+            seg_pair (dict): Slice, with its arrays loaded.
+            handler_index (int): Index of the slice in ``handlers``.
+
+        Returns:
+            ndarray, ndarray: Index of the patches (see ``create_coord_index``), and label of each patch: 1 if its first
+                ground truth class is not empty, else 0.
+        """
+        input_img, gt_img = seg_pair.get('input'), seg_pair.get('gt')
+        shape = input_img[0].shape
+
+        if len(self.length) != 2 or len(self.stride) != 2:
+            raise RuntimeError('"length_2D" and "stride_2D" must be of length 2.')
+        for length, stride, size in zip(self.length, self.stride, shape):
+            if stride > length or stride <= 0:
+                raise RuntimeError('"stride_2D" must be greater than 0 and smaller or equal to "length_2D".')
+            if length > size:
+                raise RuntimeError('"length_2D" must be smaller or equal to image dimensions after resampling.')
+
+        # Filter the whole grid of patches of the slice at once
+        x_mins = get_patch_grid(shape[0], self.length[0], self.stride[0])
+        y_mins = get_patch_grid(shape[1], self.length[1], self.stride[1])
+        patch_statistics = get_patch_statistics(input_img, gt_img, x_mins, y_mins, self.length)
+        if self.patch_filter_fn:
+            keep = self.patch_filter_fn.filter_patches(patch_statistics)
+        else:
+            keep = np.ones((len(x_mins), len(y_mins)), dtype=bool)
+        idx_x, idx_y = np.nonzero(keep)
+        index = imed_loader_utils.create_coord_index(handler_index, [x_mins[idx_x], y_mins[idx_y]], self.length)
+        gt_count = patch_statistics['gt_count']
+        labels = gt_count[0, idx_x, idx_y] > 0 if len(gt_count) else np.zeros(len(idx_x), dtype=bool)
+        return index, labels.astype(np.uint8)
+
+    def get_subject_samples(self, subject):
+        """Return the slices or patches of a subject, e.g. to stream the dataset (see ``StreamingDataset``).
+
+        Patches are taken from the stride grid, random patch sampling is not applied.
+
+        Args:
+            subject (tuple): Output of :meth:`load_subject`.
+
+        Returns:
+            list: (item, coord) tuples to pass to :meth:`get_sample`.
+        """
+        samples = []
+        for item in subject[0]:
+            imed_loader_utils.set_read_only(item)
+            if not self.is_2d_patch:
+                samples.append((item, None))
+                continue
+            for metadata in item[0][MetadataKW.INPUT_METADATA]:
+                metadata[MetadataKW.INDEX_SHAPE] = item[0]['input'][0].shape
+            index, _ = self.get_patch_index(item[0], 0)
+            samples += [(item, imed_loader_utils.get_coord(index, position)) for position in range(len(index))]
+        return samples
+
+    def get_sample_label(self, index, metadata='gt'):
+        """Return the label of a slice or patch without loading it, e.g. to balance the classes during training.
+
+        Args:
+            index (int): Slice or patch index.
+            metadata (str): 'gt' to return 1 if the first ground truth class of the sample is not empty, else 0.
+                Otherwise, key of the input metadata to return.
+
+        Returns:
+            Label of the sample.
+        """
+        if metadata == 'gt':
+            return int(self.gt_labels[index])
+        item = self.handlers[self.indexes[index]['handler_index']] if self.is_2d_patch else self.indexes[index]
+        return item[0]['input_metadata'][0][metadata]
 
     def set_transform(self, transform):
         self.transform = transform
 
+    def __getstate__(self):
+        """Return the state to pickle, e.g. when the dataset is sent to DataLoader workers started with "spawn".
+
+        The slice filter is only used when loading the subjects. When it holds a classifier model, which may live on GPU,
+        it is not pickled.
+        """
+        state = self.__dict__.copy()
+        if self.slice_filter_fn and self.slice_filter_fn.filter_classification:
+            state['slice_filter_fn'] = None
+        # The subjects loaded in the background are only added to the dataset of the main process
+        state['background_loading'] = None
+        return state
+
     def __len__(self):
         return len(self.indexes)
 
@@ -227,23 +459,32 @@ class MRI2DSegmentationDataset(Dataset):
         Args:
             index (int): Slice index.
         """
-
-        # copy.deepcopy is used to have different coordinates for reconstruction for a given handler with patch,
-        # to allow a different rater at each iteration of training, and to clean transforms params from previous
-        # transforms i.e. remove params from previous iterations so that the coming transforms are different
         if self.is_2d_patch:
-            coord = self.indexes[index]
-            if self.disk_cache:
-                with self.handlers[coord['handler_index']].open(mode="rb") as f:
-                    seg_pair_slice, roi_pair_slice = pickle.load(f)
-            else:
-                seg_pair_slice, roi_pair_slice = copy.deepcopy(self.handlers[coord['handler_index']])
+            coord = imed_loader_utils.get_coord(self.indexes, index)
+            if self.random_patch_sampler is not None:
+                coord = self.random_patch_sampler.draw(index, coord['handler_index'])
+            item = self.handlers[coord['handler_index']]
         else:
-            if self.disk_cache:
-                with self.indexes[index].open(mode="rb") as f:
-                    seg_pair_slice, roi_pair_slice = pickle.load(f)
-            else:
-                seg_pair_slice, roi_pair_slice = copy.deepcopy(self.indexes[index])
+            coord, item = None, self.indexes[index]
+        return self.get_sample(item, coord)
+
+    def get_sample(self, item, coord=None):
+        """Return the processed data of a slice or patch (input, ground truth, roi and metadata).
+
+        Args:
+            item (tuple): (seg_pair, roi_pair) of the slice, whose arrays refer to the disk cache if it is used.
+            coord (dict): Coordinates of the patch, or None for the whole slice.
+
+        Returns:
+            dict: Processed data.
+        """
+        # The metadata is copied to have different coordinates for reconstruction for a given handler with patch,
+        # to allow a different rater at each iteration of training, and to clean transforms params from previous
+        # transforms i.e. remove params from previous iterations so that the coming transforms are different.
+        # The arrays are not copied: they are read-only, and only the returned slice or patch is copied.
+        seg_pair_slice, roi_pair_slice = imed_loader_utils.copy_sample(item)
+        if self.disk_cache:
+            seg_pair_slice, roi_pair_slice = self.cache_store.load((seg_pair_slice, roi_pair_slice))
 
         # In case multiple raters
         if seg_pair_slice['gt'] and isinstance(seg_pair_slice['gt'][0], list):
@@ -259,7 +500,7 @@ class MRI2DSegmentationDataset(Dataset):
         metadata_roi = roi_pair_slice['gt_metadata'] if roi_pair_slice['gt_metadata'] is not None else []
         metadata_gt = seg_pair_slice['gt_metadata'] if seg_pair_slice['gt_metadata'] is not None else []
 
-        if self.is_2d_patch:
+        if coord is not None:
             stack_roi, metadata_roi = None, None
         else:
             # Set coordinates to the slices full size
@@ -269,7 +510,8 @@ class MRI2DSegmentationDataset(Dataset):
 
             # Run transforms on ROI
             # ROI goes first because params of ROICrop are needed for the followings
-            stack_roi, metadata_roi = self.transform(sample=roi_pair_slice["gt"],
+            stack_roi, metadata_roi = self.transform(sample=[imed_loader_utils.expand_array(roi_slice)
+                                                             for roi_slice in roi_pair_slice["gt"]],
                                                      metadata=metadata_roi,
                                                      data_type="roi")
             # Update metadata_input with metadata_roi
@@ -280,26 +522,26 @@ class MRI2DSegmentationDataset(Dataset):
             metadata['coord'] = [coord["x_min"], coord["x_max"],
                                  coord["y_min"], coord["y_max"]]
 
-        # Extract image and gt slices or patches from coordinates
-        stack_input = np.asarray(seg_pair_slice["input"])[:,
-                                 coord['x_min']:coord['x_max'],
-                                 coord['y_min']:coord['y_max']]
+        # Extract image and gt slices or patches from coordinates, converted to float32 if they are stored in compact
+        # dtypes, else as views of the arrays
+        crop = (slice(coord['x_min'], coord['x_max']), slice(coord['y_min'], coord['y_max']))
+        stack_input = [imed_loader_utils.expand_array(input_slice[crop], imed_loader_utils.get_data_scaling(
+            metadata_input[idx] if idx < len(metadata_input) else None))
+            for idx, input_slice in enumerate(seg_pair_slice["input"])]
         if seg_pair_slice["gt"]:
-            stack_gt = np.asarray(seg_pair_slice["gt"])[:,
-                                  coord['x_min']:coord['x_max'],
-                                  coord['y_min']:coord['y_max']]
+            stack_gt = [imed_loader_utils.expand_array(gt_slice[crop]) for gt_slice in seg_pair_slice["gt"]]
         else:
             stack_gt = []
 
         # Run transforms on image slices or patches
-        stack_input, metadata_input = self.transform(sample=list(stack_input),
+        stack_input, metadata_input = self.transform(sample=stack_input,
                                                      metadata=metadata_input,
                                                      data_type="im")
         # Update metadata_gt with metadata_input
         metadata_gt = imed_loader_utils.update_metadata(metadata_input, metadata_gt)
         if self.task == "segmentation":
             # Run transforms on gt slices or patches
-            stack_gt, metadata_gt = self.transform(sample=list(stack_gt),
+            stack_gt, metadata_gt = self.transform(sample=stack_gt,
                                                    metadata=metadata_gt,
                                                    data_type="gt")
             # Make sure stack_gt is binarized
@@ -309,7 +551,10 @@ class MRI2DSegmentationDataset(Dataset):
             # Force no transformation on labels for classification task
             # stack_gt is a tensor of size 1x1, values: 0 or 1
             # "expand(1)" is necessary to be compatible with segmentation convention: n_labelxhxwxd
-            stack_gt = torch.from_numpy(seg_pair_slice["gt"][0]).expand(1)
+            stack_gt = torch.from_numpy(np.array(seg_pair_slice["gt"][0])).expand(1)
+
+        # The coordinate map of the transforms is not needed anymore
+        imed_loader_utils.clear_sample_transform_params(metadata_input, metadata_gt, metadata_roi)
 
         data_dict = {
             'input': stack_input,
@@ -1,7 +1,5 @@
-import copy
 import random
 from pathlib import Path
-import pickle
 from typing import List
 
 import numpy as np
@@ -11,11 +9,13 @@ from loguru import logger
 
 from ivadomed import transforms as imed_transforms, postprocessing as imed_postpro
 from ivadomed.loader import utils as imed_loader_utils
+from ivadomed.loader.array_store import ArrayStore
+from ivadomed.loader.random_patch_sampler import RandomPatchSampler
 from ivadomed.loader.utils import dropout_input, create_temp_directory, get_obj_size
 from ivadomed.loader.segmentation_pair import SegmentationPair
 from ivadomed.object_detection import utils as imed_obj_detect
-from ivadomed.keywords import MetadataKW, SegmentationDatasetKW, SegmentationPairKW
-from ivadomed.utils import get_timestamp, get_system_memory
+from ivadomed.keywords import MetadataKW, SegmentationDatasetKW, SegmentationPairKW, PatchSamplingParamsKW
+from ivadomed.utils import get_system_memory
 
 
 class MRI3DSubVolumeSegmentationDataset(Dataset):
@@ -39,17 +39,30 @@ class MRI3DSubVolumeSegmentationDataset(Dataset):
         is_input_dropout (bool): Return input with missing modalities.
         disk_cache (bool): set whether all input data should be cached in local folders to allow faster subsequent
         reloading and bypass memory cap.
+        n_jobs (int): Number of processes used to load the subjects. -1 uses all the available CPUs.
+        preprocessing_cache (PreprocessingCache): Cache of the preprocessed subjects shared across runs. If None,
+            subjects are preprocessed at each run.
+        patch_sampling_params (dict): Random patch sampling parameters, with keys "random", "foreground_ratio" and
+            "n_patches", see :class:`RandomPatchSampler`. If None or "random" is False, the subvolumes of the stride
+            grid are used. Random subvolumes do not require the volume sizes to match the lengths and strides.
+        load (bool): If False, the subjects are not loaded, e.g. when the dataset is streamed (see
+            ``StreamingDataset``).
     """
 
     def __init__(self, filename_pairs, transform=None, length=(64, 64, 64), stride=(0, 0, 0), slice_axis=0,
-                 task="segmentation", soft_gt=False, is_input_dropout=False, disk_cache=True):
+                 task="segmentation", soft_gt=False, is_input_dropout=False, disk_cache=True,
+                 n_jobs=1, preprocessing_cache=None, patch_sampling_params=None, load=True):
         self.filename_pairs = filename_pairs
 
-        # could be a list of tuple of objects OR path objects to the actual disk equivalent.
-        # behaves differently depend on if self.cache is set to true or not.
+        # list of tuple of objects, whose arrays refer to the disk cache store if self.disk_cache is True.
         self.handlers: List[tuple] = []
+        self.cache_store = None
 
-        self.indexes: list = []
+        # Structured array of the subvolumes, with their handler index and coordinates, see create_coord_index
+        self.indexes = None
+        # 1 if the first ground truth class of the subvolume is not empty, else 0, see get_sample_label. With random
+        # patch sampling, 1 for the subvolumes centred on the foreground.
+        self.gt_labels = None
         self.length = length
         self.stride = stride
         self.prepro_transforms, self.transform = transform
@@ -59,90 +72,187 @@ class MRI3DSubVolumeSegmentationDataset(Dataset):
         self.soft_gt = soft_gt
         self.is_input_dropout = is_input_dropout
         self.disk_cache: bool = disk_cache
-
-        self._load_filenames()
-        self._prepare_indices()
+        self.n_jobs = n_jobs
+        self.preprocessing_cache = preprocessing_cache
+        # Draws the subvolumes when random patch sampling is used
+        self.random_patch_sampler = None
+        if patch_sampling_params and patch_sampling_params.get(PatchSamplingParamsKW.RANDOM):
+            self.random_patch_sampler = RandomPatchSampler(
+                self.length,
+                foreground_ratio=patch_sampling_params.get(PatchSamplingParamsKW.FOREGROUND_RATIO, 0.33),
+                n_patches=patch_sampling_params.get(PatchSamplingParamsKW.N_PATCHES))
+
+        if load:
+            self._load_filenames()
+            self._prepare_indices()
 
     def _load_filenames(self):
-        """Load preprocessed pair data (input and gt) in handler."""
-        path_temp: Path = Path(create_temp_directory())
-
-        for input_filename, gt_filename, roi_filename, metadata in self.filename_pairs:
-            segpair = SegmentationPair(input_filename, gt_filename, metadata=metadata, slice_axis=self.slice_axis,
-                                       soft_gt=self.soft_gt)
-            input_data, gt_data = segpair.get_pair_data()
-            metadata = segpair.get_pair_metadata()
-            seg_pair = {
-                'input': input_data,
-                'gt': gt_data,
-                MetadataKW.INPUT_METADATA: metadata[MetadataKW.INPUT_METADATA],
-                MetadataKW.GT_METADATA: metadata[MetadataKW.GT_METADATA]
-            }
-
-            self.has_bounding_box = imed_obj_detect.verify_metadata(seg_pair, self.has_bounding_box)
-            if self.has_bounding_box:
-                self.prepro_transforms = imed_obj_detect.adjust_transforms(self.prepro_transforms, seg_pair,
-                                                                           length=self.length,
-                                                                           stride=self.stride)
-            seg_pair, roi_pair = imed_transforms.apply_preprocessing_transforms(self.prepro_transforms,
-                                                                                seg_pair=seg_pair)
-
-            for metadata in seg_pair[MetadataKW.INPUT_METADATA]:
-                metadata[MetadataKW.INDEX_SHAPE] = seg_pair['input'][0].shape
+        """Load preprocessed pair data (input and gt) in handler.
+
+        Subjects are loaded by :meth:`load_subject`, in parallel if ``n_jobs`` > 1, and merged in the order of
+        ``filename_pairs``.
+        """
+        for seg_pair, roi_pair, has_bounding_box in imed_loader_utils.load_subjects(self, self.filename_pairs,
+                                                                                   self.n_jobs):
+            self.has_bounding_box &= has_bounding_box
 
             # First time detemine cache automatically IF not specified. Otherwise, use the cache specified.
             if self.disk_cache is None:
                 self.disk_cache = self.determine_cache_need(seg_pair, roi_pair)
 
             if self.disk_cache:
-                # Write SegPair and ROIPair to disk cache with timestamp to avoid collisions
-                path_cache_seg_pair = path_temp / f'seg_pair_{get_timestamp()}.pkl'
-                with path_cache_seg_pair.open(mode='wb') as f:
-                    pickle.dump(seg_pair, f)
-
-                path_cache_roi_pair = path_temp / f'roi_pair_{get_timestamp()}.pkl'
-                with path_cache_roi_pair.open(mode='wb') as f:
-                    pickle.dump(roi_pair, f)
-                self.handlers.append((path_cache_seg_pair, path_cache_roi_pair))
+                # Write the arrays of SegPair and ROIPair to the disk cache, only their metadata is kept in memory
+                if self.cache_store is None:
+                    self.cache_store = ArrayStore(Path(create_temp_directory(), "cache.bin"))
+                self.handlers.append((self.cache_store.dump(seg_pair), self.cache_store.dump(roi_pair)))
 
             else:
-                # self.handler is now a list of a FILES instead of actual data to prevent this list from taking up too much
-                # memory
+                imed_loader_utils.set_read_only(seg_pair)
                 self.handlers.append((seg_pair, roi_pair))
 
+        if self.cache_store is not None:
+            self.cache_store.close()
+
+    def load_subject(self, filename_pair):
+        """Load and preprocess the volume of one subject.
+
+        Args:
+            filename_pair (tuple): Input filenames, ground truth filenames, ROI filename and metadata of the subject.
+
+        Returns:
+            dict, dict, bool: Preprocessed seg_pair and roi_pair, and whether the 'bounding_box' metadata is present.
+        """
+        input_filename, gt_filename, roi_filename, metadata = filename_pair
+        segpair = SegmentationPair(input_filename, gt_filename, metadata=metadata, slice_axis=self.slice_axis,
+                                   soft_gt=self.soft_gt)
+        input_data, gt_data = segpair.get_pair_data()
+        metadata = segpair.get_pair_metadata()
+        seg_pair = {
+            'input': input_data,
+            'gt': gt_data,
+            MetadataKW.INPUT_METADATA: metadata[MetadataKW.INPUT_METADATA],
+            MetadataKW.GT_METADATA: metadata[MetadataKW.GT_METADATA]
+        }
+
+        has_bounding_box = imed_obj_detect.verify_metadata(seg_pair, self.has_bounding_box)
+        if has_bounding_box:
+            self.prepro_transforms = imed_obj_detect.adjust_transforms(self.prepro_transforms, seg_pair,
+                                                                       length=self.length,
+                                                                       stride=self.stride)
+        seg_pair, roi_pair = imed_transforms.apply_preprocessing_transforms(self.prepro_transforms,
+                                                                            seg_pair=seg_pair)
+
+        for metadata in seg_pair[MetadataKW.INPUT_METADATA]:
+            metadata[MetadataKW.INDEX_SHAPE] = seg_pair['input'][0].shape
+
+        # Keep the arrays in compact dtypes, converted back to float32 by get_sample
+        imed_loader_utils.compact_sample(seg_pair)
+        return seg_pair, roi_pair, has_bounding_box
+
+    def get_cache_params(self):
+        """Return the parameters of :meth:`load_subject`, used to key the preprocessing cache.
+
+        Returns:
+            tuple: Parameters.
+        """
+        return (type(self).__name__, self.prepro_transforms, self.slice_axis, self.soft_gt, self.length, self.stride,
+                self.has_bounding_box)
+
     def _prepare_indices(self):
         """Stores coordinates of subvolumes for training."""
+        # Subvolumes of each volume, concatenated at the end
+        indexes = [imed_loader_utils.create_coord_index(0, [[], [], []], self.length)]
+        gt_labels = [np.zeros(0, dtype=np.uint8)]
         for i in range(0, len(self.handlers)):
 
             if self.disk_cache:
-                with self.handlers[i][0].open(mode='rb') as f:
-                    segpair = pickle.load(f)
+                segpair = self.cache_store.load(self.handlers[i][0])
             else:
                 segpair = self.handlers[i][0]
 
             input_img = segpair.get('input')
             shape = input_img[0].shape
 
-            if ((shape[0] - self.length[0]) % self.stride[0]) != 0 or self.length[0] % 16 != 0 or shape[0] < \
-                    self.length[0] \
-                    or ((shape[1] - self.length[1]) % self.stride[1]) != 0 or self.length[1] % 16 != 0 or shape[1] < \
-                    self.length[1] \
-                    or ((shape[2] - self.length[2]) % self.stride[2]) != 0 or self.length[2] % 16 != 0 or shape[2] < \
-                    self.length[2]:
-                raise RuntimeError('Input shape of each dimension should be a \
-                                    multiple of length plus 2 * padding and a multiple of 16.')
-
-            for x in range(0, (shape[0] - self.length[0]) + 1, self.stride[0]):
-                for y in range(0, (shape[1] - self.length[1]) + 1, self.stride[1]):
-                    for z in range(0, (shape[2] - self.length[2]) + 1, self.stride[2]):
-                        self.indexes.append({
-                            'x_min': x,
-                            'x_max': x + self.length[0],
-                            'y_min': y,
-                            'y_max': y + self.length[1],
-                            'z_min': z,
-                            'z_max': z + self.length[2],
-                            'handler_index': i})
+            if self.random_patch_sampler is not None:
+                if any(length % 16 != 0 for length in self.length):
+                    raise RuntimeError('Length of each dimension should be a multiple of 16.')
+                self.random_patch_sampler.add(shape, segpair.get('gt'))
+                continue
+
+            index, labels = self.get_subvolume_index(segpair, i)
+            indexes.append(index)
+            gt_labels.append(labels)
+
+        if self.random_patch_sampler is not None:
+            self.indexes, self.gt_labels = self.random_patch_sampler.get_index()
+        else:
+            self.indexes = np.concatenate(indexes)
+            self.gt_labels = np.concatenate(gt_labels).astype(np.uint8)
+
+    def get_subvolume_index(self, seg_pair, handler_index):
+        """Return the subvolumes of the stride grid of a volume.
+
+        Args:
+            seg_pair (dict): Volume, with its arrays loaded.
+            handler_index (int): Index of the volume in ``handlers``.
+
+        Returns:
+            ndarray, ndarray: Index of the subvolumes (see ``create_coord_index``), and label of each subvolume: 1 if
+                its first ground truth class is not empty, else 0.
+        """
+        shape = seg_pair.get('input')[0].shape
+
+        if ((shape[0] - self.length[0]) % self.stride[0]) != 0 or self.length[0] % 16 != 0 or shape[0] < \
+                self.length[0] \
+                or ((shape[1] - self.length[1]) % self.stride[1]) != 0 or self.length[1] % 16 != 0 or shape[1] < \
+                self.length[1] \
+                or ((shape[2] - self.length[2]) % self.stride[2]) != 0 or self.length[2] % 16 != 0 or shape[2] < \
+                self.length[2]:
+            raise RuntimeError('Input shape of each dimension should be a \
+                                multiple of length plus 2 * padding and a multiple of 16.')
+
+        # Start coordinates of the subvolumes, in the order x, y then z
+        mins = np.meshgrid(*[np.arange(0, size - length + 1, stride)
+                             for size, length, stride in zip(shape, self.length, self.stride)], indexing='ij')
+        mins = [axis_mins.ravel() for axis_mins in mins]
+        index = imed_loader_utils.create_coord_index(handler_index, mins, self.length)
+        labels = [imed_loader_utils.get_gt_label(seg_pair.get('gt'),
+                                                 tuple(slice(start, start + length)
+                                                       for start, length in zip(starts, self.length)))
+                  for starts in zip(*mins)]
+        return index, np.array(labels, dtype=np.uint8)
+
+    def get_subject_samples(self, subject):
+        """Return the subvolumes of a subject, e.g. to stream the dataset (see ``StreamingDataset``).
+
+        Subvolumes are taken from the stride grid, random patch sampling is not applied.
+
+        Args:
+            subject (tuple): Output of :meth:`load_subject`.
+
+        Returns:
+            list: (seg_pair, coord) tuples to pass to :meth:`get_sample`.
+        """
+        seg_pair = subject[0]
+        imed_loader_utils.set_read_only(seg_pair)
+        index, _ = self.get_subvolume_index(seg_pair, 0)
+        return [(seg_pair, imed_loader_utils.get_coord(index, position)) for position in range(len(index))]
+
+    def get_sample_label(self, subvolume_index, metadata='gt'):
+        """Return the label of a subvolume without loading it, e.g. to balance the classes during training.
+
+        Args:
+            subvolume_index (int): Subvolume index.
+            metadata (str): 'gt' to return 1 if the first ground truth class of the subvolume is not empty, else 0.
+                Otherwise, key of the input metadata to return.
+
+        Returns:
+            Label of the subvolume.
+        """
+        if metadata == 'gt':
+            return int(self.gt_labels[subvolume_index])
+        seg_pair = self.handlers[self.indexes[subvolume_index]['handler_index']][0]
+        return seg_pair['input_metadata'][0][metadata]
 
     def __len__(self):
         """Return the dataset size. The number of subvolumes."""
@@ -155,12 +265,27 @@ class MRI3DSubVolumeSegmentationDataset(Dataset):
             subvolume_index (int): Subvolume index.
         """
 
-        # copy.deepcopy is used to have different coordinates for reconstruction for a given handler,
+        coord: dict = imed_loader_utils.get_coord(self.indexes, subvolume_index)
+        if self.random_patch_sampler is not None:
+            coord = self.random_patch_sampler.draw(subvolume_index, coord[SegmentationDatasetKW.HANDLER_INDEX])
+        return self.get_sample(self.handlers[coord[SegmentationDatasetKW.HANDLER_INDEX]][0], coord)
+
+    def get_sample(self, seg_pair, coord):
+        """Return the processed data of a subvolume (input, ground truth and metadata).
+
+        Args:
+            seg_pair (dict): Volume, whose arrays refer to the disk cache if it is used.
+            coord (dict): Coordinates of the subvolume.
+
+        Returns:
+            dict: Processed data.
+        """
+        # The metadata is copied to have different coordinates for reconstruction for a given handler,
         # to allow a different rater at each iteration of training, and to clean transforms params from previous
-        # transforms i.e. remove params from previous iterations so that the coming transforms are different
+        # transforms i.e. remove params from previous iterations so that the coming transforms are different.
+        # The volumes are not copied: they are read-only, and only the returned subvolume is copied.
 
-        # Get the tuple that defines the boundaries for the subsample
-        coord: dict = self.indexes[subvolume_index]
+        # Get the boundaries of the subvolume
         x_min = coord.get(SegmentationDatasetKW.X_MIN)
         x_max = coord.get(SegmentationDatasetKW.X_MAX)
         y_min = coord.get(SegmentationDatasetKW.Y_MIN)
@@ -168,15 +293,13 @@ class MRI3DSubVolumeSegmentationDataset(Dataset):
         z_min = coord.get(SegmentationDatasetKW.Z_MIN)
         z_max = coord.get(SegmentationDatasetKW.Z_MAX)
 
-        # Obtain tuple reference to the pairs of file references
-        tuple_seg_roi_pair: tuple = self.handlers[coord.get(SegmentationDatasetKW.HANDLER_INDEX)]
-
         # Disk Cache handling, either, load the seg_pair, not using ROI pair here.
+        region = (slice(x_min, x_max), slice(y_min, y_max), slice(z_min, z_max))
+        seg_pair = imed_loader_utils.copy_sample(seg_pair)
         if self.disk_cache:
-            with tuple_seg_roi_pair[0].open(mode='rb') as f:
-                seg_pair = pickle.load(f)
-        else:
-            seg_pair, _ = copy.deepcopy(tuple_seg_roi_pair)
+            # Only the subvolume is read from the disk cache
+            seg_pair = self.cache_store.load(seg_pair, region=region)
+            region = (slice(None),) * 3
 
         # In case multiple raters
         if seg_pair[SegmentationPairKW.GT] and isinstance(seg_pair[SegmentationPairKW.GT][0], list):
@@ -198,21 +321,15 @@ class MRI3DSubVolumeSegmentationDataset(Dataset):
         else:
             metadata_gt = []
 
-        # Extract image and gt slices or patches from coordinates
-        stack_input = np.asarray(seg_pair[SegmentationPairKW.INPUT])[
-                      :,
-                      x_min:x_max,
-                      y_min:y_max,
-                      z_min:z_max
-            ]
+        # Extract image and gt subvolumes from coordinates, only the subvolumes are copied, and converted to float32
+        # if they are stored in compact dtypes
+        stack_input = np.stack([imed_loader_utils.expand_array(volume[region], imed_loader_utils.get_data_scaling(
+            metadata_input[idx] if idx < len(metadata_input) else None))
+            for idx, volume in enumerate(seg_pair[SegmentationPairKW.INPUT])])
 
         if seg_pair[SegmentationPairKW.GT]:
-            stack_gt = np.asarray(seg_pair[SegmentationPairKW.GT])[
-                       :,
-                       x_min:x_max,
-                       y_min:y_max,
-                       z_min:z_max
-            ]
+            stack_gt = np.stack([imed_loader_utils.expand_array(volume[region])
+                                 for volume in seg_pair[SegmentationPairKW.GT]])
         else:
             stack_gt = []
 
@@ -231,6 +348,9 @@ class MRI3DSubVolumeSegmentationDataset(Dataset):
         if stack_gt is not None and not self.soft_gt:
             stack_gt = imed_postpro.threshold_predictions(stack_gt, thr=0.5).astype(np.uint8)
 
+        # The coordinate map of the transforms is not needed anymore
+        imed_loader_utils.clear_sample_transform_params(metadata_input, metadata_gt)
+
         shape_x = x_max - x_min
         shape_y = y_max - y_min
         shape_z = z_max - z_min
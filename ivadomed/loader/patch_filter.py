@@ -1,6 +1,95 @@
 import numpy as np
 
 
+def get_integral_image(mask):
+    """Compute the summed-area table of a 2D mask.
+
+    Args:
+        mask (ndarray): 2D boolean or integer array.
+
+    Returns:
+        ndarray: Integral image padded with a row and a column of zeros, i.e. ``integral[i, j]`` is the sum of
+            ``mask[:i, :j]``.
+    """
+    dtype = np.int32 if mask.size < 2 ** 31 else np.int64
+    integral = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=dtype)
+    np.cumsum(mask, axis=0, dtype=dtype, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    return integral
+
+
+def get_window_sums(integral, x_min, x_max, y_min, y_max):
+    """Sum the values of a mask in windows, from its integral image.
+
+    Args:
+        integral (ndarray): Output of :func:`get_integral_image`.
+        x_min, x_max, y_min, y_max (ndarray): Bounds of the windows, broadcast together.
+
+    Returns:
+        ndarray: Sum of the mask in each window ``mask[x_min:x_max, y_min:y_max]``.
+    """
+    return integral[x_max, y_max] - integral[x_min, y_max] - integral[x_max, y_min] + integral[x_min, y_min]
+
+
+def get_patch_grid(size, length, stride):
+    """Return the start coordinates of the patches along one axis.
+
+    Patches are shifted by ``stride``, and the last patch is aligned with the end of the axis.
+
+    Args:
+        size (int): Size of the image along the axis.
+        length (int): Size of the patches along the axis.
+        stride (int): Shift between patches along the axis.
+
+    Returns:
+        ndarray: Start coordinates.
+    """
+    return np.array([min(start, size - length) for start in range(0, size - length + stride, stride)], dtype=int)
+
+
+def get_patch_statistics(input_data, gt_data, x_min, y_min, length):
+    """Compute the statistics of a grid of 2D patches of a slice, from integral images.
+
+    Each statistic is computed once per slice, so that the cost does not depend on the number of patches.
+
+    Args:
+        input_data (list): Input images of the slice, one per contrast.
+        gt_data (list): Ground truth masks of the slice, one per class. In case of several raters, a class is
+            present in a pixel if it is annotated by one of the raters.
+        x_min (ndarray): Start coordinates of the patches along the first axis, see :func:`get_patch_grid`.
+        y_min (ndarray): Start coordinates of the patches along the second axis.
+        length (list): Size of the patches.
+
+    Returns:
+        dict: With keys "input_constant", boolean array of shape (number of contrasts, len(x_min), len(y_min)), True
+            if the patch is filled with a constant value for this contrast; "gt_count", integer array of shape (number
+            of classes, len(x_min), len(y_min)), number of pixels of the class in the patch; and "gt_fraction", fraction
+            of the pixels of the patch that belong to the class.
+    """
+    x_min, y_min = np.asarray(x_min)[:, None], np.asarray(y_min)[None, :]
+    x_max, y_max = x_min + length[0], y_min + length[1]
+
+    # A patch is constant if none of its pixels differs from its neighbour along each axis
+    input_constant = []
+    for img in input_data:
+        img = np.asarray(img)
+        n_diff_x = get_window_sums(get_integral_image(img[1:] != img[:-1]), x_min, x_max - 1, y_min, y_max)
+        n_diff_y = get_window_sums(get_integral_image(img[:, 1:] != img[:, :-1]), x_min, x_max, y_min, y_max - 1)
+        input_constant.append((n_diff_x == 0) & (n_diff_y == 0))
+
+    gt_count = []
+    for mask in gt_data or []:
+        mask = np.any(np.asarray(mask), axis=0) if isinstance(mask, list) else np.asarray(mask) != 0
+        gt_count.append(get_window_sums(get_integral_image(mask), x_min, x_max, y_min, y_max))
+
+    shape = (len(x_min.ravel()), len(y_min.ravel()))
+    input_constant = np.array(input_constant, dtype=bool).reshape((-1,) + shape)
+    gt_count = np.array(gt_count, dtype=int).reshape((-1,) + shape)
+    return {'input_constant': input_constant,
+            'gt_count': gt_count,
+            'gt_fraction': gt_count / float(length[0] * length[1])}
+
+
 class PatchFilter(object):
     """Filter 2D patches from dataset.
 
@@ -57,3 +146,27 @@ class PatchFilter(object):
                     return False
 
         return True
+
+    def filter_patches(self, patch_statistics):
+        """Filter a grid of 2D patches at once, with the same conditions as when calling the filter on each patch.
+
+        Args:
+            patch_statistics (dict): Statistics of the patches, see :func:`get_patch_statistics`.
+
+        Returns:
+            ndarray: Boolean array of shape (number of patches along the first axis, number of patches along the
+                second axis), True for the patches to keep.
+        """
+        input_constant, gt_count = patch_statistics['input_constant'], patch_statistics['gt_count']
+        keep = np.ones(input_constant.shape[1:], dtype=bool)
+
+        if self.is_train:
+            gt_present = gt_count > 0
+            if self.filter_empty_mask:
+                keep &= np.any(gt_present, axis=0)
+            if self.filter_absent_class:
+                keep &= np.all(gt_present, axis=0)
+            if self.filter_empty_input:
+                keep &= ~np.any(input_constant, axis=0)
+
+        return keep
@@ -0,0 +1,173 @@
+import hashlib
+import os
+from pathlib import Path
+
+import joblib
+from loguru import logger
+
+from ivadomed.keywords import MetadataKW
+
+# Version of the cached results, bumped when the output of the subjects loading changes
+CACHE_VERSION = 3
+
+# Metadata set in place when a subject is loaded, from its filenames: they are not part of the cache keys
+LOADING_METADATA = (MetadataKW.INPUT_FILENAMES, MetadataKW.GT_FILENAMES, MetadataKW.SLICE_INDEX, MetadataKW.COORD)
+
+
+class PreprocessingCache(object):
+    """Cache of preprocessed subjects shared across runs.
+
+    Each entry holds the output of the loading of one subject (``load_subject`` of the datasets), i.e. its volumes or
+    slices after the preprocessing transforms (e.g. ``Resample``, ``CenterCrop``, ``ROICrop``). Entries are keyed by
+    the paths and contents of the input, ground truth and ROI files, the subject metadata and the parameters of the
+    loading, so that changing any of them creates a new entry. The least recently used entries are deleted when the
+    size of the cache exceeds ``max_bytes``.
+
+    Entries are written atomically, so that the cache can be shared by concurrent runs, e.g. by the workers of
+    ``ivadomed_automate_training``.
+
+    Args:
+        path (str): Cache folder, created if needed.
+        max_bytes (int): Maximum size of the cache, in bytes.
+
+    Attributes:
+        path (Path): Cache folder.
+        max_bytes (int): Maximum size of the cache, in bytes.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = Path(path).expanduser()
+        self.max_bytes = max_bytes
+        self.path.mkdir(parents=True, exist_ok=True)
+        # File digests, keyed by (filename, size, modification time), to hash each file once per process
+        self._digests = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_digests'] = {}
+        return state
+
+    def get_file_digest(self, filename):
+        """Return the digest of the content of a file.
+
+        Args:
+            filename (str): Filename.
+
+        Returns:
+            str: SHA1 of the file content.
+        """
+        stat = os.stat(filename)
+        key = (str(filename), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            sha1 = hashlib.sha1()
+            with open(filename, mode="rb") as f:
+                for block in iter(lambda: f.read(2 ** 20), b""):
+                    sha1.update(block)
+            self._digests[key] = sha1.hexdigest()
+        return self._digests[key]
+
+    def get_key(self, filename_pair, params):
+        """Return the key of the entry of a subject.
+
+        Args:
+            filename_pair (tuple): Input filenames, ground truth filenames, ROI filename and metadata of the subject.
+            params (tuple): Parameters of the loading of the subject, see ``get_cache_params`` of the datasets.
+
+        Returns:
+            str: Key of the entry.
+        """
+        input_filenames, gt_filenames, roi_filename, metadata = filename_pair
+        # The filenames are part of the key since they are copied in the metadata of the cached subject
+        digests = [self._get_digests(filenames) for filenames in (input_filenames, gt_filenames, roi_filename)]
+        metadata = [{key: value for key, value in m.items() if key not in LOADING_METADATA} if isinstance(m, dict)
+                    else m for m in metadata or []]
+        return joblib.hash((CACHE_VERSION, digests, metadata, params))
+
+    def _get_digests(self, filenames):
+        """Return the digests of the files of a (possibly nested) list of filenames."""
+        if filenames is None:
+            return None
+        if isinstance(filenames, (list, tuple)):
+            return [self._get_digests(filename) for filename in filenames]
+        return filenames, self.get_file_digest(filenames)
+
+    def get(self, key):
+        """Load an entry, and mark it as recently used.
+
+        Args:
+            key (str): Key of the entry.
+
+        Returns:
+            Cached value, or None if the entry does not exist or cannot be read.
+        """
+        path_entry = self.path / f"{key}.joblib"
+        try:
+            value = joblib.load(path_entry)
+            os.utime(path_entry)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read the preprocessing cache entry {path_entry}: {e}")
+            return None
+        return value
+
+    def put(self, key, value):
+        """Write an entry, then evict the least recently used entries if the cache is full.
+
+        Args:
+            key (str): Key of the entry.
+            value: Value to cache.
+        """
+        path_entry = self.path / f"{key}.joblib"
+        path_tmp = self.path / f"{key}.{os.getpid()}.tmp"
+        try:
+            joblib.dump(value, path_tmp)
+            os.replace(path_tmp, path_entry)
+        except OSError as e:
+            logger.warning(f"Could not write the preprocessing cache entry {path_entry}: {e}")
+            if path_tmp.exists():
+                path_tmp.unlink()
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the size of the cache is below ``max_bytes``."""
+        entries = []
+        for path_entry in self.path.glob("*.joblib"):
+            try:
+                stat = path_entry.stat()
+            except FileNotFoundError:
+                # Evicted by a concurrent run
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path_entry))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path_entry in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            try:
+                path_entry.unlink()
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def load_subject(self, dataset, filename_pair):
+        """Load a subject with ``dataset.load_subject``, or from the cache if it was already loaded.
+
+        Args:
+            dataset (Dataset): Dataset implementing ``load_subject`` and ``get_cache_params``.
+            filename_pair (tuple): Input filenames, ground truth filenames, ROI filename and metadata of the subject.
+
+        Returns:
+            Output of ``dataset.load_subject``.
+        """
+        params = dataset.get_cache_params()
+        if params is None:
+            return dataset.load_subject(filename_pair)
+
+        key = self.get_key(filename_pair, params)
+        value = self.get(key)
+        if value is None:
+            value = dataset.load_subject(filename_pair)
+            self.put(key, value)
+        return value
@@ -0,0 +1,115 @@
+import random
+
+import numpy as np
+
+from ivadomed.keywords import SegmentationDatasetKW
+from ivadomed.loader import utils as imed_loader_utils
+
+
+class RandomPatchSampler(object):
+    """Draw random patches in the slices or volumes of a dataset, oversampling the foreground.
+
+    Instead of enumerating a grid of patches, the datasets draw the coordinates of each patch when it is loaded, so
+    that different patches are seen at each epoch. A fraction ``foreground_ratio`` of the patches is centred on a
+    random foreground voxel (i.e. annotated in one of the ground truth classes) of a slice or volume containing
+    foreground, the other patches are centred on a random voxel. The foreground voxels are indexed once, when the
+    dataset is loaded.
+
+    Each element of the dataset is assigned to a slice or volume, in turns, and to a foreground or a random patch, so
+    that the foreground ratio is the same at each epoch and the slices or volumes are equally represented.
+
+    The random generator of the ``random`` module is used, seeded in each DataLoader worker by ``seed_worker``.
+
+    Args:
+        length (list): Size of the patches.
+        foreground_ratio (float): Fraction of the patches centred on the foreground, between 0 and 1.
+        n_patches (int): Number of patches per epoch. If None, number of patches needed to cover the slices or
+            volumes without overlap.
+
+    Attributes:
+        length (list): Size of the patches.
+        foreground_ratio (float): Fraction of the patches centred on the foreground.
+        n_patches (int): Number of patches per epoch. If None, computed by :meth:`get_index` from the slices or
+            volumes added so far.
+        shapes (list): Shape of each slice or volume.
+        foreground (list): Flat indices of the foreground voxels of each slice or volume.
+        n_foreground (int): Number of patches centred on the foreground, the first ones of the index.
+    """
+
+    def __init__(self, length, foreground_ratio=0.33, n_patches=None):
+        if not 0 <= foreground_ratio <= 1:
+            raise ValueError(f"The foreground ratio must be between 0 and 1, got {foreground_ratio}.")
+        self.length = list(length)
+        self.foreground_ratio = foreground_ratio
+        self.n_patches = n_patches
+        self.shapes = []
+        self.foreground = []
+        self.n_foreground = 0
+
+    def add(self, shape, gt):
+        """Index the foreground voxels of a slice or volume.
+
+        Args:
+            shape (tuple): Shape of the slice or volume.
+            gt (list): Ground truth masks, one per class. In case of several raters, a voxel is foreground if it is
+                annotated by one of the raters.
+        """
+        if any(length > size for length, size in zip(self.length, shape)):
+            raise RuntimeError(f"The size of the patches {self.length} must be smaller or equal to the image "
+                               f"dimensions {tuple(shape)}.")
+        mask = np.zeros(shape, dtype=bool)
+        for gt_class in gt or []:
+            for gt_rater in (gt_class if isinstance(gt_class, list) else [gt_class]):
+                if gt_rater is not None:
+                    mask |= np.asarray(gt_rater) != 0
+        dtype = np.int32 if mask.size < 2 ** 31 else np.int64
+        self.shapes.append(tuple(shape))
+        self.foreground.append(np.flatnonzero(mask).astype(dtype))
+
+    def get_index(self):
+        """Assign the elements of the dataset to the slices or volumes.
+
+        Returns:
+            ndarray, ndarray: Index of the elements (see ``create_coord_index``), whose coordinates are drawn by
+                :meth:`draw`, and label of each element: 1 for the patches centred on the foreground, else 0.
+        """
+        n_patches = self.n_patches
+        if n_patches is None:
+            n_patches = int(sum(np.prod(np.ceil(np.divide(shape, self.length))) for shape in self.shapes))
+        foreground_handlers = [i for i, foreground in enumerate(self.foreground) if len(foreground)]
+        self.n_foreground = int(round(n_patches * self.foreground_ratio)) if foreground_handlers else 0
+
+        n_random = n_patches - self.n_foreground
+        handler_index = np.concatenate([
+            np.array(foreground_handlers, dtype=int)[np.arange(self.n_foreground) % max(len(foreground_handlers), 1)],
+            np.arange(n_random) % max(len(self.shapes), 1)])
+        mins = [np.zeros(n_patches, dtype=int)] * len(self.length)
+        index = imed_loader_utils.create_coord_index(handler_index, mins, self.length)
+        labels = (np.arange(n_patches) < self.n_foreground).astype(np.uint8)
+        return index, labels
+
+    def draw(self, index, handler_index):
+        """Draw the coordinates of a patch.
+
+        Args:
+            index (int): Element index.
+            handler_index (int): Index of the slice or volume of the element.
+
+        Returns:
+            dict: Handler index and coordinates of the patch, with ``SegmentationDatasetKW`` keys.
+        """
+        shape = self.shapes[handler_index]
+        if index < self.n_foreground:
+            foreground = self.foreground[handler_index]
+            center = np.unravel_index(int(foreground[random.randrange(len(foreground))]), shape)
+        else:
+            center = [random.randrange(size) for size in shape]
+
+        coord = {SegmentationDatasetKW.HANDLER_INDEX: handler_index}
+        axes = [(SegmentationDatasetKW.X_MIN, SegmentationDatasetKW.X_MAX),
+                (SegmentationDatasetKW.Y_MIN, SegmentationDatasetKW.Y_MAX),
+                (SegmentationDatasetKW.Z_MIN, SegmentationDatasetKW.Z_MAX)]
+        for (name_min, name_max), position, length, size in zip(axes, center, self.length, shape):
+            coord[name_min] = min(max(int(position) - length // 2, 0), size - length)
+            coord[name_max] = coord[name_min] + length
+        return coord
@@ -1,27 +1,44 @@
+import copy
+
+
 class SampleMetadata(object):
     """Metadata class to help update, get and set metadata values.
 
+    The metadata of a sample is split in two records: its own metadata (e.g. slice index, transforms parameters), and
+    the metadata shared by all the samples of a volume (e.g. BIDS metadata and filenames). The shared record is only
+    read: values set on the sample are written to its own metadata, and copies of the sample refer to the same shared
+    record.
+
     Args:
         d (dict): Initial metadata.
+        shared (dict): Metadata shared with other samples, e.g. the other slices of the volume. Not modified.
 
     Attributes:
         metadata (dict): Image metadata.
+        shared (dict): Metadata shared with other samples.
     """
+    __slots__ = ['metadata', 'shared']
 
-    def __init__(self, d=None):
-        self.metadata = {} or d
+    def __init__(self, d=None, shared=None):
+        self.metadata = d if d is not None else {}
+        self.shared = shared if shared is not None else {}
 
     def __setitem__(self, key, value):
         self.metadata[key] = value
 
     def __getitem__(self, key):
-        return self.metadata[key]
+        if key in self.metadata:
+            return self.metadata[key]
+        return self.shared[key]
 
     def __contains__(self, key):
-        return key in self.metadata
+        return key in self.metadata or key in self.shared
+
+    def __deepcopy__(self, memo):
+        return SampleMetadata(copy.deepcopy(self.metadata, memo), self.shared)
 
     def items(self):
-        return self.metadata.items()
+        return {**self.shared, **self.metadata}.items()
 
     def _update(self, ref, list_keys):
         """Update metadata keys with a reference metadata.
@@ -34,8 +51,8 @@ class SampleMetadata(object):
             list_keys (list): List of keys that need to be updated.
         """
         for k in list_keys:
-            if (k not in self.metadata.keys() or not bool(self.metadata[k])) and k in ref.metadata.keys():
-                self.metadata[k] = ref.metadata[k]
+            if (k not in self or not bool(self[k])) and k in ref:
+                self.metadata[k] = ref[k]
 
     def keys(self):
-        return self.metadata.keys()
+        return {**self.shared, **self.metadata}.keys()
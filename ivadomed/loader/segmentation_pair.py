@@ -23,6 +23,8 @@ class SegmentationPair(object):
         slice_axis (int): Indicates the axis used to extract 2D slices from 3D NifTI files:
             "axial": 2, "sagittal": 0, "coronal": 1. 2D PNG/TIF/JPG files use default "axial": 2.
         prepro_transforms (dict): Output of get_preprocessing_transforms.
+        input_pair (SegmentationPair): Pair of the same input files (e.g. the seg_pair of a roi_pair), whose decoded
+            inputs are shared instead of reading the input files again. If None, the input files are read.
 
     Attributes:
         input_filenames (list): List of input filenames.
@@ -34,10 +36,13 @@ class SegmentationPair(object):
         prepro_transforms (dict): Transforms to be applied before training.
         input_handle (list): List of input NifTI data as 'nibabel.nifti1.Nifti1Image' object
         gt_handle (list): List of gt (ground truth) NifTI data as 'nibabel.nifti1.Nifti1Image' object
+        pair_data (tuple): Oriented (input, ground truth) arrays, materialized once by :meth:`get_pair_data` and
+            released by :meth:`release_pair_data`.
+        input_pair (SegmentationPair): Pair whose inputs are shared, or None.
     """
 
     def __init__(self, input_filenames, gt_filenames, metadata=None, slice_axis=2, cache=True, prepro_transforms=None,
-                 soft_gt=False):
+                 soft_gt=False, input_pair=None):
 
         self.input_filenames = input_filenames
         self.gt_filenames = gt_filenames
@@ -46,15 +51,21 @@ class SegmentationPair(object):
         self.slice_axis = slice_axis
         self.soft_gt = soft_gt
         self.prepro_transforms = prepro_transforms
+        self.pair_data = None
+        self.input_pair = input_pair
         # list of the images
         self.input_handle = []
 
-        # loop over the filenames (list)
-        for input_file in self.input_filenames:
-            input_img = self.read_file(input_file)
-            self.input_handle.append(input_img)
-            if len(input_img.shape) > 3:
-                raise RuntimeError("4-dimensional volumes not supported.")
+        if self.input_pair is not None:
+            # The input images are already read and reoriented by the other pair
+            self.input_handle = self.input_pair.input_handle
+        else:
+            # loop over the filenames (list)
+            for input_file in self.input_filenames:
+                input_img = self.read_file(input_file)
+                self.input_handle.append(input_img)
+                if len(input_img.shape) > 3:
+                    raise RuntimeError("4-dimensional volumes not supported.")
 
         # list of GT for multiclass segmentation
         self.gt_handle = []
@@ -72,15 +83,9 @@ class SegmentationPair(object):
                 else:
                     self.gt_handle.append(None)
 
-        # Sanity check for dimensions, should be the same
-        input_shape, gt_shape = self.get_pair_shapes()
-
-        if self.gt_filenames is not None and self.gt_filenames[0] is not None:
-            if not np.allclose(input_shape, gt_shape):
-                raise RuntimeError('Input and ground truth with different dimensions.')
-
-        for idx, handle in enumerate(self.input_handle):
-            self.input_handle[idx] = nib.as_closest_canonical(handle)
+        if self.input_pair is None:
+            for idx, handle in enumerate(self.input_handle):
+                self.input_handle[idx] = nib.as_closest_canonical(handle)
 
         # Labeled data (ie not inference time)
         if self.gt_filenames is not None:
@@ -91,8 +96,18 @@ class SegmentationPair(object):
                     else:  # this tissue has annotation from several raters
                         self.gt_handle[idx] = [nib.as_closest_canonical(gt_rater) for gt_rater in gt]
 
+        # Sanity check for dimensions, should be the same
+        # The shapes are compared once the inputs and GT are reoriented, as the inputs shared by input_pair
+        input_shape, gt_shape = self.get_pair_shapes()
+
+        if self.gt_filenames is not None and self.gt_filenames[0] is not None:
+            if not np.allclose(input_shape, gt_shape):
+                raise RuntimeError('Input and ground truth with different dimensions.')
+
         # If binary classification, then extract labels from GT mask
 
+        # Metadata of the volume shared by the metadata of its slices, see get_pair_metadata
+        self.shared_metadata = None
         if self.metadata:
             self.metadata = []
             for data, input_filename in zip(metadata, input_filenames):
@@ -125,14 +140,31 @@ class SegmentationPair(object):
 
         return input_shape[0], gt_shape[0] if len(gt_shape) else None
 
-    def get_pair_data(self):
-        """Return the tuple (input, ground truth) with the data content in numpy array."""
-        cache_mode = 'fill' if self.cache else 'unchanged'
+    def get_pair_data(self, slice_major=False):
+        """Return the tuple (input, ground truth) with the data content in numpy array.
 
-        input_data = []
-        for handle in self.input_handle:
-            hwd_oriented = imed_loader_utils.orient_img_hwd(handle.get_fdata(cache_mode, dtype=np.float32), self.slice_axis)
-            input_data.append(hwd_oriented)
+        The oriented arrays are read once and kept until :meth:`release_pair_data` is called, so that extracting the
+        slices of a volume does not read and orient the whole volume for each slice.
+
+        Args:
+            slice_major (bool): If True, the arrays are laid out in memory slice by slice (see ``to_slice_major``), so
+                that each 2D slice is contiguous. Only applies when the arrays are read, i.e. on the first call.
+        """
+        if self.pair_data is not None:
+            return self.pair_data
+
+        # The slice-major arrays are copies of the data: they are not also kept in the nibabel data cache
+        cache_mode = 'fill' if self.cache and not slice_major else 'unchanged'
+
+        def _orient(handle):
+            hwd_oriented = imed_loader_utils.orient_img_hwd(handle.get_fdata(cache_mode, dtype=np.float32),
+                                                            self.slice_axis)
+            return imed_loader_utils.to_slice_major(hwd_oriented) if slice_major else hwd_oriented
+
+        if self.input_pair is not None:
+            input_data = self.input_pair.get_pair_data(slice_major)[0]
+        else:
+            input_data = [_orient(handle) for handle in self.input_handle]
 
         gt_data = []
         # Handle unlabeled data
@@ -141,19 +173,29 @@ class SegmentationPair(object):
         for gt in self.gt_handle:
             if gt is not None:
                 if not isinstance(gt, list):  # this tissue has annotation from only one rater
-                    hwd_oriented = imed_loader_utils.orient_img_hwd(gt.get_fdata(cache_mode, dtype=np.float32), self.slice_axis)
-                    gt_data.append(hwd_oriented)
+                    gt_data.append(_orient(gt))
                 else:  # this tissue has annotation from several raters
-                    hwd_oriented_list = [
-                        imed_loader_utils.orient_img_hwd(gt_rater.get_fdata(cache_mode, dtype=np.float32),
-                                                         self.slice_axis) for gt_rater in gt]
-                    gt_data.append([hwd_oriented for hwd_oriented in hwd_oriented_list])
+                    gt_data.append([_orient(gt_rater) for gt_rater in gt])
             else:
-                gt_data.append(
-                    np.zeros(imed_loader_utils.orient_shapes_hwd(self.input_handle[0].shape, self.slice_axis),
-                             dtype=np.float32).astype(np.uint8))
+                empty_gt = np.zeros(imed_loader_utils.orient_shapes_hwd(self.input_handle[0].shape, self.slice_axis),
+                                    dtype=np.float32).astype(np.uint8)
+                gt_data.append(imed_loader_utils.to_slice_major(empty_gt) if slice_major else empty_gt)
 
-        return input_data, gt_data
+        self.pair_data = (input_data, gt_data)
+        return self.pair_data
+
+    def release_pair_data(self):
+        """Release the arrays materialized by :meth:`get_pair_data`, including the nibabel data cache.
+
+        To be called once all the slices of the volume have been extracted.
+        """
+        self.pair_data = None
+        for handle in self.input_handle:
+            handle.uncache()
+        for gt in self.gt_handle:
+            if gt is not None:
+                for gt_rater in (gt if isinstance(gt, list) else [gt]):
+                    gt_rater.uncache()
 
     def get_pair_metadata(self, slice_index=0, coord=None):
         """Return dictionary containing input and gt metadata.
@@ -202,7 +244,8 @@ class SegmentationPair(object):
                 MetadataKW.ZOOMS: imed_loader_utils.orient_shapes_hwd(handle.header.get_zooms(), self.slice_axis),
                 MetadataKW.DATA_SHAPE: imed_loader_utils.orient_shapes_hwd(handle.header.get_data_shape(), self.slice_axis),
                 MetadataKW.DATA_TYPE: 'im',
-                MetadataKW.CROP_PARAMS: {}
+                MetadataKW.CROP_PARAMS: {},
+                MetadataKW.DATA_SCALING: self.get_data_scaling(handle)
             }))
 
         dreturn = {
@@ -210,35 +253,68 @@ class SegmentationPair(object):
             MetadataKW.GT_METADATA: gt_meta_dict,
         }
 
+        # The metadata of the volume is shared by its slices, only the slice index and coordinates are specific
+        if self.shared_metadata is None:
+            self.shared_metadata = [{key: value for key, value in metadata.items()
+                                     if key not in (MetadataKW.SLICE_INDEX, MetadataKW.COORD)}
+                                    for metadata in self.metadata]
+
         for idx, metadata in enumerate(self.metadata):  # loop across channels
             metadata[MetadataKW.SLICE_INDEX] = slice_index
             metadata[MetadataKW.COORD] = coord
             self.metadata[idx] = metadata
-            for metadata_key in metadata.keys():  # loop across input metadata
-                dreturn[MetadataKW.INPUT_METADATA][idx][metadata_key] = metadata[metadata_key]
+            input_metadata = dreturn[MetadataKW.INPUT_METADATA][idx]
+            # The metadata of the volume takes precedence over the default values of the slice
+            for key in [key for key in input_metadata.metadata if key in self.shared_metadata[idx]]:
+                del input_metadata.metadata[key]
+            input_metadata.shared = self.shared_metadata[idx]
+            input_metadata[MetadataKW.SLICE_INDEX] = slice_index
+            input_metadata[MetadataKW.COORD] = coord
 
         return dreturn
 
-    def get_pair_slice(self, slice_index, gt_type="segmentation"):
+    @staticmethod
+    def get_data_scaling(handle):
+        """Return the scaling of the values stored in an image file, used to store its slices in their native dtype.
+
+        Args:
+            handle (nibabel.nifti1.Nifti1Image): Image.
+
+        Returns:
+            tuple: Slope and intercept of the header, (1, 0) if the image is not scaled.
+        """
+        slope = getattr(handle.dataobj, 'slope', 1.)
+        inter = getattr(handle.dataobj, 'inter', 0.)
+        if not np.isfinite(slope) or slope == 0 or not np.isfinite(inter):
+            return 1., 0.
+        return float(slope), float(inter)
+
+    def get_pair_slice(self, slice_index, gt_type="segmentation", input_slices=None):
         """Return the specified slice from (input, ground truth).
 
         Args:
             slice_index (int): Slice number.
             gt_type (str): Choice between segmentation or classification, returns mask (array) or label (int) resp.
                 for the ground truth.
+            input_slices (list): Input slices already extracted, e.g. by the pair whose inputs are shared. If None,
+                the input slices are extracted.
         """
 
         metadata = self.get_pair_metadata(slice_index)
-        input_dataobj, gt_dataobj = self.get_pair_data()
+        # The volumes are laid out slice by slice, so that each slice is copied from a contiguous block
+        input_dataobj, gt_dataobj = self.get_pair_data(slice_major=True)
 
         if self.slice_axis not in [0, 1, 2]:
             raise RuntimeError("Invalid axis, must be between 0 and 2.")
 
-        input_slices = []
-        # Loop over contrasts
-        for data_object in input_dataobj:
-            input_slices.append(np.asarray(data_object[..., slice_index],
-                                           dtype=np.float32))
+        # Note: slices are copied (np.array) so that they do not keep the whole volume in memory once released, and so
+        # that they remain C-contiguous whatever the layout of the volume
+        if input_slices is None:
+            input_slices = []
+            # Loop over contrasts
+            for data_object in input_dataobj:
+                input_slices.append(np.array(data_object[..., slice_index],
+                                             dtype=np.float32, order='C'))
 
         # Handle the case for unlabeled data
         if self.gt_handle is None:
@@ -248,11 +324,11 @@ class SegmentationPair(object):
             for gt_obj in gt_dataobj:
                 if gt_type == "segmentation":
                     if not isinstance(gt_obj, list):  # annotation from only one rater
-                        gt_slices.append(np.asarray(gt_obj[..., slice_index],
-                                                    dtype=np.float32))
+                        gt_slices.append(np.array(gt_obj[..., slice_index],
+                                                  dtype=np.float32, order='C'))
                     else:  # annotations from several raters
-                        gt_slices.append([np.asarray(gt_obj_rater[..., slice_index],
-                                                     dtype=np.float32) for gt_obj_rater in gt_obj])
+                        gt_slices.append([np.array(gt_obj_rater[..., slice_index],
+                                                   dtype=np.float32, order='C') for gt_obj_rater in gt_obj])
                 else:
                     if not isinstance(gt_obj, list):  # annotation from only one rater
                         gt_slices.append(np.asarray(int(np.any(gt_obj[..., slice_index]))))
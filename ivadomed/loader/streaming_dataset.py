@@ -0,0 +1,73 @@
+import random
+
+from torch.utils.data import IterableDataset, get_worker_info
+
+from ivadomed.loader import utils as imed_loader_utils
+
+
+class StreamingDataset(IterableDataset):
+    """Stream the slices, patches or subvolumes of a dataset, without loading all its subjects up front.
+
+    The subjects of the dataset are split between the DataLoader workers. Each worker loads its subjects one at a time,
+    in a random order at each epoch, with ``load_subject`` of the dataset (and its preprocessing cache, if any), and
+    emits their samples through a shuffle buffer: once the buffer is full, each new sample replaces a random sample of
+    the buffer, which is processed by the transforms of the dataset and returned.
+
+    The memory used does not depend on the number of subjects: each worker holds at most ``shuffle_buffer_size``
+    samples, which keep their slice or volume in memory, and the subject being loaded. A larger buffer mixes the
+    samples of more subjects.
+
+    Args:
+        dataset (Dataset): ``MRI2DSegmentationDataset`` or ``MRI3DSubVolumeSegmentationDataset`` whose subjects are
+            not loaded, i.e. implementing ``load_subject``, ``get_subject_samples`` and ``get_sample``.
+        shuffle_buffer_size (int): Number of samples of the shuffle buffer of each worker. 1 disables the shuffling of
+            the samples of a subject.
+
+    Attributes:
+        dataset (Dataset): Streamed dataset. Its other attributes (e.g. ``task``) are accessible from the streaming
+            dataset.
+        shuffle_buffer_size (int): Number of samples of the shuffle buffer of each worker.
+    """
+
+    def __init__(self, dataset, shuffle_buffer_size=1000):
+        if shuffle_buffer_size < 1:
+            raise ValueError(f"The shuffle buffer size must be strictly positive, got {shuffle_buffer_size}.")
+        self.dataset = dataset
+        # Samples are read from the subjects in memory
+        self.dataset.disk_cache = False
+        self.shuffle_buffer_size = shuffle_buffer_size
+
+    def __getattr__(self, name):
+        # Not called for the attributes of the streaming dataset itself, e.g. during unpickling before they are set
+        if name == 'dataset':
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def get_worker_filename_pairs(self):
+        """Return the subjects of the current DataLoader worker, in a random order.
+
+        Returns:
+            list: Filename pairs of the subjects.
+        """
+        filename_pairs = list(self.dataset.filename_pairs)
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            filename_pairs = filename_pairs[worker_info.id::worker_info.num_workers]
+        random.shuffle(filename_pairs)
+        return filename_pairs
+
+    def __iter__(self):
+        buffer = []
+        for filename_pair in self.get_worker_filename_pairs():
+            subject = imed_loader_utils.load_subject(self.dataset, filename_pair)
+            for sample in self.dataset.get_subject_samples(subject):
+                if len(buffer) < self.shuffle_buffer_size:
+                    buffer.append(sample)
+                    continue
+                idx = random.randrange(len(buffer))
+                sample, buffer[idx] = buffer[idx], sample
+                yield self.dataset.get_sample(*sample)
+
+        random.shuffle(buffer)
+        for sample in buffer:
+            yield self.dataset.get_sample(*sample)
@@ -1,9 +1,15 @@
+import atexit
+import collections
 import collections.abc
+import copy
+import itertools
 import re
+import shutil
 import sys
 import os
 import joblib
 import gc
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from tempfile import mkdtemp
 
@@ -14,7 +20,9 @@ from loguru import logger
 from sklearn.model_selection import train_test_split
 from torch._six import string_classes
 from ivadomed import utils as imed_utils
-from ivadomed.keywords import SplitDatasetKW, LoaderParamsKW, ROIParamsKW, ContrastParamsKW
+from ivadomed.keywords import SplitDatasetKW, LoaderParamsKW, ROIParamsKW, ContrastParamsKW, SegmentationDatasetKW, \
+    MetadataKW
+from ivadomed.loader.sample_meta_data import SampleMetadata
 import nibabel as nib
 import random
 
@@ -30,7 +38,17 @@ __numpy_type_map = {
 }
 
 TRANSFORM_PARAMS = ['elastic', 'rotation', 'scale', 'offset', 'crop_params', 'reverse',
-                    'translation', 'gaussian_noise']
+                    'translation', 'gaussian_noise', 'composed_geometry']
+
+# Transform parameters only used while the data types of a sample are transformed, removed from its metadata
+# afterwards, see clear_sample_transform_params
+SAMPLE_TRANSFORM_PARAMS = ['composed_geometry']
+
+# Integer dtypes in which the arrays of the loaded samples are stored when it is lossless, see compact_array
+COMPACT_DTYPES = [np.uint8, np.int8, np.uint16, np.int16]
+
+# Upper bound of the default number of DataLoader workers, when not set in the configuration file
+MAX_DEFAULT_NUM_WORKERS = 8
 
 # Ordered list of supported file extensions
 # TODO: Implement support of the following OMETIFF formats (#739):
@@ -244,6 +262,11 @@ def imed_collate(batch):
     """
     error_msg = "batch must contain tensors, numbers, dicts or lists; found {}"
     elem_type = type(batch[0])
+    # Fast path: metadata are passed through as references, without recursing through their values
+    if elem_type is SampleMetadata:
+        return batch
+    if elem_type is list and batch[0] and type(batch[0][0]) is SampleMetadata:
+        return list(batch)
     if torch.is_tensor(batch[0]):
         stacked = torch.stack(batch, 0)
         return stacked
@@ -272,6 +295,188 @@ def imed_collate(batch):
     return batch
 
 
+def get_num_workers(num_workers=None):
+    """Get the number of DataLoader worker processes.
+
+    Args:
+        num_workers (int): Number of workers requested in the configuration file. If None, the number of workers is
+            the number of CPUs available to the process minus one (kept for the main process), capped to
+            ``MAX_DEFAULT_NUM_WORKERS``. 0 means that the data is loaded in the main process.
+
+    Returns:
+        int: Number of workers.
+    """
+    if num_workers is None:
+        n_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        num_workers = min(max((n_cpus or 1) - 1, 0), MAX_DEFAULT_NUM_WORKERS)
+    if not isinstance(num_workers, int) or num_workers < 0:
+        raise ValueError(f"num_workers must be a positive integer or null, got {num_workers}.")
+    return num_workers
+
+
+def seed_worker(worker_id):
+    """Seed the ``numpy`` and ``random`` generators of a DataLoader worker.
+
+    Torch seeds its own generator in each worker (``base_seed + worker_id``), but the ``numpy`` and ``random``
+    generators used by the transforms would otherwise be copies of the parent process state, i.e. all workers would
+    draw the same augmentations.
+
+    Args:
+        worker_id (int): Worker index, unused: the torch seed of the worker already depends on it.
+    """
+    worker_seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+
+def get_dataloader_worker_params(num_workers=None, persistent_workers=True):
+    """Get the worker-related keyword arguments of a ``torch.utils.data.DataLoader``.
+
+    Args:
+        num_workers (int): Number of workers, see :func:`get_num_workers`.
+        persistent_workers (bool): If True, the workers are kept alive between epochs instead of being re-created
+            (and re-fed the dataset) at each epoch.
+
+    Returns:
+        dict: ``num_workers``, ``worker_init_fn`` and ``persistent_workers`` arguments.
+    """
+    num_workers = get_num_workers(num_workers)
+    return {"num_workers": num_workers,
+            "worker_init_fn": seed_worker if num_workers > 0 else None,
+            "persistent_workers": persistent_workers and num_workers > 0}
+
+
+def get_n_jobs(n_jobs=1):
+    """Get the number of processes used to load the subjects of a dataset.
+
+    Args:
+        n_jobs (int): Number of processes requested in the configuration file. If -1, all the CPUs available to the
+            process are used. If 1, the subjects are loaded sequentially in the main process.
+
+    Returns:
+        int: Number of processes.
+    """
+    if n_jobs == -1:
+        n_jobs = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    if not isinstance(n_jobs, int) or n_jobs < 1:
+        raise ValueError(f"n_jobs must be a strictly positive integer or -1, got {n_jobs}.")
+    return n_jobs
+
+
+# Dataset used by the subject loading processes, set once per process by _init_loading_worker
+_LOADING_DATASET = None
+
+
+def _init_loading_worker(dataset):
+    global _LOADING_DATASET
+    _LOADING_DATASET = dataset
+
+
+def _load_subject_in_worker(filename_pair):
+    return load_subject(_LOADING_DATASET, filename_pair)
+
+
+def load_subject(dataset, filename_pair):
+    """Run ``dataset.load_subject`` on a filename pair, through the preprocessing cache of the dataset if any.
+
+    Args:
+        dataset (Dataset): Dataset implementing a ``load_subject(filename_pair)`` method, and optionally a
+            ``preprocessing_cache`` attribute (see :class:`ivadomed.loader.preprocessing_cache.PreprocessingCache`).
+        filename_pair (tuple): Filename pair of the subject, see :class:`MRI2DSegmentationDataset`.
+
+    Returns:
+        Output of ``dataset.load_subject``.
+    """
+    preprocessing_cache = getattr(dataset, "preprocessing_cache", None)
+    if preprocessing_cache is None:
+        return dataset.load_subject(filename_pair)
+    return preprocessing_cache.load_subject(dataset, filename_pair)
+
+
+def load_subjects(dataset, filename_pairs, n_jobs=1):
+    """Run ``dataset.load_subject`` on each filename pair, possibly in a pool of processes.
+
+    The dataset is sent once to each process. Results are yielded in the order of ``filename_pairs`` whatever the
+    order in which the processes complete them, and at most ``2 * n_jobs`` loaded subjects wait to be consumed.
+    Subjects are read from the preprocessing cache of the dataset when available, see :func:`load_subject`.
+
+    Args:
+        dataset (Dataset): Dataset implementing a ``load_subject(filename_pair)`` method.
+        filename_pairs (list): Filename pairs of the dataset, see :class:`MRI2DSegmentationDataset`.
+        n_jobs (int): Number of processes, see :func:`get_n_jobs`.
+
+    Returns:
+        generator: Outputs of ``dataset.load_subject``, one per filename pair.
+    """
+    n_jobs = min(get_n_jobs(n_jobs), len(filename_pairs))
+    if n_jobs <= 1:
+        for filename_pair in filename_pairs:
+            yield load_subject(dataset, filename_pair)
+        return
+
+    logger.info(f"Loading {len(filename_pairs)} subjects with {n_jobs} processes.")
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_loading_worker, initargs=(dataset,)) as executor:
+        filename_pairs = iter(filename_pairs)
+        futures = collections.deque(executor.submit(_load_subject_in_worker, filename_pair)
+                                    for filename_pair in itertools.islice(filename_pairs, 2 * n_jobs))
+        while futures:
+            result = futures.popleft().result()
+            filename_pair = next(filename_pairs, None)
+            if filename_pair is not None:
+                futures.append(executor.submit(_load_subject_in_worker, filename_pair))
+            yield result
+
+
+class BackgroundLoading(object):
+    """Load the subjects of a dataset in a pool of processes, while the dataset is used by the main process.
+
+    All the subjects are submitted to the pool at once. Loaded subjects are collected by :meth:`get_loaded`, in the
+    order of ``filename_pairs`` as with :func:`load_subjects`, without waiting for the other subjects. Subjects are read
+    from the preprocessing cache of the dataset when available, see :func:`load_subject`.
+
+    Args:
+        dataset (Dataset): Dataset implementing a ``load_subject(filename_pair)`` method.
+        filename_pairs (list): Filename pairs of the dataset, see :class:`MRI2DSegmentationDataset`.
+        n_jobs (int): Number of processes, see :func:`get_n_jobs`. At least one process is used.
+
+    Attributes:
+        n_subjects (int): Number of subjects to load.
+        n_loaded (int): Number of subjects collected by :meth:`get_loaded`.
+    """
+
+    def __init__(self, dataset, filename_pairs, n_jobs=1):
+        n_jobs = max(min(get_n_jobs(n_jobs), len(filename_pairs)), 1)
+        self.n_subjects = len(filename_pairs)
+        self.n_loaded = 0
+        logger.info(f"Loading {self.n_subjects} subjects in the background with {n_jobs} processes.")
+        self._executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_loading_worker,
+                                             initargs=(dataset,))
+        self._futures = collections.deque(self._executor.submit(_load_subject_in_worker, filename_pair)
+                                          for filename_pair in filename_pairs)
+
+    @property
+    def is_done(self):
+        """bool: True once all the subjects have been collected."""
+        return not self._futures
+
+    def get_loaded(self, block=False):
+        """Collect the subjects loaded since the previous call.
+
+        Args:
+            block (bool): If True, wait until at least one subject is loaded, unless all the subjects were collected.
+
+        Returns:
+            list: Outputs of ``dataset.load_subject``, in the order of the filename pairs.
+        """
+        results = []
+        while self._futures and (self._futures[0].done() or (block and not results)):
+            results.append(self._futures.popleft().result())
+        self.n_loaded += len(results)
+        if not self._futures:
+            self._executor.shutdown()
+        return results
+
+
 def filter_roi(roi_data, nb_nonzero_thr):
     """Filter slices from dataset using ROI data.
 
@@ -309,6 +514,21 @@ def orient_img_hwd(data, slice_axis):
         return data
 
 
+def to_slice_major(data):
+    """Return an array equal to a (height, width, depth) array, whose slices along the last axis are C-contiguous.
+
+    The depth axis becomes the slowest varying axis in memory: each slice ``data[..., i]`` is then a contiguous block,
+    which is copied at once instead of being gathered from strided values.
+
+    Args:
+        data (ndarray): Array oriented with the following dimensions: (height, width, depth).
+
+    Returns:
+        ndarray: Array of the same shape and values, a view of ``data`` if its slices are already C-contiguous.
+    """
+    return np.moveaxis(np.ascontiguousarray(np.moveaxis(data, -1, 0)), 0, -1)
+
+
 def orient_img_ras(data, slice_axis):
     """Orient a given array with dimensions (height, width, depth) to RAS orientation.
 
@@ -371,6 +591,232 @@ def update_metadata(metadata_src_lst, metadata_dest_lst):
     return metadata_dest_lst
 
 
+def clear_sample_transform_params(*metadata_lsts):
+    """Remove the transform parameters only used while a sample is transformed from its metadata.
+
+    The coordinate maps of ``ComposedGeometry`` are shared by the image, GT and ROI of a sample, and each is three times
+    as large as the float32 sample: it is removed once they are transformed, so that it is not collated, sent by the
+    DataLoader workers nor kept with the predictions. The parameters of each transform, used to undo it, are kept.
+
+    Args:
+        metadata_lsts (list): Metadata lists of the sample, e.g. of its input, GT and ROI, possibly nested or None.
+    """
+    for metadata in metadata_lsts:
+        if isinstance(metadata, list):
+            clear_sample_transform_params(*metadata)
+        elif isinstance(metadata, SampleMetadata):
+            for key in SAMPLE_TRANSFORM_PARAMS:
+                metadata.metadata.pop(key, None)
+
+
+def create_coord_index(handler_index, mins, lengths):
+    """Create the index of patches or subvolumes of a dataset, as a structured array.
+
+    Each element holds the index of the slice or volume in the ``handlers`` of the dataset and the coordinates of the
+    patch or subvolume, in fields named after ``SegmentationDatasetKW`` (e.g. "x_min", "x_max"). Compared to a list
+    of dicts, the index takes a few bytes per element and is pickled at once, e.g. when sent to DataLoader workers.
+
+    Args:
+        handler_index (int or ndarray): Index of the slice or volume of each element.
+        mins (list): For each axis (x, y and optionally z), start coordinate of each element (ndarray).
+        lengths (list): Size of the patches or subvolumes along each axis.
+
+    Returns:
+        ndarray: Structured array of the elements.
+    """
+    axes = [(SegmentationDatasetKW.X_MIN, SegmentationDatasetKW.X_MAX),
+            (SegmentationDatasetKW.Y_MIN, SegmentationDatasetKW.Y_MAX),
+            (SegmentationDatasetKW.Z_MIN, SegmentationDatasetKW.Z_MAX)][:len(mins)]
+    dtype = [(SegmentationDatasetKW.HANDLER_INDEX, np.int32)] + \
+            [(name, np.int32) for axis in axes for name in axis]
+    index = np.empty(len(mins[0]), dtype=dtype)
+    index[SegmentationDatasetKW.HANDLER_INDEX] = handler_index
+    for (name_min, name_max), axis_mins, length in zip(axes, mins, lengths):
+        index[name_min] = axis_mins
+        index[name_max] = np.asarray(axis_mins) + length
+    return index
+
+
+def get_coord(index, position):
+    """Return an element of an index created with :func:`create_coord_index` as a dict of ints.
+
+    Args:
+        index (ndarray): Structured array of the patches or subvolumes.
+        position (int): Position of the element.
+
+    Returns:
+        dict: Handler index and coordinates of the element.
+    """
+    return dict(zip(index.dtype.names, index[position].tolist()))
+
+
+def get_gt_label(gt, region=()):
+    """Return the label of a sample used to balance the classes: 1 if its first ground truth class is not empty.
+
+    Args:
+        gt (list): Ground truth arrays of the sample, one per class. In case of several raters, the class is not empty
+            if it is not empty for one of the raters.
+        region (tuple): Slices of the region of the arrays to consider, e.g. a patch or a subvolume.
+
+    Returns:
+        int: 0 or 1.
+    """
+    if not gt or gt[0] is None:
+        return 0
+    gt_class = gt[0] if isinstance(gt[0], list) else [gt[0]]
+    return int(any(np.any(np.asarray(gt_rater)[region]) for gt_rater in gt_class))
+
+
+def copy_sample(sample):
+    """Copy a sample (e.g. seg_pair or roi_pair) except its arrays, which are shared with the original sample.
+
+    The datasets keep their loaded samples as immutable: this copy holds the metadata which is updated for each
+    iteration (e.g. transforms parameters), while the arrays are only read.
+
+    Args:
+        sample: Nested structure of dicts, lists and tuples containing arrays and metadata.
+
+    Returns:
+        Copy of the sample, whose arrays are the arrays of ``sample``.
+    """
+    if isinstance(sample, np.ndarray):
+        return sample
+    if isinstance(sample, dict):
+        return {key: copy_sample(value) for key, value in sample.items()}
+    if isinstance(sample, (list, tuple)):
+        return type(sample)(copy_sample(value) for value in sample)
+    return copy.deepcopy(sample)
+
+
+def set_read_only(sample):
+    """Mark the arrays of a sample as read-only, so that they cannot be modified once shared by :func:`copy_sample`.
+
+    Args:
+        sample: Nested structure of dicts, lists and tuples containing arrays and metadata.
+    """
+    if isinstance(sample, np.ndarray):
+        sample.flags.writeable = False
+    elif isinstance(sample, dict):
+        for value in sample.values():
+            set_read_only(value)
+    elif isinstance(sample, (list, tuple)):
+        for value in sample:
+            set_read_only(value)
+
+
+def compact_array(array, scaling=None):
+    """Return a compact representation of a float32 array, in the smallest integer dtype holding its values.
+
+    The array is stored as integers ``raw`` such that ``raw * scale + offset`` is equal to the array, e.g. binary or
+    label masks as uint8, and MR images in their native integer dtype with the scaling of their header. The first
+    scaling among ``scaling`` and (1, 0) for which the representation is lossless is used, otherwise the array is
+    returned unchanged.
+
+    Args:
+        array (ndarray): Array.
+        scaling (tuple): Scale and offset to try first, e.g. the slope and intercept of the NIfTI header.
+
+    Returns:
+        ndarray, tuple: Compact array and its (scale, offset), or the array and None if it is not compacted.
+    """
+    if not isinstance(array, np.ndarray) or array.dtype != np.float32 or not array.ndim:
+        return array, None
+    scalings = [(1., 0.)] if scaling is None or tuple(scaling) == (1., 0.) else [tuple(scaling), (1., 0.)]
+    for scale, offset in scalings:
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            raw = np.rint((array - np.float32(offset)) / np.float32(scale))
+        if not np.all(np.isfinite(raw)):
+            continue
+        min_value, max_value = (raw.min(), raw.max()) if raw.size else (0, 0)
+        dtype = next((dtype for dtype in COMPACT_DTYPES
+                      if np.iinfo(dtype).min <= min_value and max_value <= np.iinfo(dtype).max), None)
+        if dtype is None:
+            continue
+        compact = raw.astype(dtype)
+        if np.array_equal(expand_array(compact, (scale, offset)), array):
+            return compact, (float(scale), float(offset))
+    return array, None
+
+
+def expand_array(array, scaling=None):
+    """Return the float32 array of a compact array returned by :func:`compact_array`.
+
+    Args:
+        array (ndarray): Compact array, or a part of it. Other arrays (e.g. float32 arrays) are returned unchanged.
+        scaling (tuple): Scale and offset of the compact array. If None, (1, 0).
+
+    Returns:
+        ndarray: Float32 array.
+    """
+    if not isinstance(array, np.ndarray) or array.dtype.kind not in 'biu' or not array.ndim:
+        return array
+    expanded = array.astype(np.float32)
+    if scaling is not None and tuple(scaling) != (1., 0.):
+        expanded *= np.float32(scaling[0])
+        expanded += np.float32(scaling[1])
+    return expanded
+
+
+def get_data_scaling(metadata):
+    """Return the scale and offset of a compact input array from its metadata, see :func:`compact_sample`.
+
+    Args:
+        metadata (SampleMetadata): Metadata of the input channel, or None.
+
+    Returns:
+        tuple: Scale and offset, or None.
+    """
+    if metadata is not None and MetadataKW.DATA_SCALING in metadata:
+        return metadata[MetadataKW.DATA_SCALING]
+    return None
+
+
+def compact_sample(sample):
+    """Store the arrays of a loaded sample in compact integer dtypes when it is lossless, see :func:`compact_array`.
+
+    The ground truths are compacted without scaling, e.g. binary masks as uint8, while soft ground truths remain float32.
+    The inputs are compacted with the scaling of the "data_scaling" input metadata (e.g. slope and intercept of the
+    NIfTI header), which is then set to the scaling used. The datasets convert the arrays back to float32 with
+    :func:`expand_array` when a sample is returned, before the training transforms. Arrays shared between pairs (e.g.
+    the inputs of the seg_pair and the roi_pair) remain shared.
+
+    Args:
+        sample (dict or tuple): seg_pair dict, or tuple of seg_pair and roi_pair dicts. Modified in place.
+
+    Returns:
+        Same sample.
+    """
+    # Compacted arrays by id, with the original arrays kept alive so that their ids are not reused
+    memo = {}
+
+    def _compact(array, scaling=None):
+        if id(array) not in memo:
+            compact, used_scaling = compact_array(array, scaling)
+            memo[id(array)] = memo[id(compact)] = (compact, used_scaling, array)
+        return memo[id(array)][:2]
+
+    def _compact_gt(gt):
+        if isinstance(gt, list):
+            return [_compact_gt(gt_rater) for gt_rater in gt]
+        return _compact(gt)[0]
+
+    for pair in (sample if isinstance(sample, tuple) else (sample,)):
+        if not isinstance(pair, dict):
+            continue
+        metadata = pair.get(MetadataKW.INPUT_METADATA) or []
+        inputs = []
+        for idx, array in enumerate(pair['input']):
+            metadata_channel = metadata[idx] if idx < len(metadata) else None
+            compact, scaling = _compact(array, get_data_scaling(metadata_channel))
+            if scaling is not None and metadata_channel is not None:
+                metadata_channel[MetadataKW.DATA_SCALING] = scaling
+            inputs.append(compact)
+        pair['input'] = inputs
+        if pair.get('gt') is not None:
+            pair['gt'] = _compact_gt(pair['gt'])
+    return sample
+
+
 def reorient_image(arr, slice_axis, nib_ref, nib_ref_canonical):
     """Reorient an image to match a reference image orientation.
 
@@ -473,7 +919,7 @@ def dropout_input(seg_pair):
 
 def create_temp_directory() -> str:
     """Creates a temporary directory and returns its path.
-    This temporary directory is only deleted when explicitly requested.
+    This temporary directory is deleted when the process that created it exits.
 
     Returns:
         str: Path of the temporary directory.
@@ -481,8 +927,17 @@ def create_temp_directory() -> str:
     import datetime
     time_stamp = datetime.datetime.now().isoformat().replace(":", "")
     temp_folder_location = mkdtemp(prefix="ivadomed_", suffix=f"_{time_stamp}")
+    atexit.register(_remove_temp_directory, temp_folder_location, os.getpid())
     return temp_folder_location
 
+
+def _remove_temp_directory(path, pid):
+    # Forked processes (e.g. DataLoader workers) inherit the exit handlers: only the creating process removes the
+    # directory
+    if os.getpid() == pid:
+        shutil.rmtree(path, ignore_errors=True)
+
+
 def get_obj_size(obj) -> int:
     """
     Returns the size of an object in bytes. Used to gauge whether storing object in memory vs write to disk.
@@ -15,6 +15,7 @@ from ivadomed import config_manager as imed_config_manager
 from ivadomed import testing as imed_testing
 from ivadomed import training as imed_training
 from ivadomed import transforms as imed_transforms
+from ivadomed import batch_transforms as imed_batch_transforms
 from ivadomed import utils as imed_utils
 from ivadomed import metrics as imed_metrics
 from ivadomed import inference as imed_inference
@@ -102,6 +103,9 @@ def check_multiple_raters(is_train, loader_params):
 
 
 def film_normalize_data(context, model_params, ds_train, ds_valid, path_output):
+    # The metadata models are fit on all the training subjects, including those loaded in the background
+    if getattr(ds_train, 'background_loading', None) is not None:
+        ds_train.wait_loaded()
     # Normalize metadata before sending to the FiLM network
     results = imed_film.get_film_metadata_models(ds_train=ds_train,
                                                  metadata_type=model_params[ModelParamsKW.METADATA],
@@ -117,10 +121,12 @@ def film_normalize_data(context, model_params, ds_train, ds_valid, path_output):
     return model_params, ds_train, ds_valid, train_onehotencoder
 
 
-def get_dataset(bids_df, loader_params, data_lst, transform_params, cuda_available, device, ds_type):
+def get_dataset(bids_df, loader_params, data_lst, transform_params, cuda_available, device, ds_type,
+                for_training=False):
     ds = imed_loader.load_dataset(bids_df, **{**loader_params, **{'data_list': data_lst,
                                                                   'transforms_params': transform_params,
-                                                                  'dataset_type': ds_type}}, device=device,
+                                                                  'dataset_type': ds_type,
+                                                                  'for_training': for_training}}, device=device,
                                   cuda_available=cuda_available)
     return ds
 
@@ -418,7 +424,7 @@ def run_command(context, n_gif=0, thr_increment=None, resume_training=False):
 
         # Get Training dataset
         ds_train = get_dataset(bids_df, loader_params, train_lst, transform_train_params, cuda_available, device,
-                               'training')
+                               'training', for_training=True)
         metric_fns = imed_metrics.get_metric_fns(ds_train.task)
 
         # If FiLM, normalize data
@@ -446,7 +452,9 @@ def run_command(context, n_gif=0, thr_increment=None, resume_training=False):
             metric_fns=metric_fns,
             n_gif=n_gif,
             resume_training=resume_training,
-            debugging=context[ConfigKW.DEBUGGING])
+            debugging=context[ConfigKW.DEBUGGING],
+            batch_transforms=imed_batch_transforms.get_batch_transforms(
+                transform_train_params, soft_gt=loader_params.get(LoaderParamsKW.SOFT_GT, False)))
 
     if thr_increment:
         # LOAD DATASET
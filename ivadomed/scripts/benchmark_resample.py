@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+import nibabel as nib
+import numpy as np
+from loguru import logger
+
+from ivadomed import utils as imed_utils
+from ivadomed import transforms as imed_transforms
+from ivadomed.keywords import MetadataKW
+from ivadomed.loader.sample_meta_data import SampleMetadata
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", required=False,
+                        help="""Input image (NIfTI). If not provided, a random volume of shape --shape and
+                                resolution 1 mm is used.""",
+                        metavar=imed_utils.Metavar.file)
+    parser.add_argument("-s", "--shape", required=False, nargs="+", type=int, default=[160, 160, 160],
+                        help="Shape of the random volume. Default: 160 160 160.",
+                        metavar=imed_utils.Metavar.int)
+    parser.add_argument("-r", "--resolution", required=False, nargs=3, type=float, default=[0.75, 0.75, 1.],
+                        help="Target resolution, in mm. Default: 0.75 0.75 1.",
+                        metavar=imed_utils.Metavar.float)
+    parser.add_argument("-b", "--backends", required=False, nargs="+", type=str,
+                        default=list(imed_transforms.RESAMPLING_BACKENDS),
+                        help="Resampling backends to compare. Default: all.",
+                        metavar=imed_utils.Metavar.str)
+    parser.add_argument("-n", "--number", required=False, type=int, default=5,
+                        help="Number of runs of each backend. Default: 5.",
+                        metavar=imed_utils.Metavar.int)
+    parser.add_argument("--2d", dest="is_2d", action="store_true",
+                        help="Resample the slices of the volume along the last axis, as the 2D loader does.")
+    return parser
+
+
+def run_benchmark(data, zooms, resolution, backends, number=5, is_2d=False):
+    """Compare the duration and result of the resampling backends of ``Resample``.
+
+    Each backend resamples the image and the binarized image as a label, ``number`` times, and the median duration is
+    reported with the maximal absolute difference with the result of the ``scipy`` backend. With ``is_2d``, the slices
+    are resampled one at a time, as by the 2D loader.
+
+    .. code-block:: bash
+
+        ivadomed_benchmark_resample -i t2.nii.gz -r 0.5 0.5 1 -n 10
+
+    Args:
+        data (ndarray): Image, of 3 dimensions.
+        zooms (list): Resolution of the image, in mm.
+        resolution (list): Target resolution, in mm.
+        backends (list): Resampling backends, keys of ``transforms.RESAMPLING_BACKENDS``.
+        number (int): Number of runs of each backend.
+        is_2d (bool): If True, the slices along the last axis are resampled one at a time.
+
+    Returns:
+        dict: Median duration of the image and label resampling, in seconds, and maximal absolute difference with the
+            ``scipy`` backend, for each backend.
+    """
+    data = data.astype(np.float32)
+    label = (data > np.mean(data)).astype(np.uint8)
+    samples = {'im': [data[..., i] for i in range(data.shape[-1])] if is_2d else [data],
+               'gt': [label[..., i] for i in range(label.shape[-1])] if is_2d else [label]}
+
+    def resample(transform, data_type):
+        outputs = []
+        for sample in samples[data_type]:
+            metadata = SampleMetadata({MetadataKW.ZOOMS: zooms, MetadataKW.DATA_TYPE: data_type})
+            outputs.append(transform(sample, metadata)[0])
+        return outputs
+
+    results, references = {}, {}
+    for backend in ["scipy"] + [backend for backend in backends if backend != "scipy"]:
+        transform = imed_transforms.Resample(*resolution, backend=backend)
+        results[backend] = {}
+        for data_type in ['im', 'gt']:
+            durations = []
+            for _ in range(number):
+                start = time.perf_counter()
+                outputs = resample(transform, data_type)
+                durations.append(time.perf_counter() - start)
+            references.setdefault(data_type, outputs)
+            difference = max(np.max(np.abs(output.astype(np.float32) - reference.astype(np.float32)))
+                             for output, reference in zip(outputs, references[data_type]))
+            results[backend][f'{data_type}_duration'] = float(np.median(durations))
+            results[backend][f'{data_type}_difference'] = float(difference)
+
+    results = {backend: result for backend, result in results.items() if backend in backends}
+    for backend, result in results.items():
+        logger.info(f"{backend}: image {result['im_duration']:.4f} s (max difference {result['im_difference']:.2e}), "
+                    f"label {result['gt_duration']:.4f} s (max difference {result['gt_difference']:.2e})")
+    return results
+
+
+def main(args=None):
+    imed_utils.init_ivadomed()
+    parser = get_parser()
+    args = imed_utils.get_arguments(parser, args)
+
+    if args.input is not None:
+        nii = nib.load(args.input)
+        data, zooms = nii.get_fdata(dtype=np.float32), list(nii.header.get_zooms()[:3])
+    else:
+        data, zooms = np.random.rand(*args.shape).astype(np.float32), [1.] * len(args.shape)
+    if data.ndim != 3:
+        raise ValueError(f"The image must have 3 dimensions, got {data.ndim}.")
+
+    for backend in args.backends:
+        if backend not in imed_transforms.RESAMPLING_BACKENDS:
+            raise ValueError(f"Unknown resampling backend {backend}, choose among "
+                             f"{list(imed_transforms.RESAMPLING_BACKENDS)}.")
+
+    run_benchmark(data, zooms, args.resolution, args.backends, args.number, args.is_2d)
+
+
+if __name__ == '__main__':
+    main()
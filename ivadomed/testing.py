@@ -19,7 +19,7 @@ from ivadomed.object_detection import utils as imed_obj_detect
 from ivadomed.loader.film import store_film_params, save_film_params
 from ivadomed.training import get_metadata
 from ivadomed.postprocessing import threshold_predictions
-from ivadomed.keywords import ConfigKW, ModelParamsKW, MetadataKW
+from ivadomed.keywords import ConfigKW, ModelParamsKW, MetadataKW, TrainingParamsKW
 
 cudnn.benchmark = True
 
@@ -45,12 +45,13 @@ def test(model_params, dataset_test, testing_params, path_output, device, cuda_a
     test_loader = DataLoader(dataset_test, batch_size=testing_params["batch_size"],
                              shuffle=False, pin_memory=True,
                              collate_fn=imed_loader_utils.imed_collate,
-                             num_workers=0)
+                             **imed_loader_utils.get_dataloader_worker_params(
+                                 testing_params.get(TrainingParamsKW.NUM_WORKERS), persistent_workers=False))
 
     # LOAD TRAIN MODEL
     fname_model = Path(path_output, "best_model.pt")
     logger.info('Loading model: {}'.format(fname_model))
-    model = torch.load(fname_model, map_location=device)
+    model = imed_inference.get_cached_model(str(fname_model), device)
     if cuda_available:
         model.cuda()
     model.eval()
@@ -363,7 +364,8 @@ def threshold_analysis(model_path, ds_lst, model_params, testing_params, metric=
     loader = DataLoader(ConcatDataset(ds_lst), batch_size=testing_params["batch_size"],
                         shuffle=False, pin_memory=True, sampler=None,
                         collate_fn=imed_loader_utils.imed_collate,
-                        num_workers=0)
+                        **imed_loader_utils.get_dataloader_worker_params(
+                            testing_params.get(TrainingParamsKW.NUM_WORKERS), persistent_workers=False))
 
     # Run inference
     preds_npy, gt_npy = run_inference(loader, model, model_params,
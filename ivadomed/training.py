@@ -1,5 +1,6 @@
 import copy
 import datetime
+import json
 import random
 import time
 import os
@@ -9,7 +10,7 @@ import torch.backends.cudnn as cudnn
 import wandb
 from loguru import logger
 from torch import optim
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, IterableDataset, RandomSampler, SequentialSampler
 from torch.utils.tensorboard import SummaryWriter
 from tqdm import tqdm
 from pathlib import Path
@@ -22,13 +23,15 @@ from ivadomed import utils as imed_utils
 from ivadomed import visualize as imed_visualize
 from ivadomed.loader import utils as imed_loader_utils
 from ivadomed.loader.balanced_sampler import BalancedSampler
+from ivadomed.loader.bucket_batch_sampler import BucketBatchSampler
 from ivadomed.keywords import ModelParamsKW, ConfigKW, BalanceSamplesKW, TrainingParamsKW, MetadataKW, WandbKW
 
 cudnn.benchmark = True
 
 
 def train(model_params, dataset_train, dataset_val, training_params, path_output, device, wandb_params=None,
-          cuda_available=True, metric_fns=None, n_gif=0, resume_training=False, debugging=False):
+          cuda_available=True, metric_fns=None, n_gif=0, resume_training=False, debugging=False,
+          batch_transforms=None):
     """Main command to train the network.
 
     Args:
@@ -47,6 +50,8 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
                                 training. This training state is saved everytime a new best model is saved in the log
                                 directory.
         debugging (bool): If True, extended verbosity and intermediate outputs.
+        batch_transforms (BatchCompose): Data augmentation applied to the training batches on the device, see
+            :mod:`ivadomed.batch_transforms`.
 
     Returns:
         float, float, float, float: best_training_dice, best_training_loss, best_validation_dice,
@@ -73,26 +78,45 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
         # Initialize WandB with metrics and hyperparameters
         wandb.init(project=project_name, group=group_name, name=run_name, config=cfg)
 
+    # The inputs of HeMIS are lists of modalities
+    if batch_transforms is not None and model_params[ModelParamsKW.NAME] == ConfigKW.HEMIS_UNET:
+        logger.warning("Batched transformations are not supported with HeMIS, they are not applied.")
+        batch_transforms = None
+
+    # Timers of the transforms of the datasets, if they are recorded
+    transform_timers = {dataset_type: get_transform_timer(dataset)
+                        for dataset_type, dataset in [("training", dataset_train), ("validation", dataset_val)]}
+
     # BALANCE SAMPLES AND PYTORCH LOADER
     conditions = all([training_params[TrainingParamsKW.BALANCE_SAMPLES][BalanceSamplesKW.APPLIED],
                       model_params[ModelParamsKW.NAME] != "HeMIS"])
     sampler_train, shuffle_train = get_sampler(dataset_train, conditions,
                                                training_params[TrainingParamsKW.BALANCE_SAMPLES][BalanceSamplesKW.TYPE])
 
-    train_loader = DataLoader(dataset_train, batch_size=training_params[TrainingParamsKW.BATCH_SIZE],
-                              shuffle=shuffle_train, pin_memory=True, sampler=sampler_train,
-                              collate_fn=imed_loader_utils.imed_collate,
-                              num_workers=0)
+    bucket_bool = training_params.get(TrainingParamsKW.BUCKET_BY_SHAPE, False)
+    batch_params_train = get_batch_params(dataset_train, sampler_train, shuffle_train,
+                                          training_params[TrainingParamsKW.BATCH_SIZE], bucket_bool)
+
+    # HeMIS curriculum learning, and the subjects loaded in the background, update the training dataset between
+    # epochs: workers must then be re-created at each epoch to see the update
+    worker_params = imed_loader_utils.get_dataloader_worker_params(
+        training_params.get(TrainingParamsKW.NUM_WORKERS),
+        persistent_workers=model_params[ModelParamsKW.NAME] != ConfigKW.HEMIS_UNET
+        and getattr(dataset_train, 'background_loading', None) is None)
+
+    train_loader = DataLoader(dataset_train, pin_memory=True, collate_fn=imed_loader_utils.imed_collate,
+                              **batch_params_train, **worker_params)
 
     gif_dict = {"image_path": [], "slice_id": [], "gif": []}
     if dataset_val:
         sampler_val, shuffle_val = get_sampler(dataset_val, conditions,
                                                training_params[TrainingParamsKW.BALANCE_SAMPLES][BalanceSamplesKW.TYPE])
 
-        val_loader = DataLoader(dataset_val, batch_size=training_params[TrainingParamsKW.BATCH_SIZE],
-                                shuffle=shuffle_val, pin_memory=True, sampler=sampler_val,
-                                collate_fn=imed_loader_utils.imed_collate,
-                                num_workers=0)
+        val_loader = DataLoader(dataset_val, pin_memory=True, collate_fn=imed_loader_utils.imed_collate,
+                                **get_batch_params(dataset_val, sampler_val, shuffle_val,
+                                                   training_params[TrainingParamsKW.BATCH_SIZE], bucket_bool),
+                                **imed_loader_utils.get_dataloader_worker_params(
+                                    training_params.get(TrainingParamsKW.NUM_WORKERS)))
 
         # Init GIF
         if n_gif > 0:
@@ -182,11 +206,20 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
         if wandb_tracking:
             wandb.log({"learning_rate": lr})
 
+        # Add the training subjects loaded in the background since the previous epoch
+        if getattr(dataset_train, 'background_loading', None) is not None:
+            dataset_train.update_loaded()
+            if dataset_train.background_loading is not None:
+                logger.info(f"Epoch {epoch}: training on the {len(dataset_train)} samples of the "
+                            f"{dataset_train.background_loading.n_loaded} subjects loaded so far.")
+
         # Training loop -----------------------------------------------------------
         model.train()
         train_loss_total, train_dice_loss_total = 0.0, 0.0
         num_steps = 0
         for i, batch in enumerate(train_loader):
+            update_transform_timer(transform_timers["training"], batch)
+
             # GET SAMPLES
             if model_params[ModelParamsKW.NAME] == ConfigKW.HEMIS_UNET:
                 input_samples = imed_utils.cuda(imed_utils.unstack_tensors(batch["input"]), cuda_available)
@@ -194,6 +227,10 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
                 input_samples = imed_utils.cuda(batch["input"], cuda_available)
             gt_samples = imed_utils.cuda(batch["gt"], cuda_available, non_blocking=True)
 
+            # BATCH DATA AUGMENTATION
+            if batch_transforms is not None:
+                input_samples, gt_samples = batch_transforms(input_samples, gt_samples)
+
             # MIXUP
             if training_params["mixup_alpha"]:
                 input_samples, gt_samples = imed_mixup.mixup(input_samples, gt_samples, training_params["mixup_alpha"],
@@ -244,6 +281,8 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
             model_params[ModelParamsKW.MISSING_PROBABILITY] **= model_params[ModelParamsKW.MISSING_PROBABILITY_GROWTH]
             dataset_train.update(p=model_params[ModelParamsKW.MISSING_PROBABILITY])
 
+        log_transform_timer(writer, "training", transform_timers["training"], epoch)
+
         # Validation loop -----------------------------------------------------
         model.eval()
         val_loss_total, val_dice_loss_total = 0.0, 0.0
@@ -251,6 +290,7 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
         metric_mgr = imed_metrics.MetricManager(metric_fns)
         if dataset_val:
             for i, batch in enumerate(val_loader):
+                update_transform_timer(transform_timers["validation"], batch)
                 with torch.no_grad():
                     # GET SAMPLES
                     if model_params[ModelParamsKW.NAME] == ConfigKW.HEMIS_UNET:
@@ -306,6 +346,7 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
                 'train_loss': train_loss_total_avg,
                 'val_loss': val_loss_total_avg,
             }, epoch)
+            log_transform_timer(writer, "validation", transform_timers["validation"], epoch)
             # log on wandb if the corresponding dictionary is provided
             if wandb_tracking:
                 wandb.log({"validation-metrics": metrics_dict})
@@ -390,6 +431,14 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
         path_gif_out = Path(gif_folder, fname_out)
         gif_dict["gif"][i_gif].save(str(path_gif_out))
 
+    # Save the durations of the transforms
+    if any(timer is not None for timer in transform_timers.values()):
+        path_timing = Path(path_output, "transform_timing.json")
+        with path_timing.open(mode='w') as fp:
+            json.dump({dataset_type: timer.get_stats() for dataset_type, timer in transform_timers.items()
+                       if timer is not None}, fp, indent=4)
+        logger.info(f"Durations of the transforms saved in {path_timing}.")
+
     writer.close()
     wandb.finish()
     final_time = time.time()
@@ -401,6 +450,47 @@ def train(model_params, dataset_train, dataset_val, training_params, path_output
     return best_training_dice, best_training_loss, best_validation_dice, best_validation_loss
 
 
+def get_transform_timer(ds):
+    """Get the timer of the transforms of a dataset.
+
+    Args:
+        ds (Dataset): Dataset, or None.
+
+    Returns:
+        TransformTimer: Timer of the transforms, or None if they are not recorded, see ``transform_timing`` in
+            :doc:`configuration_file`.
+    """
+    return getattr(getattr(ds, 'transform', None), 'timer', None)
+
+
+def update_transform_timer(timer, batch):
+    """Add the calls of the transforms saved in the metadata of a batch by the DataLoader workers to a timer.
+
+    Args:
+        timer (TransformTimer): Timer of the transforms, or None.
+        batch (dict): Batch.
+    """
+    if timer is not None:
+        timer.update([batch.get(MetadataKW.INPUT_METADATA), batch.get(MetadataKW.GT_METADATA),
+                      batch.get(MetadataKW.ROI_METADATA)])
+
+
+def log_transform_timer(writer, dataset_type, timer, epoch):
+    """Write the mean duration of each transform since the beginning of the training on TensorBoard, in ms.
+
+    Args:
+        writer (SummaryWriter): TensorBoard writer.
+        dataset_type (str): "training" or "validation".
+        timer (TransformTimer): Timer of the transforms, or None.
+        epoch (int): Epoch.
+    """
+    if timer is None:
+        return
+    for data_type, stats_data_type in timer.get_stats().items():
+        for name, stats in stats_data_type.items():
+            writer.add_scalar(f'Transforms/{dataset_type}/{data_type}/{name}', stats['mean_time'] * 1000, epoch)
+
+
 def get_sampler(ds, balance_bool, metadata):
     """Get sampler.
 
@@ -411,13 +501,51 @@ def get_sampler(ds, balance_bool, metadata):
     Returns:
         If balance_bool is True: Returns BalancedSampler, Bool: Sampler and boolean for shuffling (set to False).
         Otherwise: Returns None and True.
+        Streamed datasets are shuffled by the dataset itself: Returns None and False.
     """
+    if isinstance(ds, IterableDataset):
+        if balance_bool:
+            logger.warning("Samples cannot be balanced when the dataset is streamed.")
+        return None, False
+    if balance_bool and getattr(ds, 'background_loading', None) is not None:
+        logger.info("Waiting for all the subjects to be loaded to balance the samples.")
+        ds.wait_loaded()
     if balance_bool:
         return BalancedSampler(ds, metadata), False
     else:
         return None, True
 
 
+def get_batch_params(ds, sampler, shuffle, batch_size, bucket_bool):
+    """Get the batching parameters of the DataLoader.
+
+    Args:
+        ds (BidsDataset): BidsDataset object.
+        sampler (Sampler): Sampler returned by :func:`get_sampler`, or None.
+        shuffle (bool): Whether to shuffle the samples, returned by :func:`get_sampler`.
+        batch_size (int): Size of the batches.
+        bucket_bool (bool): If True, the samples are batched with the samples of the same shape, see
+            :class:`BucketBatchSampler`.
+
+    Returns:
+        dict: DataLoader parameters, either a ``BucketBatchSampler`` or the batch size, sampler and shuffling.
+    """
+    if bucket_bool:
+        if isinstance(ds, IterableDataset) or not hasattr(ds, 'sample_shapes'):
+            logger.warning("Samples cannot be batched by shape with this dataset: the batches are built regardless "
+                           "of the shapes.")
+        else:
+            if getattr(ds, 'background_loading', None) is not None:
+                logger.info("Waiting for all the subjects to be loaded to batch the samples by shape.")
+                ds.wait_loaded()
+            if sampler is None:
+                sampler = RandomSampler(ds) if shuffle else SequentialSampler(ds)
+            batch_sampler = BucketBatchSampler(sampler, ds.sample_shapes, batch_size)
+            logger.info(f"Batching samples by shape: {batch_sampler.n_buckets} distinct shapes.")
+            return {'batch_sampler': batch_sampler}
+    return {'batch_size': batch_size, 'shuffle': shuffle, 'sampler': sampler}
+
+
 def get_scheduler(params, optimizer, num_epochs=0):
     """Get scheduler.
 
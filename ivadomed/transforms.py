@@ -3,6 +3,8 @@ import functools
 import math
 import numbers
 import random
+import threading
+import time
 
 from typing import Tuple
 
@@ -12,13 +14,16 @@ from loguru import logger
 from scipy.ndimage import zoom
 from scipy.ndimage import gaussian_filter, map_coordinates, affine_transform, label, center_of_mass, binary_dilation, \
     binary_fill_holes, binary_closing
+from scipy.sparse import csr_matrix
 from skimage.exposure import equalize_adapthist
+from torch.utils.data import get_worker_info
 from torchvision import transforms as torchvision_transforms
 import torchio as tio
 
 
 from ivadomed.loader import utils as imed_loader_utils
 from ivadomed.keywords import TransformationKW, MetadataKW
+from ivadomed.loader.sample_meta_data import SampleMetadata
 
 
 def multichannel_capable(wrapped):
@@ -88,6 +93,133 @@ class ImedTransform(object):
         raise NotImplementedError("You need to implement the transform() method.")
 
 
+class TransformTimer(object):
+    """Aggregate the wall time, number of calls and input size of the transforms, per transform and data type.
+
+    The transforms run by a ``Compose`` or ``UndoCompose`` with a timer are recorded with :meth:`record`. The
+    DataLoader workers hold copies of the timer: their calls are saved in the metadata of the samples instead, under
+    ``MetadataKW.TRANSFORM_TIMINGS``, and added to the timer of the main process with :meth:`update` when the batches
+    are received.
+
+    Attributes:
+        stats (dict): For each data type ("im", "gt" or "roi") and transform name, the number of calls, total duration
+            in seconds and total number of input voxels.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # The lock cannot be pickled, e.g. for the DataLoader workers
+        return {'stats': self.stats}
+
+    def __setstate__(self, state):
+        self.stats = state['stats']
+        self.lock = threading.Lock()
+
+    def record(self, name, data_type, duration, size):
+        """Record a call of a transform.
+
+        Args:
+            name (str): Name of the transform.
+            data_type (str): Data type of the sample, "im", "gt" or "roi".
+            duration (float): Wall time of the call, in seconds.
+            size (int): Number of voxels of the input.
+        """
+        with self.lock:
+            stats = self.stats.setdefault(data_type, {}).setdefault(name, {'calls': 0, 'time': 0., 'size': 0})
+            stats['calls'] += 1
+            stats['time'] += duration
+            stats['size'] += size
+
+    def update(self, metadata):
+        """Record the calls saved in the metadata of samples, and remove them from the metadata.
+
+        Args:
+            metadata (list or SampleMetadata): Metadata of samples, or nested lists of metadata, e.g. the
+                ``input_metadata``, ``gt_metadata`` and ``roi_metadata`` of a batch.
+        """
+        if isinstance(metadata, (list, tuple)):
+            for metadata_cur in metadata:
+                self.update(metadata_cur)
+        elif isinstance(metadata, SampleMetadata) and MetadataKW.TRANSFORM_TIMINGS in metadata.metadata:
+            for record in metadata.metadata.pop(MetadataKW.TRANSFORM_TIMINGS):
+                self.record(*record)
+
+    def get_stats(self):
+        """Get the statistics of the recorded transforms.
+
+        Returns:
+            dict: For each data type and transform name, the number of calls, total and mean duration in seconds, and
+                mean number of input voxels.
+        """
+        with self.lock:
+            return {data_type: {name: {'calls': stats['calls'],
+                                       'time': stats['time'],
+                                       'mean_time': stats['time'] / stats['calls'],
+                                       'mean_size': stats['size'] / stats['calls']}
+                                for name, stats in stats_data_type.items()}
+                    for data_type, stats_data_type in self.stats.items()}
+
+    def reset(self):
+        """Remove the recorded calls."""
+        with self.lock:
+            self.stats = {}
+
+
+def get_sample_size(sample):
+    """Get the number of voxels of a sample.
+
+    Args:
+        sample (ndarray or Tensor or list): Sample, or list of channels.
+
+    Returns:
+        int: Number of voxels.
+    """
+    if isinstance(sample, (list, tuple)):
+        return sum(get_sample_size(sample_cur) for sample_cur in sample)
+    if torch.is_tensor(sample):
+        return sample.numel()
+    return int(np.size(sample)) if sample is not None else 0
+
+
+def run_timed(timer, transforms, sample, metadata, data_type, undo=False):
+    """Apply transforms one after the other, and record their calls in a timer.
+
+    The calls are recorded with the name of the transform class, suffixed by ".undo_transform" for the undo. In a
+    DataLoader worker, they are saved in the metadata of the first channel of the sample, see :class:`TransformTimer`.
+
+    Args:
+        timer (TransformTimer): Timer.
+        transforms (list): Transforms, in the order they are applied.
+        sample (ndarray or list): Sample, or list of channels.
+        metadata (SampleMetadata or list): Metadata of the sample, or of each channel.
+        data_type (str): Data type of the sample, "im", "gt" or "roi".
+        undo (bool): If True, the ``undo_transform`` of the transforms is applied.
+
+    Returns:
+        ndarray or list, SampleMetadata or list: Transformed sample and metadata.
+    """
+    records = []
+    for tr in transforms:
+        size = get_sample_size(sample)
+        start = time.perf_counter()
+        sample, metadata = tr.undo_transform(sample, metadata) if undo else tr(sample, metadata)
+        name = type(tr).__name__ + (".undo_transform" if undo else "")
+        records.append((name, data_type, time.perf_counter() - start, size))
+
+    metadata_record = metadata[0] if isinstance(metadata, list) and len(metadata) else metadata
+    if get_worker_info() is not None and isinstance(metadata_record, SampleMetadata):
+        if MetadataKW.TRANSFORM_TIMINGS not in metadata_record.metadata:
+            metadata_record[MetadataKW.TRANSFORM_TIMINGS] = []
+        metadata_record[MetadataKW.TRANSFORM_TIMINGS].extend(records)
+    else:
+        for record in records:
+            timer.record(*record)
+    return sample, metadata
+
+
 class Compose(object):
     """Composes transforms together.
 
@@ -102,14 +234,23 @@ class Compose(object):
             and the value their parameters.
         requires_undo (bool): If True, does not include transforms which do not have an undo_transform
             implemented yet.
+        compose_geometry (bool): If True, consecutive spatial transforms are applied with a single resampling, see
+            :class:`ComposedGeometry`.
+        timer (TransformTimer): If not None, the wall time, number of calls and input size of each transform are
+            recorded in this timer.
+        skip_batched (bool): If True, the transforms marked as ``batched``, and ``NormalizeInstance`` after them, are
+            not included: they are applied to the training batches, see :class:`ivadomed.batch_transforms.BatchCompose`.
+            Otherwise, they are applied to the samples as the other transforms.
 
     Args:
         transform (dict): Keys are "im", "gt", "roi" and values are torchvision_transforms.Compose of the
             transformations of interest.
+        timer (TransformTimer): Timer of the transforms, or None.
     """
 
-    def __init__(self, dict_transforms, requires_undo=False):
+    def __init__(self, dict_transforms, requires_undo=False, compose_geometry=False, timer=None, skip_batched=False):
         list_tr_im, list_tr_gt, list_tr_roi = [], [], []
+        is_after_batched = False
         for transform in dict_transforms.keys():
             parameters = dict_transforms[transform]
 
@@ -123,7 +264,15 @@ class Compose(object):
             if transform in globals():
                 if transform == "NumpyToTensor":
                     continue
-                params_cur = {k: parameters[k] for k in parameters if k != "applied_to" and k != "preprocessing"}
+                # Applied to the training batches, see ivadomed.batch_transforms
+                if parameters.get(TransformationKW.BATCHED):
+                    is_after_batched = True
+                    if skip_batched:
+                        continue
+                elif skip_batched and is_after_batched and transform == TransformationKW.NORMALIZEINSTANCE:
+                    continue
+                params_cur = {k: parameters[k] for k in parameters
+                              if k not in ["applied_to", "preprocessing", TransformationKW.BATCHED]}
                 transform_obj = globals()[transform](**params_cur)
             else:
                 raise ValueError('ERROR: {} transform is not available. '
@@ -142,29 +291,59 @@ class Compose(object):
             if "gt" in list_applied_to:
                 list_tr_gt.append(transform_obj)
 
+        if compose_geometry:
+            list_tr_im, list_tr_gt, list_tr_roi = [self.group_geometry(list_tr)
+                                                   for list_tr in [list_tr_im, list_tr_gt, list_tr_roi]]
+
         self.transform = {
             "im": torchvision_transforms.Compose(list_tr_im),
             "gt": torchvision_transforms.Compose(list_tr_gt),
             "roi": torchvision_transforms.Compose(list_tr_roi)}
+        self.timer = timer
+
+    @staticmethod
+    def group_geometry(transforms):
+        """Replace the consecutive spatial transforms of a list by :class:`ComposedGeometry` transforms.
+
+        Args:
+            transforms (list): Transforms, in the order they are applied.
+
+        Returns:
+            list: Transforms, where each run of spatial transforms is a ``ComposedGeometry``.
+        """
+        transforms_out, run = [], []
+        for transform in transforms + [None]:
+            if hasattr(transform, 'transform_coordinates'):
+                run.append(transform)
+                continue
+            if run:
+                transforms_out.append(ComposedGeometry(run))
+                run = []
+            if transform is not None:
+                transforms_out.append(transform)
+        return transforms_out
 
     def __call__(self, sample, metadata, data_type='im', preprocessing=False):
         if self.transform[data_type] is None or len(metadata) == 0:
             # In case self.transform[data_type] is None
             return None, None
         else:
-            for tr in self.transform[data_type].transforms:
-                sample, metadata = tr(sample, metadata)
-
+            transforms = self.transform[data_type].transforms
             if not preprocessing:
-                numpy_to_tensor = NumpyToTensor()
-                sample, metadata = numpy_to_tensor(sample, metadata)
+                transforms = transforms + [NumpyToTensor()]
+
+            if self.timer is not None:
+                return run_timed(self.timer, transforms, sample, metadata, data_type)
+            for tr in transforms:
+                sample, metadata = tr(sample, metadata)
             return sample, metadata
 
 
 class UndoCompose(object):
     """Undo the Compose transformations.
 
-    Call the undo transformations in the inverse order than the "do transformations".
+    Call the undo transformations in the inverse order than the "do transformations". They are recorded in the timer
+    of the Compose, if any.
 
     Attributes:
         compose (torchvision_transforms.Compose):
@@ -181,9 +360,11 @@ class UndoCompose(object):
             # In case self.transforms.transform[data_type] is None
             return None, None
         else:
-            numpy_to_tensor = NumpyToTensor()
-            sample, metadata = numpy_to_tensor.undo_transform(sample, metadata)
-            for tr in self.transforms.transform[data_type].transforms[::-1]:
+            transforms = [NumpyToTensor()] + self.transforms.transform[data_type].transforms[::-1]
+            timer = getattr(self.transforms, 'timer', None)
+            if timer is not None:
+                return run_timed(timer, transforms, sample, metadata, data_type, undo=True)
+            for tr in transforms:
                 sample, metadata = tr.undo_transform(sample, metadata)
             return sample, metadata
 
@@ -220,21 +401,156 @@ class NumpyToTensor(ImedTransform):
         return torch.from_numpy(arr_contig), metadata
 
 
+def resample_scipy(data, output_shape, order):
+    """Resample an array to a given shape with ``scipy.ndimage.zoom``.
+
+    Args:
+        data (ndarray): Array.
+        output_shape (tuple): Shape of the resampled array.
+        order (int): Order of the spline interpolation.
+
+    Returns:
+        ndarray: Resampled array.
+    """
+    return zoom(data, zoom=[size_out / size_in for size_out, size_in in zip(output_shape, data.shape)], order=order)
+
+
+@functools.lru_cache(maxsize=256)
+def get_resampling_matrix(size_in, size_out, order):
+    """Get the sparse matrix of the 1D spline interpolation of ``scipy.ndimage.zoom`` along an axis.
+
+    The matrix is the zoom of each unit vector, including the spline prefilter, so that applying it along each axis
+    of an array gives the result of ``zoom``. The matrices are cached, and shared by the slices and volumes of the same
+    size.
+
+    Args:
+        size_in (int): Size of the axis.
+        size_out (int): Size of the resampled axis.
+        order (int): Order of the spline interpolation.
+
+    Returns:
+        csr_matrix: Matrix, of shape (size_out, size_in).
+    """
+    matrix = zoom(np.eye(size_in), (1, size_out / size_in), order=order).T
+    # The weights of the spline prefilter decay exponentially with the distance
+    matrix[np.abs(matrix) < 1e-7] = 0
+    return csr_matrix(matrix.astype(np.float32))
+
+
+def resample_separable(data, output_shape, order):
+    """Resample an array to a given shape with the spline interpolation of ``scipy.ndimage.zoom``, one axis at a time.
+
+    Each axis is resampled by a sparse matrix product, see :func:`get_resampling_matrix`, and the axes whose size is
+    unchanged are skipped. The result is the one of :func:`resample_scipy`, up to the float32 precision.
+
+    Args:
+        data (ndarray): Array.
+        output_shape (tuple): Shape of the resampled array.
+        order (int): Order of the spline interpolation.
+
+    Returns:
+        ndarray: Resampled array, in float32.
+    """
+    data_out = data
+    for axis, (size_in, size_out) in enumerate(zip(data.shape, output_shape)):
+        if size_in == size_out:
+            continue
+        moved = np.moveaxis(data_out, axis, 0)
+        resampled = get_resampling_matrix(size_in, size_out, order) @ moved.reshape(size_in, -1).astype(np.float32)
+        data_out = np.moveaxis(resampled.reshape((size_out,) + moved.shape[1:]), 0, axis)
+    return data_out
+
+
+def resample_torch(data, output_shape, order):
+    """Resample an array to a given shape with the linear interpolation of ``torch.nn.functional.interpolate``.
+
+    The interpolation is linear whatever the order. The axes whose size is unchanged are moved to the batch axis of
+    ``interpolate``, so that only the resampled axes are interpolated. Same result as :func:`resample_scipy` with an
+    order of 1, up to the float32 precision.
+
+    Args:
+        data (ndarray): Array.
+        output_shape (tuple): Shape of the resampled array.
+        order (int): Order of the spline interpolation, not used.
+
+    Returns:
+        ndarray: Resampled array, in float32.
+    """
+    resampled_axes = [axis for axis, (size_in, size_out) in enumerate(zip(data.shape, output_shape))
+                      if size_in != size_out]
+    if not resampled_axes:
+        return data
+    if len(resampled_axes) > 3:
+        raise ValueError(f"At most 3 axes can be resampled, got {len(resampled_axes)}.")
+    axes = [axis for axis in range(data.ndim) if axis not in resampled_axes] + resampled_axes
+
+    moved = np.ascontiguousarray(np.transpose(data, axes), dtype=np.float32)
+    tensor = torch.from_numpy(moved).reshape((-1, 1) + moved.shape[data.ndim - len(resampled_axes):])
+    mode = ['linear', 'bilinear', 'trilinear'][len(resampled_axes) - 1]
+    resampled = torch.nn.functional.interpolate(tensor, size=[output_shape[axis] for axis in resampled_axes],
+                                                mode=mode, align_corners=True).numpy()
+    resampled = resampled.reshape(moved.shape[:data.ndim - len(resampled_axes)] +
+                                  tuple(output_shape[axis] for axis in resampled_axes))
+    return np.transpose(resampled, np.argsort(axes))
+
+
+# Resampling backends of Resample: functions resampling an array to a given shape with a given interpolation order
+RESAMPLING_BACKENDS = {
+    "scipy": resample_scipy,
+    "separable": resample_separable,
+    "torch": resample_torch,
+}
+
+
 class Resample(ImedTransform):
     """
     Resample image to a given resolution.
 
+    The interpolation is done by a backend of ``RESAMPLING_BACKENDS``, with an order of 2 for images and of 1 for label
+    data:
+
+    - ``"scipy"``: ``scipy.ndimage.zoom``.
+    - ``"separable"``: the interpolation of ``zoom`` applied one axis at a time, with cached sparse matrices, see
+      :func:`resample_separable`. Faster, same result.
+    - ``"torch"``: linear interpolation of ``torch.nn.functional.interpolate``, for images too, see
+      :func:`resample_torch`. Fastest.
+
+    The axes whose size does not change are not interpolated.
+
     Args:
         hspace (float): Resolution along the first axis, in mm.
         wspace (float): Resolution along the second axis, in mm.
         dspace (float): Resolution along the third axis, in mm.
-        interpolation_order (int): Order of spline interpolation. Set to 0 for label data. Default=2.
+        backend (str): Resampling backend, a key of ``RESAMPLING_BACKENDS``.
     """
 
-    def __init__(self, hspace, wspace, dspace=1.):
+    def __init__(self, hspace, wspace, dspace=1., backend="scipy"):
+        if backend not in RESAMPLING_BACKENDS:
+            raise ValueError(f"Unknown resampling backend {backend}, choose among {list(RESAMPLING_BACKENDS)}.")
         self.hspace = hspace
         self.wspace = wspace
         self.dspace = dspace
+        self.backend = backend
+
+    def resample(self, sample, output_shape, order):
+        """Resample a sample to a given shape with the backend, in the dtype of the sample.
+
+        Args:
+            sample (ndarray): Sample.
+            output_shape (tuple): Shape of the resampled sample.
+            order (int): Order of the spline interpolation.
+
+        Returns:
+            ndarray: Resampled sample.
+        """
+        if tuple(output_shape) == sample.shape:
+            return sample.copy()
+        data_out = RESAMPLING_BACKENDS[self.backend](sample, output_shape, order)
+        # Integers are rounded half away from zero and clipped, as by zoom
+        if np.issubdtype(sample.dtype, np.integer) and not np.issubdtype(data_out.dtype, np.integer):
+            dtype_info = np.iinfo(sample.dtype)
+            data_out = np.clip(np.trunc(data_out + np.copysign(0.5, data_out)), dtype_info.min, dtype_info.max)
+        return data_out.astype(sample.dtype)
 
     @multichannel_capable
     @two_dim_compatible
@@ -251,12 +567,8 @@ class Resample(ImedTransform):
             params_undo[-1] = 1.0
 
         # Undo resampling
-        data_out = zoom(sample,
-                        zoom=params_undo,
-                        order=1 if metadata[MetadataKW.DATA_TYPE] == 'gt' else 2)
-
-        # Data type
-        data_out = data_out.astype(sample.dtype)
+        output_shape = tuple(int(round(size * factor)) for size, factor in zip(current_shape, params_undo))
+        data_out = self.resample(sample, output_shape, order=1 if metadata[MetadataKW.DATA_TYPE] == 'gt' else 2)
 
         return data_out, metadata
 
@@ -280,13 +592,9 @@ class Resample(ImedTransform):
         dfactor = zooms[2] / self.dspace
         params_resample = (hfactor, wfactor, dfactor) if not is_2d else (hfactor, wfactor, 1.0)
 
-        # Run resampling
-        data_out = zoom(sample,
-                        zoom=params_resample,
-                        order=1 if metadata[MetadataKW.DATA_TYPE] == 'gt' else 2)
-
-        # Data type
-        data_out = data_out.astype(sample.dtype)
+        # Run resampling, to the shape of zoom
+        output_shape = tuple(int(round(size * factor)) for size, factor in zip(sample.shape, params_resample))
+        data_out = self.resample(sample, output_shape, order=1 if metadata[MetadataKW.DATA_TYPE] == 'gt' else 2)
 
         return data_out, metadata
 
@@ -701,9 +1009,20 @@ class RandomAffine(ImedTransform):
                 translate.append(0.0)
         self.translate = translate
 
-    @multichannel_capable
-    @two_dim_compatible
-    def __call__(self, sample, metadata=None):
+    # Boundary mode of the resampling
+    mode = 'constant'
+
+    def get_affine(self, shape, metadata):
+        """Get the affine transformation of a sample, drawn randomly unless its parameters are in the metadata.
+
+        Args:
+            shape (tuple): Shape of the sample, of length 3.
+            metadata (SampleMetadata): Metadata of the sample, where the drawn parameters are saved.
+
+        Returns:
+            ndarray, ndarray: Matrix and offset mapping the coordinates of the output voxels to the sample, as
+                ``affine_transform``: ``input = matrix.T @ output + offset``.
+        """
         # Rotation
         # If angle and metadata have been already defined for this sample, then use them
         if MetadataKW.ROTATION in metadata:
@@ -713,7 +1032,7 @@ class RandomAffine(ImedTransform):
             # Get the random angle
             angle = math.radians(np.random.uniform(self.degrees[0], self.degrees[1]))
             # Get the two axes that define the plane of rotation
-            axes = list(random.sample(range(3 if sample.shape[2] > 1 else 2), 2))
+            axes = list(random.sample(range(3 if shape[2] > 1 else 2), 2))
             axes.sort()
             # Save params
             metadata[MetadataKW.ROTATION] = [angle, axes]
@@ -731,7 +1050,7 @@ class RandomAffine(ImedTransform):
         if MetadataKW.TRANSLATION in metadata:
             translations = metadata[MetadataKW.TRANSLATION]
         else:
-            self.data_shape = sample.shape
+            self.data_shape = shape
 
             if self.translate is not None:
                 max_dx = self.translate[0] * self.data_shape[0]
@@ -746,7 +1065,7 @@ class RandomAffine(ImedTransform):
             metadata[MetadataKW.TRANSLATION] = translations
 
         # Do rotation
-        shape = 0.5 * np.array(sample.shape)
+        center = 0.5 * np.array(shape)
         if axes == [0, 1]:
             rotate = np.array([[math.cos(angle), -math.sin(angle), 0],
                                [math.sin(angle), math.cos(angle), 0],
@@ -768,9 +1087,30 @@ class RandomAffine(ImedTransform):
         else:
             transforms = rotate.dot(scale)
 
-        offset = shape - shape.dot(transforms) + translations
+        offset = center - center.dot(transforms) + translations
+        return transforms, offset
+
+    def transform_coordinates(self, coords, shape, metadata):
+        """Map coordinates of the output of the transformation to the sample, see :class:`ComposedGeometry`.
 
-        data_out = affine_transform(sample, transforms.T, order=1, offset=offset,
+        Args:
+            coords (ndarray): Coordinates, of shape (3, ) + ``shape``. None for the voxels of the output.
+            shape (tuple): Shape of the sample, of length 3.
+            metadata (SampleMetadata): Metadata of the sample.
+
+        Returns:
+            ndarray: Coordinates in the sample.
+        """
+        transforms, offset = self.get_affine(shape, metadata)
+        if coords is None:
+            coords = np.indices(shape, dtype=np.float32)
+        return (np.tensordot(transforms.T, coords, axes=1) + offset.reshape(3, 1, 1, 1)).astype(np.float32)
+
+    @multichannel_capable
+    @two_dim_compatible
+    def __call__(self, sample, metadata=None):
+        transforms, offset = self.get_affine(sample.shape, metadata)
+        data_out = affine_transform(sample, transforms.T, order=1, offset=offset, mode=self.mode,
                                     output_shape=sample.shape).astype(sample.dtype)
 
         return data_out, metadata
@@ -801,16 +1141,51 @@ class RandomAffine(ImedTransform):
 class RandomReverse(ImedTransform):
     """Make a randomized symmetric inversion of the different values of each dimensions."""
 
+    # Boundary mode of the resampling, the flipped coordinates are in the sample
+    mode = 'constant'
+
+    @staticmethod
+    def get_flip_axes(metadata):
+        """Get the flipped axes of a sample, drawn randomly unless they are in the metadata.
+
+        Args:
+            metadata (SampleMetadata): Metadata of the sample, where the drawn axes are saved.
+
+        Returns:
+            list: Whether each of the 3 axes is flipped.
+        """
+        if MetadataKW.REVERSE in metadata:
+            return metadata[MetadataKW.REVERSE]
+        # Flip axis booleans
+        flip_axes = [np.random.randint(2) == 1 for _ in [0, 1, 2]]
+        # Save in metadata
+        metadata[MetadataKW.REVERSE] = flip_axes
+        return flip_axes
+
+    def transform_coordinates(self, coords, shape, metadata):
+        """Map coordinates of the output of the transformation to the sample, see :class:`ComposedGeometry`.
+
+        Args:
+            coords (ndarray): Coordinates, of shape (3, ) + ``shape``. None for the voxels of the output.
+            shape (tuple): Shape of the sample, of length 3.
+            metadata (SampleMetadata): Metadata of the sample.
+
+        Returns:
+            ndarray: Coordinates in the sample, None if no axis is flipped and ``coords`` is None.
+        """
+        flip_axes = self.get_flip_axes(metadata)
+        if not any(flip_axes):
+            return coords
+        coords = np.indices(shape, dtype=np.float32) if coords is None else coords.copy()
+        for idx_axis, flip_bool in enumerate(flip_axes):
+            if flip_bool:
+                coords[idx_axis] = shape[idx_axis] - 1 - coords[idx_axis]
+        return coords
+
     @multichannel_capable
     @two_dim_compatible
     def __call__(self, sample, metadata=None):
-        if MetadataKW.REVERSE in metadata:
-            flip_axes = metadata[MetadataKW.REVERSE]
-        else:
-            # Flip axis booleans
-            flip_axes = [np.random.randint(2) == 1 for _ in [0, 1, 2]]
-            # Save in metadata
-            metadata[MetadataKW.REVERSE] = flip_axes
+        flip_axes = self.get_flip_axes(metadata)
 
         # Run flip
         for idx_axis, flip_bool in enumerate(flip_axes):
@@ -863,6 +1238,95 @@ class RandomShiftIntensity(ImedTransform):
         return data, metadata
 
 
+def get_bspline_basis(size, spacing, phase=0.):
+    """Get the cubic B-spline basis of a grid of control points along an axis.
+
+    The control points are spaced by ``spacing`` voxels, the first one at ``- spacing - phase``, and cover the axis
+    with the support of their B-spline.
+
+    Args:
+        size (int): Number of voxels along the axis.
+        spacing (float): Spacing of the control points, in voxels.
+        phase (float): Shift of the grid of control points, in voxels.
+
+    Returns:
+        ndarray: Weight of each control point (columns) for each voxel (rows), at most 4 non-zero weights per row.
+    """
+    n_points = int(math.ceil((size - 1 + phase) / spacing)) + 3
+    t = np.abs((np.arange(size)[:, np.newaxis] + phase) / spacing - (np.arange(n_points)[np.newaxis, :] - 1))
+    return np.where(t < 1, 2 / 3 - t ** 2 + t ** 3 / 2, np.where(t < 2, (2 - t) ** 3 / 6, 0.))
+
+
+def get_gaussian_kernel(sigma, truncate=4.0):
+    """Get the normalized 1D Gaussian kernel of ``scipy.ndimage.gaussian_filter``.
+
+    Args:
+        sigma (float): Standard deviation, in voxels.
+        truncate (float): Radius of the kernel, in standard deviations.
+
+    Returns:
+        ndarray: Kernel.
+    """
+    radius = int(truncate * sigma + 0.5)
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / max(sigma, 1e-6)) ** 2)
+    return kernel / kernel.sum()
+
+
+def get_control_grid_bases(shape, sigma):
+    """Get the B-spline bases and the control point standard deviation of a control grid field.
+
+    The field has the same standard deviation and correlation length as uniform noise in [-1, 1] smoothed with
+    ``gaussian_filter(noise, sigma, mode="constant")``, away from the borders. The correlation of the smoothed noise is
+    a Gaussian of standard deviation ``sigma * sqrt(2)``, as for B-splines spaced by ``sigma * sqrt(3)``. The grid is
+    shifted randomly so that the statistics do not depend on the position of the voxels. Axes of size 1 are not
+    interpolated.
+
+    Args:
+        shape (tuple): Shape of the field.
+        sigma (float): Standard deviation of the Gaussian filter, in voxels.
+
+    Returns:
+        list, float: Basis of each axis, see :func:`get_bspline_basis`, and standard deviation of the control points.
+    """
+    spacing = max(sigma, 1e-6) * math.sqrt(3)
+    kernel = get_gaussian_kernel(sigma)
+    bases, std = [], math.sqrt(1 / 3)
+    for size in shape:
+        if size == 1:
+            # Only the centre of the kernel is in the axis
+            bases.append(np.ones((1, 1)))
+            std *= kernel[len(kernel) // 2]
+        else:
+            basis = get_bspline_basis(size, spacing, np.random.uniform(0, spacing))
+            bases.append(basis)
+            std *= math.sqrt(np.sum(kernel ** 2) / np.mean(np.sum(basis ** 2, axis=1)))
+    return bases, std
+
+
+def get_control_grid_field(shape, sigma):
+    """Draw a smooth random field by interpolating a coarse grid of random control points with cubic B-splines.
+
+    The field has the statistics of smoothed uniform noise, see :func:`get_control_grid_bases`. It is computed in a
+    fraction of the time of ``gaussian_filter`` on a full resolution noise: the control points are spaced by about
+    ``1.7 * sigma`` voxels, and the B-splines are applied along one axis at a time, with 4 weights per voxel.
+
+    Args:
+        shape (tuple): Shape of the field.
+        sigma (float): Standard deviation of the equivalent Gaussian filter, in voxels.
+
+    Returns:
+        ndarray: Field.
+    """
+    bases, std = get_control_grid_bases(shape, sigma)
+    field = np.random.normal(0, std, [basis.shape[1] for basis in bases])
+    for axis, basis in enumerate(bases):
+        field = np.moveaxis(field, axis, 0)
+        field_shape = field.shape
+        field = csr_matrix(basis) @ field.reshape(field_shape[0], -1)
+        field = np.moveaxis(field.reshape((basis.shape[0],) + field_shape[1:]), 0, axis)
+    return field
+
+
 class ElasticTransform(ImedTransform):
     """Applies elastic transformation.
 
@@ -873,16 +1337,35 @@ class ElasticTransform(ImedTransform):
     Args:
         alpha_range (tuple of floats): Deformation coefficient. Length equals 2.
         sigma_range (tuple of floats): Standard deviation. Length equals 2.
+        p (float): Probability of performing the elastic transformation.
+        control_grid (bool): If True, the displacement fields are interpolated from a coarse grid of random control
+            points, with the statistics of the smoothed fields, see :func:`get_control_grid_field`. Much faster for
+            large volumes.
     """
 
-    def __init__(self, alpha_range, sigma_range, p=0.1):
+    # Boundary mode of the resampling
+    mode = 'reflect'
+
+    def __init__(self, alpha_range, sigma_range, p=0.1, control_grid=False):
         self.alpha_range = alpha_range
         self.sigma_range = sigma_range
         self.p = p
+        self.control_grid = control_grid
 
-    @multichannel_capable
-    @two_dim_compatible
-    def __call__(self, sample, metadata=None):
+    def get_displacement(self, shape, metadata):
+        """Draw the random displacement field of a sample, if the transformation is applied to it.
+
+        The parameters are drawn unless they are in the metadata, i.e. the sample is the GT, but the field is drawn
+        at each call.
+
+        Args:
+            shape (tuple): Shape of the sample, of length 3.
+            metadata (SampleMetadata): Metadata of the sample, where the drawn parameters are saved.
+
+        Returns:
+            ndarray: Displacement along each axis, of shape (3, ) + ``shape``. None if the transformation is not
+                applied.
+        """
         # if params already defined, i.e. sample is GT
         if MetadataKW.ELASTIC in metadata:
             alpha, sigma = metadata[MetadataKW.ELASTIC]
@@ -898,28 +1381,57 @@ class ElasticTransform(ImedTransform):
         else:
             metadata[MetadataKW.ELASTIC] = [None, None]
 
-        if any(metadata[MetadataKW.ELASTIC]):
-            # Get shape
-            shape = sample.shape
+        if not any(metadata[MetadataKW.ELASTIC]):
+            return None
 
-            # Compute random deformation
-            dx = gaussian_filter((np.random.rand(*shape) * 2 - 1),
-                                 sigma, mode="constant", cval=0) * alpha
-            dy = gaussian_filter((np.random.rand(*shape) * 2 - 1),
-                                 sigma, mode="constant", cval=0) * alpha
-            dz = gaussian_filter((np.random.rand(*shape) * 2 - 1),
-                                 sigma, mode="constant", cval=0) * alpha
+        alpha, sigma = metadata[MetadataKW.ELASTIC]
+        if self.control_grid:
+            displacement = np.stack([get_control_grid_field(shape, sigma) * alpha for _ in range(3)])
             if shape[2] == 1:
-                dz = 0  # No deformation along the last dimension
-            x, y, z = np.meshgrid(np.arange(shape[0]),
-                                  np.arange(shape[1]),
-                                  np.arange(shape[2]), indexing='ij')
-            indices = np.reshape(x + dx, (-1, 1)), \
-                      np.reshape(y + dy, (-1, 1)), \
-                      np.reshape(z + dz, (-1, 1))
+                displacement[2] = 0  # No deformation along the last dimension
+            return displacement
+
+        # Compute random deformation
+        dx = gaussian_filter((np.random.rand(*shape) * 2 - 1),
+                             sigma, mode="constant", cval=0) * alpha
+        dy = gaussian_filter((np.random.rand(*shape) * 2 - 1),
+                             sigma, mode="constant", cval=0) * alpha
+        dz = gaussian_filter((np.random.rand(*shape) * 2 - 1),
+                             sigma, mode="constant", cval=0) * alpha
+        if shape[2] == 1:
+            dz = np.zeros(shape)  # No deformation along the last dimension
+        return np.stack([dx, dy, dz])
+
+    def transform_coordinates(self, coords, shape, metadata):
+        """Map coordinates of the output of the transformation to the sample, see :class:`ComposedGeometry`.
+
+        Args:
+            coords (ndarray): Coordinates, of shape (3, ) + ``shape``. None for the voxels of the output.
+            shape (tuple): Shape of the sample, of length 3.
+            metadata (SampleMetadata): Metadata of the sample.
+
+        Returns:
+            ndarray: Coordinates in the sample, None if the transformation is not applied and ``coords`` is None.
+        """
+        displacement = self.get_displacement(shape, metadata)
+        if displacement is None:
+            return coords
+        if coords is None:
+            return (np.indices(shape) + displacement).astype(np.float32)
+        # The displacement is defined on the voxels: it is interpolated at the coordinates
+        return coords + np.stack([map_coordinates(d, coords, order=1, mode='nearest') for d in displacement])
+
+    @multichannel_capable
+    @two_dim_compatible
+    def __call__(self, sample, metadata=None):
+        displacement = self.get_displacement(sample.shape, metadata)
+        if displacement is not None:
+            # Get shape
+            shape = sample.shape
+            indices = np.indices(shape) + displacement
 
             # Apply deformation
-            data_out = map_coordinates(sample, indices, order=1, mode='reflect')
+            data_out = map_coordinates(sample, indices, order=1, mode=self.mode)
             # Keep input shape
             data_out = data_out.reshape(shape)
             # Keep data type
@@ -931,6 +1443,87 @@ class ElasticTransform(ImedTransform):
             return sample, metadata
 
 
+class ComposedGeometry(ImedTransform):
+    """Apply consecutive spatial transformations with a single resampling.
+
+    Each transformation (``RandomAffine``, ``ElasticTransform`` or ``RandomReverse``) maps the coordinates of its output
+    to its input, see their ``transform_coordinates`` method. These maps are composed into one coordinate map, computed
+    once per sample and saved in its metadata under the transformations it composes, and applied with one linear interpolation to all the channels of the
+    image, then to the GT and ROI. The data is thus interpolated once instead of once per transformation, without the
+    blur of repeated interpolations, and all the channels and labels get the same elastic deformation. The coordinates
+    out of the sample are handled with the boundary mode of the first transformation. The datasets remove the map from
+    the metadata once the sample is transformed, see ``loader.utils.clear_sample_transform_params``. The runs of spatial
+    transformations can differ between the image, GT and ROI, e.g. when a transformation between them is only applied
+    to the image: each run gets its own map, composed from the parameters saved in the metadata by the first one
+    applied, so that the image, GT and ROI stay aligned.
+
+    The parameters drawn by each transformation are saved in the metadata, as when they are applied one after the
+    other, and the transformations are undone one after the other.
+
+    Args:
+        transforms (list): Spatial transformations, in the order they are applied.
+
+    Attributes:
+        transforms (list): Spatial transformations, in the order they are applied.
+        mode (str): Boundary mode of the resampling.
+        key (tuple): Key of the coordinate map in the maps of the metadata, the ids of the transformations.
+    """
+
+    def __init__(self, transforms):
+        self.transforms = transforms
+        self.mode = transforms[0].mode
+        self.key = tuple(id(transform) for transform in transforms)
+
+    def get_coordinates(self, shape, metadata):
+        """Get the coordinate map of a sample, composed from the transformations unless it is in the metadata.
+
+        Args:
+            shape (tuple): Shape of the sample, of length 3.
+            metadata (SampleMetadata): Metadata of the sample, where the maps of the runs of transformations and the
+                parameters of the transformations are saved.
+
+        Returns:
+            ndarray: Coordinates in the sample of each output voxel, of shape (3, ) + ``shape``. None if the sample is
+                not transformed.
+        """
+        if MetadataKW.COMPOSED_GEOMETRY not in metadata:
+            metadata[MetadataKW.COMPOSED_GEOMETRY] = {}
+        coords_maps = metadata[MetadataKW.COMPOSED_GEOMETRY]
+        if self.key in coords_maps:
+            coords = coords_maps[self.key]
+            if coords is None or coords.shape[1:] == tuple(shape):
+                return coords
+
+        # The coordinates of the output are mapped through the last transformation first
+        coords = None
+        for transform in self.transforms[::-1]:
+            coords = transform.transform_coordinates(coords, shape, metadata)
+        coords_maps[self.key] = coords
+        return coords
+
+    @multichannel_capable
+    @two_dim_compatible
+    def __call__(self, sample, metadata=None):
+        # Channels stacked along the first axis
+        if sample.ndim == 4:
+            coords = self.get_coordinates(sample.shape[1:], metadata)
+            if coords is None:
+                return sample, metadata
+            data_out = np.stack([map_coordinates(channel, coords, order=1, mode=self.mode) for channel in sample])
+            return data_out.astype(sample.dtype), metadata
+
+        coords = self.get_coordinates(sample.shape, metadata)
+        if coords is None:
+            return sample, metadata
+        data_out = map_coordinates(sample, coords, order=1, mode=self.mode)
+        return data_out.astype(sample.dtype), metadata
+
+    def undo_transform(self, sample, metadata=None):
+        for transform in self.transforms[::-1]:
+            sample, metadata = transform.undo_transform(sample, metadata)
+        return sample, metadata
+
+
 class AdditiveGaussianNoise(ImedTransform):
     """Adds Gaussian Noise to images.
 
@@ -1238,13 +1831,19 @@ def apply_preprocessing_transforms(transforms, seg_pair, roi_pair=None) -> Tuple
     return (seg_pair, roi_pair)
 
 
-def prepare_transforms(transform_dict, requires_undo=True):
+def prepare_transforms(transform_dict, requires_undo=True, compose_geometry=False, timer=None, skip_batched=False):
     """
     This function separates the preprocessing transforms from the others and generates the undo transforms related.
 
     Args:
         transform_dict (dict): Dictionary containing the transforms and there parameters.
         requires_undo (bool): Boolean indicating if transforms can be undone.
+        compose_geometry (bool): If True, consecutive spatial transforms are applied with a single resampling, see
+            :class:`ComposedGeometry`.
+        timer (TransformTimer): If not None, the calls of the regular and undo transforms are recorded in this timer.
+            The preprocessing transforms, run once per subject, are not recorded: the timer would change the key of
+            their preprocessing cache entries.
+        skip_batched (bool): If True, the batched transforms are not applied to the samples, see :class:`Compose`.
 
     Returns:
         list, UndoCompose: transform lst containing the preprocessing transforms and regular transforms, UndoCompose
@@ -1252,10 +1851,11 @@ def prepare_transforms(transform_dict, requires_undo=True):
     """
     training_undo_transform = None
     if requires_undo:
-        training_undo_transform = UndoCompose(Compose(transform_dict.copy()))
+        training_undo_transform = UndoCompose(Compose(transform_dict.copy(), timer=timer, skip_batched=skip_batched))
     preprocessing_transforms = get_preprocessing_transforms(transform_dict)
     prepro_transforms = Compose(preprocessing_transforms, requires_undo=requires_undo)
-    transforms = Compose(transform_dict, requires_undo=requires_undo)
+    transforms = Compose(transform_dict, requires_undo=requires_undo, compose_geometry=compose_geometry, timer=timer,
+                         skip_batched=skip_batched)
     tranform_lst = [prepro_transforms if len(preprocessing_transforms) else None, transforms]
     return tranform_lst, training_undo_transform
 
@@ -0,0 +1,153 @@
+import copy
+import pickle
+import nibabel as nib
+import numpy as np
+import pytest
+import torch
+from pathlib import Path
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader.array_store import ArrayStore, ArrayRef
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from ivadomed.loader.mri3d_subvolume_segmentation_dataset import MRI3DSubVolumeSegmentationDataset
+from ivadomed.loader.sample_meta_data import SampleMetadata
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_array_store(compress):
+    store = ArrayStore(Path(__tmp_dir__, "store.bin"), compress=compress, chunk_bytes=256)
+    arrays = [np.random.rand(20, 8, 6).astype(np.float32), np.arange(7, dtype=np.uint8), np.array(3.)]
+    refs = [store.put(array) for array in arrays]
+    assert len(store) == 3 and all(isinstance(ref, ArrayRef) for ref in refs)
+
+    for ref, array in zip(refs, arrays):
+        assert np.array_equal(store.get(ref), array)
+        assert store.get(ref).dtype == array.dtype
+    region = (slice(5, 17), slice(2, 6), slice(None))
+    assert np.array_equal(store.get(refs[0], region), arrays[0][region])
+
+    # Arrays read from the store can be modified without altering it
+    array = store.get(refs[0])
+    array[...] = 0
+    assert np.array_equal(store.get(refs[0]), arrays[0])
+
+    # The store is reopened after pickling
+    store.close()
+    store_unpickled = pickle.loads(pickle.dumps(store))
+    assert np.array_equal(store_unpickled.get(refs[0], region), arrays[0][region])
+
+
+def test_array_store_structure():
+    store = ArrayStore(Path(__tmp_dir__, "store.bin"))
+    metadata = SampleMetadata({'slice_index': 2})
+    seg_pair = {'input': [np.ones((4, 4)), np.zeros((4, 4))], 'gt': [[np.ones((4, 4))]], 'input_metadata': [metadata]}
+    record = store.dump(seg_pair)
+    assert isinstance(record['input'][0], ArrayRef) and isinstance(record['gt'][0][0], ArrayRef)
+    assert record['input_metadata'][0] is metadata
+
+    seg_pair_loaded = store.load(record, region=(slice(1, 3), slice(None)))
+    assert seg_pair_loaded['input'][0].shape == seg_pair_loaded['gt'][0][0].shape == (2, 4)
+    assert np.array_equal(store.load(record)['input'][1], seg_pair['input'][1])
+
+
+def _create_filename_pairs(n_subjects, shape):
+    filename_pairs = []
+    for i in range(n_subjects):
+        data = np.random.rand(*shape).astype(np.float32)
+        fname_im = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w.nii.gz"))
+        fname_gt = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w_seg-manual.nii.gz"))
+        nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+        nib.save(nib.Nifti1Image((data > 0.5).astype(np.uint8), np.eye(4)), fname_gt)
+        filename_pairs.append(([fname_im], [fname_gt], None, [{}]))
+    return filename_pairs
+
+
+@pytest.mark.parametrize('length', [[], [8, 8]])
+def test_2d_dataset_disk_cache(length):
+    filename_pairs = _create_filename_pairs(2, (16, 12, 4))
+    datasets = []
+    for disk_cache in [False, True]:
+        transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+        ds = MRI2DSegmentationDataset(filename_pairs, length=length, stride=length, transform=transform_lst,
+                                      disk_cache=disk_cache)
+        ds.load_filenames()
+        datasets.append(ds)
+
+    ds_memory, ds_disk = datasets
+    assert ds_memory.cache_store is None and len(ds_disk.cache_store)
+    assert len(ds_memory) == len(ds_disk) > 0
+    for index in range(len(ds_memory)):
+        item_memory, item_disk = ds_memory[index], ds_disk[index]
+        assert torch.equal(item_memory['input'], item_disk['input'])
+        assert np.array_equal(item_memory['gt'], item_disk['gt'])
+        assert item_memory['input_metadata'][0]['coord'] == item_disk['input_metadata'][0]['coord']
+
+
+def test_3d_dataset_disk_cache():
+    filename_pairs = _create_filename_pairs(2, (32, 16, 16))
+    datasets = []
+    for disk_cache in [False, True]:
+        transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+        datasets.append(MRI3DSubVolumeSegmentationDataset(filename_pairs, transform=transform_lst,
+                                                          length=(16, 16, 16), stride=(16, 16, 16),
+                                                          disk_cache=disk_cache))
+
+    ds_memory, ds_disk = datasets
+    assert len(ds_memory) == len(ds_disk) == 4
+    for index in range(len(ds_memory)):
+        item_memory, item_disk = ds_memory[index], ds_disk[index]
+        assert torch.equal(item_memory['input'], item_disk['input'])
+        assert np.array_equal(item_memory['gt'], item_disk['gt'])
+        assert item_memory['input_metadata'][0]['coord'] == item_disk['input_metadata'][0]['coord']
+
+
+@pytest.mark.parametrize('length', [[], [8, 8]])
+def test_2d_dataset_shared_arrays(length):
+    filename_pairs = _create_filename_pairs(1, (16, 12, 2))
+    transform_lst, _ = imed_transforms.prepare_transforms({"NumpyToTensor": {}})
+    ds = MRI2DSegmentationDataset(filename_pairs, length=length, stride=length, transform=transform_lst,
+                                  disk_cache=False)
+    ds.load_filenames()
+    seg_pair, _ = ds.handlers[0] if length else ds.indexes[0]
+    input_ref = seg_pair['input'][0].copy()
+    assert not seg_pair['input'][0].flags.writeable
+
+    # Items do not share their metadata nor their arrays with the loaded slices
+    item = ds[0]
+    item['input'][0] += 1
+    item['input_metadata'][0]['coord'] = None
+    item = ds[0]
+    assert np.array_equal(seg_pair['input'][0], input_ref)
+    assert item['input_metadata'][0]['coord'] is not None
+    assert np.array_equal(item['input'][0].numpy(), input_ref[:8, :8] if length else input_ref)
+
+
+def test_coord_index():
+    filename_pairs = _create_filename_pairs(2, (32, 16, 16))
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    ds_3d = MRI3DSubVolumeSegmentationDataset(filename_pairs, transform=transform_lst, length=(16, 16, 16),
+                                              stride=(16, 16, 16), disk_cache=False)
+    assert ds_3d.indexes.dtype.names == ('handler_index', 'x_min', 'x_max', 'y_min', 'y_max', 'z_min', 'z_max')
+    # Volumes are reoriented along the slice axis, the first one by default
+    assert ds_3d.indexes[['handler_index', 'z_min']].tolist() == [(0, 0), (0, 16), (1, 0), (1, 16)]
+    assert ds_3d[1]['input_metadata'][0]['coord'] == [0, 16, 0, 16, 16, 32]
+
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    ds_2d = MRI2DSegmentationDataset(filename_pairs, length=[16, 12], stride=[8, 4], transform=transform_lst,
+                                     disk_cache=False)
+    ds_2d.load_filenames()
+    # 3 x 2 patches per slice, the last ones along each axis being aligned with the end of the slice
+    assert len(ds_2d) == len(ds_2d.gt_labels) == 2 * 16 * 3 * 2
+    assert ds_2d.indexes[['x_min', 'y_min']][:6].tolist() == [(0, 0), (0, 4), (8, 0), (8, 4), (16, 0), (16, 4)]
+    assert ds_2d[5]['input_metadata'][0]['coord'] == [16, 32, 4, 16]
+    assert all(isinstance(value, int) for value in ds_2d[5]['input_metadata'][0]['coord'])
+
+
+def teardown_function():
+    remove_tmp_dir()
@@ -0,0 +1,67 @@
+import copy
+import nibabel as nib
+import numpy as np
+import pytest
+from pathlib import Path
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+def _create_filename_pairs(n_subjects, shape):
+    filename_pairs = []
+    for i in range(n_subjects):
+        data = np.random.rand(*shape).astype(np.float32)
+        fname_im = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w.nii.gz"))
+        fname_gt = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w_seg-manual.nii.gz"))
+        nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+        nib.save(nib.Nifti1Image((data > 0.5).astype(np.uint8), np.eye(4)), fname_gt)
+        filename_pairs.append(([fname_im], [fname_gt], None, [{}]))
+    return filename_pairs
+
+
+def _get_dataset(filename_pairs, length, disk_cache):
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    return MRI2DSegmentationDataset(filename_pairs, length=length, stride=length, transform=transform_lst,
+                                    disk_cache=disk_cache, n_jobs=2)
+
+
+@pytest.mark.parametrize('length', [[], [8, 6]])
+@pytest.mark.parametrize('disk_cache', [False, True])
+def test_background_loading(length, disk_cache):
+    filename_pairs = _create_filename_pairs(4, (16, 12, 3))
+    ds_ref = _get_dataset(filename_pairs, length, disk_cache)
+    ds_ref.load_filenames()
+
+    ds = _get_dataset(filename_pairs, length, disk_cache)
+    ds.load_filenames(background=True)
+    # At least one subject is loaded, and the samples of the loaded subjects can be read
+    assert ds.background_loading is not None and 0 < len(ds) <= len(ds_ref)
+    for index in range(len(ds)):
+        assert np.array_equal(np.asarray(ds[index]['input']), np.asarray(ds_ref[index]['input']))
+
+    n_samples = len(ds)
+    ds.update_loaded()
+    assert len(ds) >= n_samples
+    ds.wait_loaded()
+    assert ds.background_loading is None and ds.update_loaded() == 0
+
+    # Once all the subjects are added, the dataset is the same as when loaded in the foreground
+    assert len(ds) == len(ds_ref)
+    assert np.array_equal(ds.gt_labels, ds_ref.gt_labels)
+    assert np.array_equal(ds.sample_shapes, ds_ref.sample_shapes)
+    for index in range(len(ds)):
+        sample, sample_ref = ds[index], ds_ref[index]
+        assert np.array_equal(np.asarray(sample['input']), np.asarray(sample_ref['input']))
+        assert np.array_equal(np.asarray(sample['gt']), np.asarray(sample_ref['gt']))
+        assert sample['input_metadata'][0]['coord'] == sample_ref['input_metadata'][0]['coord']
+
+
+def teardown_function():
+    remove_tmp_dir()
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+import torch
+from scipy.ndimage import gaussian_filter
+
+from ivadomed import batch_transforms as imed_batch_transforms
+from ivadomed.transforms import Compose, NormalizeInstance, get_bspline_basis
+
+
+def _create_batch(shape, n=4):
+    """Batch of images and of their binary ground truths, of shape (N, 1, *shape)."""
+    gt = torch.zeros(n, 1, *shape, dtype=torch.uint8)
+    gt[(slice(None), slice(None)) + tuple(slice(size // 4, size // 2) for size in shape)] = 1
+    input_samples = gt.float() + 0.1 * torch.rand(n, 1, *shape)
+    return input_samples, gt
+
+
+@pytest.mark.parametrize('shape', [(20, 16), (12, 10, 8)])
+def test_gaussian_smooth(shape):
+    data = torch.rand(3, 2, *shape, dtype=torch.float64)
+    sigma = torch.tensor([0.0, 1.0, 2.5])
+    smoothed = imed_batch_transforms.gaussian_smooth(data, sigma)
+    for idx in range(len(data)):
+        for channel in range(data.shape[1]):
+            ref = gaussian_filter(data[idx, channel].numpy(), float(sigma[idx]), mode='constant')
+            assert np.allclose(smoothed[idx, channel].numpy(), ref)
+
+
+@pytest.mark.parametrize('shape', [(120, 100), (48, 48, 40)])
+def test_control_grid_field(shape):
+    torch.manual_seed(0)
+    sigma = torch.tensor([2.0, 4.0])
+    fields = imed_batch_transforms.get_control_grid_field(2, 3, shape, sigma, torch.device('cpu'))
+    assert fields.shape == (2, 3) + shape
+    # The phases of the grids are drawn with torch
+    torch.manual_seed(0)
+    assert torch.equal(imed_batch_transforms.get_control_grid_field(2, 3, shape, sigma, torch.device('cpu')), fields)
+    fields_ref = imed_batch_transforms.gaussian_smooth(torch.rand(2, 3, *shape) * 2 - 1, sigma)
+    # Same standard deviation as the smoothed noise, away from the borders
+    for idx in range(2):
+        interior = (idx, slice(None)) + (slice(int(4 * sigma[idx]), -int(4 * sigma[idx])),) * len(shape)
+        assert abs(float(fields[interior].std() / fields_ref[interior].std()) - 1) < 0.25
+
+    elastic = imed_batch_transforms.BatchElasticTransform([28.0, 30.0], [3.5, 4.5], p=1, control_grid=True)
+    coords = elastic.transform_coordinates(None, 2, shape, torch.device('cpu'))
+    assert coords.shape == (2, len(shape)) + shape
+
+
+def test_bspline_basis():
+    spacing, phase = torch.tensor([2.5, 6.0], dtype=torch.float64), torch.tensor([1.2, 0.3], dtype=torch.float64)
+    bases = imed_batch_transforms.get_bspline_basis(30, spacing, phase)
+    for idx in range(2):
+        ref = get_bspline_basis(30, float(spacing[idx]), float(phase[idx]))
+        assert np.allclose(bases[idx, :, :ref.shape[1]].numpy(), ref)
+        # The padded control points have no weight
+        assert not bases[idx, :, ref.shape[1]:].any()
+
+
+@pytest.mark.parametrize('shape', [(20, 16), (12, 10, 8)])
+def test_resample(shape):
+    data = torch.rand(2, 3, *shape)
+    coords = imed_batch_transforms.get_identity_coordinates(2, shape, data.device)
+    assert torch.allclose(imed_batch_transforms.resample(data, coords), data, atol=1e-5)
+    # Translation by one voxel along the first axis
+    coords = coords.clone()
+    coords[:, 0] += 1
+    assert torch.allclose(imed_batch_transforms.resample(data, coords)[:, :, :-1], data[:, :, 1:], atol=1e-5)
+
+    # No transformation
+    affine = imed_batch_transforms.BatchRandomAffine(degrees=0)
+    coords = affine.transform_coordinates(None, 2, shape, data.device)
+    assert torch.allclose(imed_batch_transforms.resample(data, coords), data, atol=1e-5)
+
+
+@pytest.mark.parametrize('shape', [(32, 24), (16, 16, 12)])
+def test_batch_compose(shape):
+    dict_transforms = {
+        "RandomAffine": {"degrees": 10, "translate": [0.1, 0.1], "scale": [0.1, 0.1], "batched": True},
+        "ElasticTransform": {"alpha_range": [28.0, 30.0], "sigma_range": [3.5, 4.5], "p": 1, "batched": True},
+        "NormalizeInstance": {"applied_to": ["im"]},
+        "RandomGamma": {"log_gamma_range": [-0.5, 0.5], "p": 1, "applied_to": ["im"], "batched": True},
+        "RandomBiasField": {"coefficients": 0.5, "order": 3, "p": 1, "applied_to": ["im"], "batched": True},
+        "RandomBlur": {"sigma_range": [0.0, 1.0], "p": 1, "applied_to": ["im"], "batched": True},
+        "AdditiveGaussianNoise": {"mean": 0.0, "std": 0.01, "applied_to": ["im"], "batched": True}
+    }
+    batch_transforms = imed_batch_transforms.get_batch_transforms(dict_transforms)
+    # Consecutive spatial transforms are composed, NormalizeInstance after them is applied to the batches
+    assert len(batch_transforms) == 6 and len(batch_transforms.transforms[0]) == 2
+    assert isinstance(batch_transforms.transforms[1], imed_batch_transforms.BatchNormalizeInstance)
+    # The batched transforms are not applied to the samples of the training set, but to those of the other sets
+    assert not Compose(dict_transforms, skip_batched=True).transform["im"].transforms
+    assert [type(tr).__name__ for tr in Compose(dict_transforms).transform["im"].transforms] == \
+        ["RandomAffine", "ElasticTransform", "NormalizeInstance", "RandomGamma", "RandomBiasField", "RandomBlur",
+         "AdditiveGaussianNoise"]
+
+    input_samples, gt = _create_batch(shape)
+    out_input, out_gt = batch_transforms(input_samples, gt)
+    assert out_input.shape == input_samples.shape and out_input.dtype == input_samples.dtype
+    assert out_gt.shape == gt.shape and out_gt.dtype == gt.dtype
+    assert set(torch.unique(out_gt).tolist()) <= {0, 1}
+    assert not torch.equal(out_gt, gt)
+
+    # The ground truths get the same spatial transformations as the inputs
+    spatial_transforms = imed_batch_transforms.get_batch_transforms(
+        {k: v for k, v in dict_transforms.items() if k in ["RandomAffine", "ElasticTransform"]})
+    torch.manual_seed(0)
+    out_input, out_gt = spatial_transforms(gt.float(), gt)
+    assert torch.equal((out_input > 0.5).to(torch.uint8), out_gt)
+
+
+@pytest.mark.parametrize('shape', [(3, 20, 16), (2, 12, 10, 8)])
+def test_batch_normalize_instance(shape):
+    dict_transforms = {
+        "CenterCrop": {"size": [16, 16], "preprocessing": True},
+        "RandomGamma": {"log_gamma_range": [-0.5, 0.5], "p": 1, "applied_to": ["im"], "batched": True},
+        "NormalizeInstance": {"applied_to": ["im"]},
+        "NumpyToTensor": {}
+    }
+    batch_transforms = imed_batch_transforms.get_batch_transforms(dict_transforms)
+    # The samples are normalized after the change of contrast, as in the configuration file
+    assert [type(tr) for tr in batch_transforms.transforms] == [imed_batch_transforms.BatchRandomGamma,
+                                                                imed_batch_transforms.BatchNormalizeInstance]
+    data = torch.rand(4, *shape, dtype=torch.float64) * 100 + 50
+    out_input, _ = batch_transforms(data, None)
+    # As NormalizeInstance, for each channel of the 2D samples and for all the channels of the 3D samples
+    for idx in range(len(data)):
+        channels = out_input[idx] if len(shape) == 3 else out_input[idx:idx + 1]
+        for channel in channels:
+            ref, _ = NormalizeInstance()(channel.numpy(), {})
+            assert np.allclose(channel.numpy(), ref)
+
+
+def test_batch_transforms_params():
+    assert imed_batch_transforms.get_batch_transforms({"RandomAffine": {"degrees": 10}}) is None
+    with pytest.raises(ValueError):
+        imed_batch_transforms.BatchCompose({"RandomReverse": {"batched": True}})
+    # A transform of the samples after a batched transform would be applied before it
+    with pytest.raises(ValueError):
+        imed_batch_transforms.BatchCompose({"RandomAffine": {"degrees": 10, "batched": True},
+                                            "RandomGamma": {"log_gamma_range": [-0.5, 0.5], "applied_to": ["im"]}})
+
+    # Samples not drawn are unchanged
+    data = torch.rand(3, 1, 10, 8)
+    for transform in [imed_batch_transforms.BatchRandomGamma([-0.5, 0.5], p=0),
+                      imed_batch_transforms.BatchRandomBiasField(0.5, 3, p=0),
+                      imed_batch_transforms.BatchRandomBlur([1.0, 2.0], p=0)]:
+        assert torch.allclose(transform(data), data)
+    assert imed_batch_transforms.BatchElasticTransform([28.0, 30.0], [3.5, 4.5], p=0).transform_coordinates(
+        None, 3, (10, 8), data.device) is None
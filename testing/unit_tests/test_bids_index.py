@@ -0,0 +1,130 @@
+import json
+import os
+import nibabel as nib
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+
+from ivadomed.loader import bids_index as imed_bids_index
+from ivadomed.loader.bids_dataframe import BidsDataframe
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+PATH_DATA = Path(__tmp_dir__, "bids_index_dataset")
+PATH_INDEX = Path(__tmp_dir__, "bids_index")
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+def _write_subject(subject, echo_time=0.1):
+    path_anat = Path(PATH_DATA, subject, "anat")
+    path_deriv = Path(PATH_DATA, "derivatives", "labels", subject, "anat")
+    path_anat.mkdir(parents=True, exist_ok=True)
+    path_deriv.mkdir(parents=True, exist_ok=True)
+    img = nib.Nifti1Image(np.zeros((4, 4, 4), dtype=np.float32), np.eye(4))
+    nib.save(img, str(Path(path_anat, f"{subject}_T2w.nii.gz")))
+    nib.save(img, str(Path(path_deriv, f"{subject}_T2w_seg-manual.nii.gz")))
+    with Path(path_anat, f"{subject}_T2w.json").open(mode="w") as f:
+        json.dump({"EchoTime": echo_time}, f)
+
+
+def _create_dataset(subjects):
+    PATH_DATA.mkdir(parents=True, exist_ok=True)
+    with Path(PATH_DATA, "dataset_description.json").open(mode="w") as f:
+        json.dump({"Name": "bids_index", "BIDSVersion": "1.6.0"}, f)
+    Path(PATH_DATA, "derivatives", "labels").mkdir(parents=True, exist_ok=True)
+    with Path(PATH_DATA, "derivatives", "labels", "dataset_description.json").open(mode="w") as f:
+        json.dump({"Name": "labels", "BIDSVersion": "1.6.0", "GeneratedBy": [{"Name": "Manual"}]}, f)
+    with Path(PATH_DATA, "participants.tsv").open(mode="w") as f:
+        f.write("participant_id\tage\n" + "".join(f"{s}\t{20 + i}\n" for i, s in enumerate(subjects)))
+    for subject in subjects:
+        _write_subject(subject)
+
+
+def _get_bids_df(bids_index_dir):
+    loader_params = {
+        "path_data": [str(PATH_DATA)],
+        "target_suffix": ["_seg-manual"],
+        "extensions": [".nii.gz"],
+        "roi_params": {"suffix": None, "slice_filter_roi": None},
+        "contrast_params": {"contrast_lst": ["T2w"], "balance": {}},
+        "bids_validate": False,
+        "bids_index_dir": bids_index_dir
+    }
+    return BidsDataframe(loader_params, __tmp_dir__, derivatives=True)
+
+
+def _get_df(bids_index_dir):
+    return _get_bids_df(bids_index_dir).df
+
+
+def _assert_df_equal(df, df_ref):
+    df = df.sort_values('path').reset_index(drop=True)
+    df_ref = df_ref.sort_values('path').reset_index(drop=True)
+    pd.testing.assert_frame_equal(df[sorted(df.columns)], df_ref[sorted(df_ref.columns)], check_dtype=False)
+
+
+def test_fingerprint():
+    _create_dataset(["sub-01", "sub-02"])
+    fingerprint = imed_bids_index.get_fingerprint(imed_bids_index.list_files(PATH_DATA))
+    assert set(fingerprint) == {"", "sub-01", "sub-02"}
+
+    # Modify one subject only
+    fname = Path(PATH_DATA, "derivatives", "labels", "sub-02", "anat", "sub-02_T2w_seg-manual.nii.gz")
+    stat = fname.stat()
+    os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    fingerprint_new = imed_bids_index.get_fingerprint(imed_bids_index.list_files(PATH_DATA))
+    assert imed_bids_index.get_changed_groups(fingerprint_new, fingerprint) == {"sub-02"}
+
+
+def test_persisted_index():
+    _create_dataset(["sub-01", "sub-02", "sub-03"])
+    df_ref = _get_df(None)
+    assert not PATH_INDEX.exists()
+
+    # Cold, then warm index
+    _assert_df_equal(_get_df(str(PATH_INDEX)), df_ref)
+    assert len(list(PATH_INDEX.glob("*.joblib"))) == 1
+    _assert_df_equal(_get_df(str(PATH_INDEX)), df_ref)
+
+
+@pytest.mark.parametrize("update", ["modify", "add", "remove"])
+def test_incremental_index(update):
+    _create_dataset(["sub-01", "sub-02", "sub-03"])
+    _get_df(str(PATH_INDEX))
+
+    if update == "modify":
+        _write_subject("sub-02", echo_time=0.2)
+    elif update == "add":
+        _write_subject("sub-04")
+    else:
+        for path in [Path(PATH_DATA, "sub-03"), Path(PATH_DATA, "derivatives", "labels", "sub-03")]:
+            for fname in sorted(path.glob("**/*"), reverse=True):
+                fname.unlink() if fname.is_file() else fname.rmdir()
+            path.rmdir()
+
+    df = _get_df(str(PATH_INDEX))
+    _assert_df_equal(df, _get_df(None))
+    if update == "modify":
+        assert df[df['filename'] == "sub-02_T2w.nii.gz"]['EchoTime'].tolist() == [0.2]
+    elif update == "add":
+        assert "sub-04_T2w.nii.gz" in df['filename'].tolist()
+    else:
+        assert "sub-03_T2w.nii.gz" not in df['filename'].tolist()
+
+
+def test_derivatives_index():
+    _create_dataset(["sub-1", "sub-10"])
+    bids_df = _get_bids_df(None)
+    assert bids_df.get_derivatives("sub-1_T2w.nii.gz") == ["sub-1_T2w_seg-manual.nii.gz"]
+    assert bids_df.get_derivatives("sub-10_T2w") == ["sub-10_T2w_seg-manual.nii.gz"]
+    assert bids_df.get_derivative_paths("sub-1_T2w.nii.gz") == \
+        [str(Path(PATH_DATA, "derivatives", "labels", "sub-1", "anat", "sub-1_T2w_seg-manual.nii.gz"))]
+    assert bids_df.get_derivatives("sub-2_T2w.nii.gz") == []
+
+
+def teardown_function():
+    remove_tmp_dir()
@@ -1,6 +1,5 @@
 import json
 import shutil
-import pickle
 from pathlib import Path
 
 import numpy as np
@@ -105,17 +104,13 @@ def test_bounding_box(download_data_testing_test_files, train_lst, target_lst, c
 
         if "Modified3DUNet" in config:
             if ds.disk_cache:
-                path_seg_pair, _ = handler[index]
-                with path_seg_pair.open('rb') as f:
-                    seg_pair = pickle.load(f)
+                seg_pair = ds.cache_store.load(handler[index][0])
             else:
                 seg_pair, _ = handler[index]
             assert seg_pair['input'][0].shape[-3:] == (mx2 - mx1, my2 - my1, mz2 - mz1)
         else:
             if ds.disk_cache:
-                path_seg_pair = handler[index]
-                with path_seg_pair.open('rb') as f:
-                    seg_pair, _ = pickle.load(f)
+                seg_pair, _ = ds.cache_store.load(handler[index])
             else:
                 seg_pair, _ = handler[index]
             assert seg_pair['input'][0].shape[-2:] == (mx2 - mx1, my2 - my1)
@@ -0,0 +1,116 @@
+import copy
+import pickle
+import nibabel as nib
+import numpy as np
+import pytest
+from pathlib import Path
+from torch.utils.data import Dataset, DataLoader
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader import utils as imed_loader_utils
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from ivadomed.loader.mri3d_subvolume_segmentation_dataset import MRI3DSubVolumeSegmentationDataset
+from ivadomed.loader.slice_filter import SliceFilter
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir()
+
+
+class RandomDataset(Dataset):
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return np.random.rand()
+
+
+def test_get_num_workers():
+    assert imed_loader_utils.get_num_workers(3) == 3
+    assert imed_loader_utils.get_num_workers(0) == 0
+    assert 0 <= imed_loader_utils.get_num_workers() <= imed_loader_utils.MAX_DEFAULT_NUM_WORKERS
+    with pytest.raises(ValueError):
+        imed_loader_utils.get_num_workers(-1)
+
+
+def test_dataloader_worker_params():
+    params = imed_loader_utils.get_dataloader_worker_params(0)
+    assert params == {"num_workers": 0, "worker_init_fn": None, "persistent_workers": False}
+    params = imed_loader_utils.get_dataloader_worker_params(2, persistent_workers=False)
+    assert params["worker_init_fn"] is imed_loader_utils.seed_worker
+    assert not params["persistent_workers"]
+
+
+def test_seed_worker():
+    loader = DataLoader(RandomDataset(), batch_size=1, shuffle=False,
+                        **imed_loader_utils.get_dataloader_worker_params(2))
+    values = [float(batch) for batch in loader]
+    # Without seeding, both workers would share the parent numpy state and draw the same values
+    assert len(set(values)) == len(values)
+
+
+def test_2d_dataset_pickle():
+    ds = MRI2DSegmentationDataset([(["input.nii.gz"], ["gt.nii.gz"], None, {})], transform=(None, None),
+                                  slice_filter_fn=SliceFilter())
+    ds_unpickled = pickle.loads(pickle.dumps(ds))
+    # The slice filter is kept since it does not hold a classifier
+    assert isinstance(ds_unpickled.slice_filter_fn, SliceFilter)
+    assert ds_unpickled.filename_pairs == ds.filename_pairs
+
+
+def _create_filename_pairs(n_subjects, shape):
+    filename_pairs = []
+    for i in range(n_subjects):
+        data = np.random.rand(*shape).astype(np.float32)
+        # Empty first slices, to be discarded by the slice filter
+        data[..., :i % 3] = 0
+        fname_im = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w.nii.gz"))
+        fname_gt = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w_seg-manual.nii.gz"))
+        nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+        nib.save(nib.Nifti1Image((data > 0.5).astype(np.uint8), np.eye(4)), fname_gt)
+        filename_pairs.append(([fname_im], [fname_gt], None, [{}]))
+    return filename_pairs
+
+
+@pytest.mark.parametrize('n_jobs', [2, -1])
+def test_2d_dataset_parallel_loading(n_jobs):
+    filename_pairs = _create_filename_pairs(5, (16, 12, 6))
+    transforms = {"CenterCrop": {"size": [8, 8]}, "NumpyToTensor": {}}
+    datasets = []
+    for n in [1, n_jobs]:
+        transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy(transforms))
+        ds = MRI2DSegmentationDataset(filename_pairs, transform=transform_lst, slice_filter_fn=SliceFilter(),
+                                      disk_cache=False, n_jobs=n)
+        ds.load_filenames()
+        datasets.append(ds)
+
+    ds_seq, ds_par = datasets
+    assert len(ds_seq.indexes) == len(ds_par.indexes) == 5 * 6 - (0 + 1 + 2 + 0 + 1)
+    for (seg_seq, _), (seg_par, _) in zip(ds_seq.indexes, ds_par.indexes):
+        assert np.array_equal(seg_seq['input'][0], seg_par['input'][0])
+        assert seg_seq['input_metadata'][0]['input_filenames'] == seg_par['input_metadata'][0]['input_filenames']
+        assert seg_seq['input_metadata'][0]['slice_index'] == seg_par['input_metadata'][0]['slice_index']
+
+
+def test_3d_dataset_parallel_loading():
+    filename_pairs = _create_filename_pairs(3, (16, 16, 16))
+    transform_lst, _ = imed_transforms.prepare_transforms({"NumpyToTensor": {}})
+    datasets = [MRI3DSubVolumeSegmentationDataset(filename_pairs, transform=transform_lst, length=(16, 16, 16),
+                                                  stride=(16, 16, 16), disk_cache=False, n_jobs=n) for n in [1, 3]]
+    ds_seq, ds_par = datasets
+    assert len(ds_seq.handlers) == len(ds_par.handlers) == 3
+    for (seg_seq, _), (seg_par, _) in zip(ds_seq.handlers, ds_par.handlers):
+        assert np.array_equal(seg_seq['input'][0], seg_par['input'][0])
+
+
+def test_get_n_jobs():
+    assert imed_loader_utils.get_n_jobs(1) == 1
+    assert imed_loader_utils.get_n_jobs(-1) >= 1
+    with pytest.raises(ValueError):
+        imed_loader_utils.get_n_jobs(0)
+
+
+def teardown_function():
+    remove_tmp_dir()
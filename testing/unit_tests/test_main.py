@@ -1,6 +1,16 @@
+import json
+import nibabel as nib
+import numpy as np
 import pytest
+from pathlib import Path
 
+from ivadomed import main as imed
+from ivadomed import config_manager as imed_config_manager
+from ivadomed.keywords import ConfigKW, PostprocessingKW, BinarizeProdictionKW
+from ivadomed.loader.streaming_dataset import StreamingDataset
 from ivadomed.main import check_multiple_raters
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
 
 @pytest.mark.parametrize(
     'is_train, loader_params', [
@@ -12,3 +22,97 @@ from ivadomed.main import check_multiple_raters
 def test_check_multiple_raters(is_train, loader_params):
     with pytest.raises(SystemExit):
         check_multiple_raters(is_train, loader_params)
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+def _create_dataset(path_data, n_subjects):
+    """Create a BIDS dataset of noisy volumes, whose label is a disk on each slice."""
+    path_data.mkdir(parents=True)
+    with Path(path_data, "dataset_description.json").open(mode="w") as f:
+        json.dump({"Name": "main", "BIDSVersion": "1.6.0"}, f)
+    Path(path_data, "derivatives", "labels").mkdir(parents=True)
+    with Path(path_data, "derivatives", "labels", "dataset_description.json").open(mode="w") as f:
+        json.dump({"Name": "labels", "BIDSVersion": "1.6.0", "GeneratedBy": [{"Name": "Manual"}]}, f)
+    subjects = [f"sub-{i:02d}" for i in range(n_subjects)]
+    with Path(path_data, "participants.tsv").open(mode="w") as f:
+        f.write("participant_id\tage\n" + "".join(f"{subject}\t{20 + i}\n" for i, subject in enumerate(subjects)))
+
+    grid = np.mgrid[:16, :16, :4]
+    gt = (((grid[0] - 8) ** 2 + (grid[1] - 8) ** 2) < 25).astype(np.uint8)
+    for subject in subjects:
+        path_anat = Path(path_data, subject, "anat")
+        path_deriv = Path(path_data, "derivatives", "labels", subject, "anat")
+        path_anat.mkdir(parents=True)
+        path_deriv.mkdir(parents=True)
+        im = (gt + np.random.rand(*gt.shape)).astype(np.float32)
+        nib.save(nib.Nifti1Image(im, np.eye(4)), str(Path(path_anat, f"{subject}_T2w.nii.gz")))
+        nib.save(nib.Nifti1Image(gt, np.eye(4)), str(Path(path_deriv, f"{subject}_T2w_seg-manual.nii.gz")))
+
+
+def _get_context(path_data, path_output):
+    """Get the configuration of a short 2D training on the dataset of ``_create_dataset``."""
+    path_config = Path(__tmp_dir__, "config.json")
+    with path_config.open(mode="w") as f:
+        json.dump({
+            "command": "train",
+            "gpu_ids": [-1],
+            "path_output": str(path_output),
+            "loader_parameters": {
+                "path_data": [str(path_data)],
+                "target_suffix": ["_seg-manual"],
+                "extensions": [".nii.gz"],
+                "bids_validate": False,
+                "contrast_params": {"training_validation": ["T2w"], "testing": ["T2w"], "balance": {}},
+                "slice_filter_params": {"filter_empty_mask": False, "filter_empty_input": False}
+            },
+            "split_dataset": {"train_fraction": 0.5, "test_fraction": 0.2},
+            "training_parameters": {
+                "batch_size": 4,
+                "training_time": {"num_epochs": 1, "early_stopping_patience": 50, "early_stopping_epsilon": 0.001}
+            },
+            "default_model": {"name": "Unet", "dropout_rate": 0.3, "bn_momentum": 0.1, "depth": 2, "is_2d": True},
+            "transformation": {"NormalizeInstance": {"applied_to": ["im"]}}
+        }, f)
+    return imed_config_manager.ConfigurationManager(str(path_config)).get_config()
+
+
+@pytest.mark.parametrize('loader_params, model_params', [
+    ({"patch_sampling_params": {"random": True, "foreground_ratio": 1, "n_patches": 2}},
+     {"length_2D": [8, 8], "stride_2D": [8, 8]}),
+    ({"streaming_params": {"applied": True, "shuffle_buffer_size": 8}}, {}),
+    ({"background_loading": True, "n_jobs": 2}, {}),
+])
+def test_run_command_thr_increment(loader_params, model_params, monkeypatch):
+    path_data, path_output = Path(__tmp_dir__, "data"), Path(__tmp_dir__, "output")
+    _create_dataset(path_data, 10)
+    context = _get_context(path_data, path_output)
+    context[ConfigKW.LOADER_PARAMETERS].update(loader_params)
+    context[ConfigKW.DEFAULT_MODEL].update(model_params)
+
+    ds_lst_analysis = []
+
+    def threshold_analysis(ds_lst, **kwargs):
+        ds_lst_analysis.extend(ds_lst)
+        return threshold_analysis_ref(ds_lst=ds_lst, **kwargs)
+
+    threshold_analysis_ref = imed.imed_testing.threshold_analysis
+    monkeypatch.setattr(imed.imed_testing, "threshold_analysis", threshold_analysis)
+    imed.run_command(context, thr_increment=0.25)
+
+    # The threshold is computed on all the slices or patches of the grid of the training and validation subjects
+    ds_train = ds_lst_analysis[0]
+    n_patches = 4 if model_params else 1
+    assert len(ds_train) == len(ds_train.filename_pairs) * 4 * n_patches
+    assert ds_train.random_patch_sampler is None
+    assert not isinstance(ds_train, StreamingDataset)
+    assert getattr(ds_train, 'background_loading', None) is None
+    with Path(path_output, "config_file.json").open() as f:
+        thr = json.load(f)[ConfigKW.POSTPROCESSING][PostprocessingKW.BINARIZE_PREDICTION][BinarizeProdictionKW.THR]
+    assert 0 <= thr <= 1
+
+
+def teardown_function():
+    remove_tmp_dir()
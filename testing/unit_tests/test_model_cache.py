@@ -0,0 +1,93 @@
+import os
+import pytest
+import torch
+from pathlib import Path
+from ivadomed import inference as imed_inference
+from ivadomed import utils as imed_utils
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir()
+    imed_inference.clear_model_cache()
+
+
+def _save_model(fname, n_features=4):
+    model = torch.nn.Linear(n_features, 1)
+    torch.save(model, fname)
+    return model
+
+
+def test_model_cache_reuse():
+    fname = str(Path(__tmp_dir__, "model.pt"))
+    _save_model(fname)
+    model_1 = imed_inference.get_cached_model(fname, torch.device("cpu"))
+    model_2 = imed_inference.get_cached_model(fname, torch.device("cpu"))
+    assert model_1 is model_2
+
+
+def test_model_cache_reload_on_change():
+    fname = str(Path(__tmp_dir__, "model.pt"))
+    _save_model(fname)
+    model_1 = imed_inference.get_cached_model(fname, torch.device("cpu"))
+    _save_model(fname)
+    # Force a new modification time, the file system resolution can be coarse
+    stat = os.stat(fname)
+    os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    model_2 = imed_inference.get_cached_model(fname, torch.device("cpu"))
+    assert model_1 is not model_2
+    assert len(imed_inference._MODEL_CACHE) == 1
+
+
+def test_model_cache_eviction():
+    fname_1 = str(Path(__tmp_dir__, "model_1.pt"))
+    fname_2 = str(Path(__tmp_dir__, "model_2.pt"))
+    _save_model(fname_1)
+    _save_model(fname_2)
+    # Each model holds 5 float32 values, i.e. 20 bytes: only one fits
+    imed_inference.set_model_cache_limit(30)
+    try:
+        model_1 = imed_inference.get_cached_model(fname_1, torch.device("cpu"))
+        imed_inference.get_cached_model(fname_2, torch.device("cpu"))
+        assert len(imed_inference._MODEL_CACHE) == 1
+        assert imed_inference.get_cached_model(fname_1, torch.device("cpu")) is not model_1
+
+        imed_inference.clear_model_cache(fname_1)
+        assert len(imed_inference._MODEL_CACHE) == 0
+    finally:
+        imed_inference.set_model_cache_limit(2 * 1024 ** 3)
+
+
+def test_model_cache_disabled():
+    fname = str(Path(__tmp_dir__, "model.pt"))
+    _save_model(fname)
+    imed_inference.get_cached_model(fname, torch.device("cpu"))
+    with pytest.raises(ValueError):
+        imed_inference.set_model_cache_limit(-1)
+    # A limit of 0 empties the registry and disables caching
+    imed_inference.set_model_cache_limit(0)
+    try:
+        assert len(imed_inference._MODEL_CACHE) == 0
+        model = imed_inference.get_cached_model(fname, torch.device("cpu"))
+        assert imed_inference.get_cached_model(fname, torch.device("cpu")) is not model
+        assert len(imed_inference._MODEL_CACHE) == 0
+    finally:
+        imed_inference.set_model_cache_limit(2 * 1024 ** 3)
+
+
+def test_onnx_inference_session_cache():
+    fname = str(Path(__tmp_dir__, "model.onnx"))
+    model = torch.nn.Conv3d(1, 1, kernel_size=3, padding=1)
+    model.eval()
+    dummy_input = torch.randn(1, 1, 8, 8, 8)
+    imed_utils.save_onnx_model(model, dummy_input, fname)
+    out_1 = imed_inference.onnx_inference(fname, dummy_input)
+    out_2 = imed_inference.onnx_inference(fname, dummy_input)
+    assert len(imed_inference._MODEL_CACHE) == 1
+    assert torch.allclose(out_1, out_2)
+
+
+def teardown_function():
+    imed_inference.clear_model_cache()
+    remove_tmp_dir()
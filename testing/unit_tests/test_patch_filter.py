@@ -8,6 +8,7 @@ from loguru import logger
 from ivadomed.loader.bids_dataframe import BidsDataframe
 from ivadomed import utils as imed_utils
 from ivadomed.loader import utils as imed_loader_utils, loader as imed_loader
+from ivadomed.loader.patch_filter import PatchFilter, get_patch_grid, get_patch_statistics
 from testing.unit_tests.t_utils import create_tmp_dir,  __data_testing_dir__, __tmp_dir__, download_data_testing_test_files, path_repo_root
 from testing.common_testing_util import remove_tmp_dir
 
@@ -88,5 +89,35 @@ def test_patch_filter(download_data_testing_test_files, transforms_dict, train_l
         assert cmpt_neg != 0 and cmpt_pos != 0
 
 
+@pytest.mark.parametrize('patch_filter_params', [
+    {"filter_empty_mask": True, "filter_empty_input": True},
+    {"filter_absent_class": True, "filter_empty_input": False}])
+@pytest.mark.parametrize('length, stride', [([8, 6], [8, 6]), ([7, 5], [3, 2]), ([2, 3], [1, 1])])
+def test_patch_filter_grid(patch_filter_params, length, stride):
+    rng = np.random.default_rng(0)
+    shape = (30, 25)
+    # Sparse classes and constant regions, so that some patches are discarded
+    input_data = [np.where(rng.random(shape) < 0.3, rng.random(shape), 0.).astype(np.float32), rng.random(shape)]
+    input_data[0][:12, :12] = 0
+    gt_data = [(rng.random(shape) < 0.02).astype(np.uint8), [np.zeros(shape), (rng.random(shape) < 0.05) * 1.]]
+
+    patch_filter = PatchFilter(**patch_filter_params, is_train=True)
+    x_mins, y_mins = get_patch_grid(shape[0], length[0], stride[0]), get_patch_grid(shape[1], length[1], stride[1])
+    assert x_mins[-1] == shape[0] - length[0] and y_mins[-1] == shape[1] - length[1]
+    patch_statistics = get_patch_statistics(input_data, gt_data, x_mins, y_mins, length)
+    keep = patch_filter.filter_patches(patch_statistics)
+
+    # Same result as filtering each patch
+    for idx_x, x_min in enumerate(x_mins):
+        for idx_y, y_min in enumerate(y_mins):
+            crop = (slice(x_min, x_min + length[0]), slice(y_min, y_min + length[1]))
+            patch = {'input': [img[crop] for img in input_data],
+                     'gt': [gt_data[0][crop], np.any(np.array(gt_data[1]), axis=0)[crop]]}
+            assert keep[idx_x, idx_y] == patch_filter(patch)
+            assert patch_statistics['gt_count'][0, idx_x, idx_y] == np.count_nonzero(gt_data[0][crop])
+    assert 0 < np.count_nonzero(keep) < keep.size
+    assert np.all(patch_statistics['gt_fraction'] <= 1)
+
+
 def teardown_function():
     remove_tmp_dir()
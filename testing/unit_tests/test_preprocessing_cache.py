@@ -0,0 +1,111 @@
+import copy
+import os
+import multiprocessing
+import nibabel as nib
+import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader import utils as imed_loader_utils
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from ivadomed.loader.preprocessing_cache import PreprocessingCache
+from ivadomed.loader.slice_filter import SliceFilter
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+PATH_CACHE = Path(__tmp_dir__, "preprocessing_cache")
+TRANSFORMS = {"CenterCrop": {"size": [8, 8]}, "NumpyToTensor": {}}
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+def _create_filename_pairs(n_subjects, shape=(16, 12, 4)):
+    filename_pairs = []
+    for i in range(n_subjects):
+        data = np.random.rand(*shape).astype(np.float32)
+        fname_im = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w.nii.gz"))
+        fname_gt = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w_seg-manual.nii.gz"))
+        nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+        nib.save(nib.Nifti1Image((data > 0.5).astype(np.uint8), np.eye(4)), fname_gt)
+        filename_pairs.append(([fname_im], [fname_gt], None, [{'contrast': 'T2w'}]))
+    return filename_pairs
+
+
+def _get_dataset(filename_pairs):
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy(TRANSFORMS))
+    return MRI2DSegmentationDataset(filename_pairs, transform=transform_lst, slice_filter_fn=SliceFilter(),
+                                    disk_cache=False,
+                                    preprocessing_cache=PreprocessingCache(PATH_CACHE, max_bytes=2 ** 30))
+
+
+def _get_key(filename_pair):
+    ds = _get_dataset([filename_pair])
+    return ds.preprocessing_cache.get_key(filename_pair, ds.get_cache_params())
+
+
+def test_preprocessing_cache_reuse(monkeypatch):
+    filename_pairs = _create_filename_pairs(2)
+    ds_ref = _get_dataset(filename_pairs)
+    ds_ref.load_filenames()
+    assert len(list(PATH_CACHE.glob("*.joblib"))) == 2
+
+    # Preprocessed subjects are read from the cache
+    def load_subject(self, filename_pair):
+        raise AssertionError("Subject should be read from the preprocessing cache.")
+    monkeypatch.setattr(MRI2DSegmentationDataset, "load_subject", load_subject)
+    ds = _get_dataset(filename_pairs)
+    ds.load_filenames()
+    assert len(ds) == len(ds_ref) == 8
+    for (seg_pair, _), (seg_pair_ref, _) in zip(ds.indexes, ds_ref.indexes):
+        assert np.array_equal(seg_pair['input'][0], seg_pair_ref['input'][0])
+        assert seg_pair['input'][0].shape == (8, 8)
+        assert seg_pair['input_metadata'][0]['slice_index'] == seg_pair_ref['input_metadata'][0]['slice_index']
+
+
+def test_preprocessing_cache_key():
+    filename_pair = _create_filename_pairs(1)[0]
+    key = _get_key(filename_pair)
+
+    # Keys do not depend on the process, so that entries are reused across runs
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        assert executor.submit(_get_key, filename_pair).result() == key
+
+    # Keys depend on the metadata, the preprocessing parameters and the file contents
+    assert _get_key(filename_pair[:3] + ([{'contrast': 'T1w'}],)) != key
+    ds = _get_dataset([filename_pair])
+    ds.soft_gt = True
+    assert ds.preprocessing_cache.get_key(filename_pair, ds.get_cache_params()) != key
+    nib.save(nib.Nifti1Image(np.ones((16, 12, 4), dtype=np.float32), np.eye(4)), filename_pair[0][0])
+    assert _get_key(filename_pair) != key
+
+
+def test_preprocessing_cache_eviction():
+    cache = PreprocessingCache(PATH_CACHE, max_bytes=2 ** 30)
+    for key in ["a", "b", "c"]:
+        cache.put(key, np.zeros(2 ** 16, dtype=np.uint8))
+        time.sleep(0.01)
+    size_entry = Path(PATH_CACHE, "a.joblib").stat().st_size
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    cache.max_bytes = 2 * size_entry
+    cache.evict()
+    assert sorted(path.stem for path in PATH_CACHE.glob("*.joblib")) == ["a", "c"]
+    assert cache.get("b") is None
+
+
+def test_temp_directory_cleanup():
+    path_temp = imed_loader_utils.create_temp_directory()
+    # Only the process that created the directory removes it
+    imed_loader_utils._remove_temp_directory(path_temp, os.getpid() + 1)
+    assert Path(path_temp).is_dir()
+    imed_loader_utils._remove_temp_directory(path_temp, os.getpid())
+    assert not Path(path_temp).exists()
+
+
+def teardown_function():
+    remove_tmp_dir()
@@ -0,0 +1,90 @@
+import copy
+import random
+import nibabel as nib
+import numpy as np
+import pytest
+from pathlib import Path
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from ivadomed.loader.mri3d_subvolume_segmentation_dataset import MRI3DSubVolumeSegmentationDataset
+from ivadomed.loader.random_patch_sampler import RandomPatchSampler
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+def _create_filename_pairs(shape, lesion):
+    """Create one subject with a random image and a ground truth containing only the region ``lesion``."""
+    data = np.random.rand(*shape).astype(np.float32)
+    gt = np.zeros(shape, dtype=np.uint8)
+    gt[lesion] = 1
+    fname_im, fname_gt = str(Path(__tmp_dir__, "sub-01_T2w.nii.gz")), str(Path(__tmp_dir__, "sub-01_lesion.nii.gz"))
+    nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+    nib.save(nib.Nifti1Image(gt, np.eye(4)), fname_gt)
+    return [([fname_im], [fname_gt], None, [{}])]
+
+
+def test_random_patch_sampler():
+    sampler = RandomPatchSampler([4, 4], foreground_ratio=0.25, n_patches=8)
+    gt = np.zeros((10, 9))
+    gt[9, 0] = 1
+    sampler.add((10, 9), [gt])
+    sampler.add((10, 9), [np.zeros((10, 9))])
+    index, labels = sampler.get_index()
+    assert labels.tolist() == [1, 1, 0, 0, 0, 0, 0, 0]
+    # Foreground patches are drawn in the slice containing foreground, the other ones in turns
+    assert index['handler_index'].tolist() == [0, 0, 0, 1, 0, 1, 0, 1]
+
+    # Patches are centred on the foreground voxel, and shifted to fit in the slice
+    assert sampler.draw(0, 0) == {'handler_index': 0, 'x_min': 6, 'x_max': 10, 'y_min': 0, 'y_max': 4}
+    for _ in range(20):
+        coord = sampler.draw(5, 1)
+        assert 0 <= coord['x_min'] <= 6 and 0 <= coord['y_min'] <= 5
+
+    with pytest.raises(RuntimeError):
+        sampler.add((3, 9), [])
+    with pytest.raises(ValueError):
+        RandomPatchSampler([4, 4], foreground_ratio=2)
+
+
+def test_random_patches_2d():
+    filename_pairs = _create_filename_pairs((32, 32, 2), (slice(20, 22), slice(4, 6), slice(0, 1)))
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    ds = MRI2DSegmentationDataset(filename_pairs, length=[8, 8], stride=[8, 8], transform=transform_lst,
+                                  disk_cache=False, patch_sampling_params={"random": True, "foreground_ratio": 0.5})
+    ds.load_filenames()
+    # By default, as many patches as needed to cover the slices
+    assert len(ds) == 2 * 4 * 4
+
+    random.seed(0)
+    n_foreground = len(ds) // 2
+    for index in range(len(ds)):
+        item = ds[index]
+        assert item['input'].shape[-2:] == (8, 8)
+        if index < n_foreground:
+            assert np.any(item['gt'])
+    # Patches are drawn again at each epoch
+    assert len({tuple(ds[n_foreground]['input_metadata'][0]['coord']) for _ in range(10)}) > 1
+
+
+def test_random_patches_3d():
+    # The volume size is not a multiple of the subvolume size
+    filename_pairs = _create_filename_pairs((40, 20, 18), (slice(30, 33), slice(2, 4), slice(2, 4)))
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    ds = MRI3DSubVolumeSegmentationDataset(filename_pairs, transform=transform_lst, length=(16, 16, 16),
+                                           stride=(16, 16, 16), disk_cache=False,
+                                           patch_sampling_params={"random": True, "foreground_ratio": 1,
+                                                                  "n_patches": 5})
+    assert len(ds) == 5 and ds.gt_labels.tolist() == [1] * 5
+    for index in range(len(ds)):
+        item = ds[index]
+        assert item['input'].shape[-3:] == (16, 16, 16)
+        assert np.any(np.asarray(item['gt']))
+
+
+def teardown_function():
+    remove_tmp_dir()
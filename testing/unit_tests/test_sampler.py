@@ -1,13 +1,18 @@
+import copy
+import nibabel as nib
 import numpy as np
 import pytest
+from pathlib import Path
 import torch.backends.cudnn as cudnn
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, RandomSampler, SequentialSampler
 from loguru import logger
 
 from ivadomed.loader.bids_dataframe import BidsDataframe
-from ivadomed import utils as imed_utils
+from ivadomed import utils as imed_utils, transforms as imed_transforms
 from ivadomed.loader import utils as imed_loader_utils, loader as imed_loader
 from ivadomed.loader.balanced_sampler import BalancedSampler
+from ivadomed.loader.bucket_batch_sampler import BucketBatchSampler
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
 from testing.unit_tests.t_utils import create_tmp_dir,  __data_testing_dir__, __tmp_dir__, download_data_testing_test_files
 from testing.common_testing_util import remove_tmp_dir
 
@@ -98,5 +103,79 @@ def test_sampler(download_data_testing_test_files, transforms_dict, train_lst, t
     assert abs(neg_percent_bal - pos_percent_bal) <= abs(neg_percent - pos_percent)
 
 
+@pytest.mark.parametrize('length', [[], [8, 8]])
+@pytest.mark.parametrize('disk_cache', [False, True])
+def test_sampler_precomputed_labels(monkeypatch, length, disk_cache):
+    # Ground truth only in the first slice, and only in its first patch
+    data = np.random.rand(16, 16, 4).astype(np.float32)
+    gt = np.zeros((16, 16, 4), dtype=np.uint8)
+    gt[2:5, 2:5, 0] = 1
+    fname_im, fname_gt = str(Path(__tmp_dir__, "sub-01_T2w.nii.gz")), str(Path(__tmp_dir__, "sub-01_lesion.nii.gz"))
+    nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+    nib.save(nib.Nifti1Image(gt, np.eye(4)), fname_gt)
+
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    ds = MRI2DSegmentationDataset([([fname_im], [fname_gt], None, [{'contrast': 'T2w'}])], length=length,
+                                  stride=length, transform=transform_lst, disk_cache=disk_cache)
+    ds.load_filenames()
+    labels = [int(np.any(ds[idx]['gt'][0])) for idx in range(len(ds))]
+    assert ds.gt_labels.tolist() == labels and sum(labels) == 1
+
+    # Labels are read without loading the samples
+    def __getitem__(self, index):
+        raise AssertionError("Samples should not be loaded.")
+    monkeypatch.setattr(MRI2DSegmentationDataset, "__getitem__", __getitem__)
+    sampler = BalancedSampler(ds)
+    assert len(sampler) == len(ds)
+    assert sampler.weights.tolist() == [1. if label else 1. / (len(ds) - 1) for label in labels]
+    sampler_contrast = BalancedSampler(ds, metadata='contrast')
+    assert sampler_contrast.metadata_dict == {'T2w': 0}
+
+
+def test_bucket_batch_sampler():
+    shapes = [(4, 4), (6, 4), (4, 4), (4, 4), (6, 4), (4, 4), (4, 4)]
+    batch_sampler = BucketBatchSampler(SequentialSampler(shapes), shapes, batch_size=2)
+    assert batch_sampler.n_buckets == 2
+    assert list(batch_sampler) == [[0, 2], [1, 4], [3, 5], [6]]
+    assert len(batch_sampler) == 4
+    assert list(BucketBatchSampler(SequentialSampler(shapes), shapes, 2, drop_last=True)) == [[0, 2], [1, 4], [3, 5]]
+
+    # Each element is drawn once per epoch, in batches of elements of the same shape
+    batch_sampler = BucketBatchSampler(RandomSampler(shapes), shapes, batch_size=3)
+    batches = list(batch_sampler)
+    assert len(batches) == len(batch_sampler) == 3
+    assert sorted(index for batch in batches for index in batch) == list(range(len(shapes)))
+    for batch in batches:
+        assert len({shapes[index] for index in batch}) == 1
+    with pytest.raises(ValueError):
+        BucketBatchSampler(SequentialSampler(shapes), shapes, batch_size=0)
+
+
+@pytest.mark.parametrize('disk_cache', [False, True])
+def test_bucket_batch_sampler_dataset(disk_cache):
+    # Subjects with different in-plane sizes
+    filename_pairs = []
+    for i, shape in enumerate([(16, 12, 3), (10, 12, 2)]):
+        fname_im = str(Path(__tmp_dir__, f"sub-0{i}_T2w.nii.gz"))
+        fname_gt = str(Path(__tmp_dir__, f"sub-0{i}_lesion.nii.gz"))
+        nib.save(nib.Nifti1Image(np.random.rand(*shape).astype(np.float32), np.eye(4)), fname_im)
+        nib.save(nib.Nifti1Image(np.zeros(shape, dtype=np.uint8), np.eye(4)), fname_gt)
+        filename_pairs.append(([fname_im], [fname_gt], None, [{}]))
+
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    ds = MRI2DSegmentationDataset(filename_pairs, transform=transform_lst, disk_cache=disk_cache)
+    ds.load_filenames()
+    assert ds.sample_shapes.tolist() == [[16, 12]] * 3 + [[10, 12]] * 2
+
+    for sampler in [RandomSampler(ds), BalancedSampler(ds)]:
+        loader = DataLoader(ds, batch_sampler=BucketBatchSampler(sampler, ds.sample_shapes, batch_size=2),
+                            collate_fn=imed_loader_utils.imed_collate, num_workers=0)
+        n_samples = 0
+        for batch in loader:
+            assert batch['input'].shape[-2:] in [(16, 12), (10, 12)]
+            n_samples += len(batch['input'])
+        assert n_samples == len(ds)
+
+
 def teardown_function():
     remove_tmp_dir()
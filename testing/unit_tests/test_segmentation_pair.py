@@ -0,0 +1,184 @@
+import copy
+import nibabel as nib
+import numpy as np
+import pytest
+import torch
+from pathlib import Path
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader import utils as imed_loader_utils
+from ivadomed.loader.array_store import ArrayRef
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from ivadomed.loader.mri3d_subvolume_segmentation_dataset import MRI3DSubVolumeSegmentationDataset
+from ivadomed.loader.segmentation_pair import SegmentationPair
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir()
+
+
+def _create_pair(shape=(12, 10, 8), affine=np.eye(4)):
+    data = np.random.rand(*shape).astype(np.float32)
+    gt = (data > 0.5).astype(np.uint8)
+    fname_im = str(Path(__tmp_dir__, "sub-01_T2w.nii.gz"))
+    fname_gt = str(Path(__tmp_dir__, "sub-01_T2w_seg-manual.nii.gz"))
+    nib.save(nib.Nifti1Image(data, affine), fname_im)
+    nib.save(nib.Nifti1Image(gt, affine), fname_gt)
+    return fname_im, fname_gt
+
+
+@pytest.mark.parametrize('slice_axis', [0, 1, 2])
+def test_get_pair_slice(slice_axis):
+    fname_im, fname_gt = _create_pair()
+    seg_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], slice_axis=slice_axis, cache=False)
+
+    input_ref = imed_loader_utils.orient_img_hwd(nib.load(fname_im).get_fdata(dtype=np.float32), slice_axis)
+    gt_ref = imed_loader_utils.orient_img_hwd(nib.load(fname_gt).get_fdata(dtype=np.float32), slice_axis)
+
+    for idx in range(input_ref.shape[-1]):
+        slice_pair = seg_pair.get_pair_slice(idx)
+        assert np.array_equal(slice_pair['input'][0], input_ref[..., idx])
+        assert np.array_equal(slice_pair['gt'][0], gt_ref[..., idx])
+        # Slices do not reference the volume
+        assert slice_pair['input'][0].base is None
+        assert slice_pair['input'][0].flags['C_CONTIGUOUS']
+        # The volumes are laid out slice by slice
+        assert seg_pair.get_pair_data()[0][0][..., idx].flags['C_CONTIGUOUS']
+        assert seg_pair.get_pair_data()[1][0][..., idx].flags['C_CONTIGUOUS']
+
+
+def test_pair_data_materialized_once():
+    fname_im, fname_gt = _create_pair()
+    seg_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], cache=False)
+    pair_data = seg_pair.get_pair_data()
+    for idx in range(3):
+        seg_pair.get_pair_slice(idx)
+        assert seg_pair.get_pair_data() is pair_data
+
+    seg_pair.release_pair_data()
+    assert seg_pair.pair_data is None
+    assert seg_pair.get_pair_data() is not pair_data
+
+
+def test_shared_slice_metadata():
+    fname_im, fname_gt = _create_pair()
+    seg_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{'zooms': (2, 2, 2), 'contrast': 'T2w'}],
+                                cache=False)
+    metadata = [seg_pair.get_pair_slice(idx)['input_metadata'][0] for idx in range(2)]
+    # The metadata of the volume is shared by the slices, and takes precedence over their default values
+    assert metadata[0].shared is metadata[1].shared
+    assert metadata[0]['zooms'] == (2, 2, 2) and metadata[0]['input_filenames'] == fname_im
+    assert [m['slice_index'] for m in metadata] == [0, 1]
+    assert set(metadata[0].metadata) == {'data_shape', 'data_type', 'crop_params', 'data_scaling', 'slice_index',
+                                         'coord'}
+
+    # Values set on a slice or its copies are not shared
+    metadata_copy = copy.deepcopy(metadata[0])
+    assert metadata_copy.shared is metadata[0].shared
+    metadata_copy['contrast'] = 'T1w'
+    metadata_copy['crop_params']['CenterCrop'] = (0, 0)
+    assert metadata[0]['contrast'] == metadata[1]['contrast'] == 'T2w'
+    assert metadata[0]['crop_params'] == {}
+    assert 'contrast' in metadata_copy and set(metadata_copy.keys()) == set(metadata[0].keys())
+
+
+def test_collate_metadata():
+    fname_im, fname_gt = _create_pair()
+    seg_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], cache=False)
+    batch = []
+    for idx in range(3):
+        slice_pair = seg_pair.get_pair_slice(idx)
+        batch.append({'input': torch.from_numpy(slice_pair['input'][0]),
+                      'input_metadata': slice_pair['input_metadata']})
+    collated = imed_loader_utils.imed_collate(batch)
+    assert collated['input'].shape == (3, 12, 10)
+    # The metadata are passed through
+    assert all(collated['input_metadata'][idx] is batch[idx]['input_metadata'] for idx in range(3))
+
+
+def test_shared_input_pair():
+    fname_im, fname_gt = _create_pair()
+    roi_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], cache=False)
+    seg_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], cache=False, input_pair=roi_pair)
+    assert seg_pair.input_handle is roi_pair.input_handle
+    assert seg_pair.get_pair_data()[0] is roi_pair.get_pair_data()[0]
+
+    slice_seg_pair = seg_pair.get_pair_slice(3)
+    slice_roi_pair = roi_pair.get_pair_slice(3, input_slices=slice_seg_pair['input'])
+    assert slice_roi_pair['input'] is slice_seg_pair['input']
+    assert np.array_equal(slice_roi_pair['gt'][0], slice_seg_pair['gt'][0])
+
+
+def test_shared_input_pair_reoriented():
+    # Axes permuted by the affine, e.g. a sagittal acquisition
+    affine = np.eye(4)
+    affine[:3, :3] = [[0, 0, 1], [1, 0, 0], [0, 1, 0]]
+    fname_im, fname_gt = _create_pair(shape=(8, 10, 12), affine=affine)
+    roi_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], cache=False)
+    seg_pair = SegmentationPair([fname_im], [fname_gt], metadata=[{}], cache=False, input_pair=roi_pair)
+
+    input_shape, gt_shape = seg_pair.get_pair_shapes()
+    assert input_shape == gt_shape == roi_pair.get_pair_shapes()[0]
+    gt_ref = imed_loader_utils.orient_img_hwd(
+        nib.as_closest_canonical(nib.load(fname_gt)).get_fdata(dtype=np.float32), seg_pair.slice_axis)
+    assert np.array_equal(seg_pair.get_pair_data()[1][0], gt_ref)
+
+
+@pytest.mark.parametrize('array, scaling, dtype', [
+    (np.array([[0, 1], [1, 0]], dtype=np.float32), None, np.uint8),
+    (np.array([[-3, 200], [1000, 0]], dtype=np.float32), None, np.int16),
+    (np.array([[0.5, 2.5], [4.5, 10.5]], dtype=np.float32), (2., 0.5), np.uint8),
+    (np.array([[0.5, 0.25], [1, 0]], dtype=np.float32), None, np.float32),
+    (np.array([[0, 1e6], [1, 0]], dtype=np.float32), None, np.float32)])
+def test_compact_array(array, scaling, dtype):
+    compact, used_scaling = imed_loader_utils.compact_array(array, scaling)
+    assert compact.dtype == dtype
+    expanded = imed_loader_utils.expand_array(compact, used_scaling)
+    assert expanded.dtype == np.float32 and np.array_equal(expanded, array)
+
+
+@pytest.mark.parametrize('disk_cache', [False, True])
+def test_compact_dataset(disk_cache):
+    # Scaled int16 image and binary ground truth
+    shape = (16, 16, 16)
+    raw = np.random.randint(-1000, 1000, size=shape).astype(np.int16)
+    img = nib.Nifti1Image(raw, np.eye(4))
+    img.header.set_slope_inter(0.5, 10)
+    fname_im, fname_gt = str(Path(__tmp_dir__, "sub-01_T2w.nii.gz")), str(Path(__tmp_dir__, "sub-01_lesion.nii.gz"))
+    nib.save(img, fname_im)
+    nib.save(nib.Nifti1Image((raw > 0).astype(np.uint8), np.eye(4)), fname_gt)
+    input_ref = nib.load(fname_im).get_fdata(dtype=np.float32)
+    gt_ref = (raw > 0).astype(np.float32)
+
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    filename_pairs = [([fname_im], [fname_gt], None, [{}])]
+    ds = MRI2DSegmentationDataset(filename_pairs, transform=transform_lst, disk_cache=disk_cache)
+    ds.load_filenames()
+    seg_pair, roi_pair = ds.indexes[0]
+    if disk_cache:
+        # The compact arrays are written to the store
+        assert isinstance(seg_pair['input'][0], ArrayRef)
+        # The inputs shared by the seg_pair and the roi_pair are written once
+        assert roi_pair['input'][0] is seg_pair['input'][0]
+        seg_pair, roi_pair = ds.cache_store.load((seg_pair, roi_pair))
+    else:
+        # The inputs are shared by the seg_pair and the roi_pair
+        assert roi_pair['input'][0] is seg_pair['input'][0]
+    assert seg_pair['input'][0].dtype == np.int16 and seg_pair['gt'][0].dtype == np.uint8
+    for idx in range(len(ds)):
+        sample = ds[idx]
+        assert sample['input'].dtype == torch.float32
+        assert np.array_equal(sample['input'][0].numpy(), input_ref[..., idx])
+        assert np.array_equal(np.asarray(sample['gt'][0]), gt_ref[..., idx])
+
+    ds_3d = MRI3DSubVolumeSegmentationDataset(filename_pairs, transform=transform_lst, length=(16, 16, 16),
+                                              stride=(16, 16, 16), disk_cache=disk_cache)
+    sample = ds_3d[0]
+    assert np.array_equal(np.asarray(sample['input'][0]), imed_loader_utils.orient_img_hwd(input_ref, ds_3d.slice_axis))
+    assert np.array_equal(np.asarray(sample['gt'][0]), imed_loader_utils.orient_img_hwd(gt_ref, ds_3d.slice_axis))
+
+
+def teardown_function():
+    remove_tmp_dir()
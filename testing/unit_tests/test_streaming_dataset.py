@@ -0,0 +1,91 @@
+import copy
+import nibabel as nib
+import numpy as np
+import pytest
+from pathlib import Path
+from torch.utils.data import DataLoader
+
+from ivadomed import transforms as imed_transforms
+from ivadomed.loader.mri2d_segmentation_dataset import MRI2DSegmentationDataset
+from ivadomed.loader.mri3d_subvolume_segmentation_dataset import MRI3DSubVolumeSegmentationDataset
+from ivadomed.loader.streaming_dataset import StreamingDataset
+from testing.unit_tests.t_utils import create_tmp_dir, __tmp_dir__
+from testing.common_testing_util import remove_tmp_dir
+
+
+def setup_function():
+    create_tmp_dir(copy_data_testing_dir=False)
+
+
+def _create_filename_pairs(n_subjects, shape):
+    filename_pairs = []
+    for i in range(n_subjects):
+        data = np.random.rand(*shape).astype(np.float32)
+        fname_im = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w.nii.gz"))
+        fname_gt = str(Path(__tmp_dir__, f"sub-{i:02d}_T2w_seg-manual.nii.gz"))
+        nib.save(nib.Nifti1Image(data, np.eye(4)), fname_im)
+        nib.save(nib.Nifti1Image((data > 0.5).astype(np.uint8), np.eye(4)), fname_gt)
+        filename_pairs.append(([fname_im], [fname_gt], None, [{}]))
+    return filename_pairs
+
+
+def _get_samples(samples):
+    """Index samples by subject, slice and coordinates."""
+    samples_dict = {}
+    for sample in samples:
+        metadata = sample['input_metadata'][0]
+        key = (metadata['input_filenames'], metadata['slice_index'], tuple(metadata['coord']))
+        assert key not in samples_dict
+        samples_dict[key] = np.asarray(sample['input'])
+    return samples_dict
+
+
+def _get_2d_dataset(filename_pairs, length):
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    return MRI2DSegmentationDataset(filename_pairs, length=length, stride=length, transform=transform_lst,
+                                    disk_cache=False)
+
+
+@pytest.mark.parametrize('length', [[], [8, 6]])
+def test_streaming_2d(length):
+    filename_pairs = _create_filename_pairs(3, (16, 12, 4))
+    ds = _get_2d_dataset(filename_pairs, length)
+    ds.load_filenames()
+    samples_ref = _get_samples(ds[index] for index in range(len(ds)))
+
+    ds_stream = StreamingDataset(_get_2d_dataset(filename_pairs, length), shuffle_buffer_size=5)
+    assert ds_stream.task == "segmentation"
+    samples = _get_samples(ds_stream)
+    assert samples.keys() == samples_ref.keys()
+    for key, sample in samples.items():
+        assert np.array_equal(sample, samples_ref[key])
+
+
+def test_streaming_3d():
+    filename_pairs = _create_filename_pairs(2, (32, 16, 16))
+    transform_lst, _ = imed_transforms.prepare_transforms(copy.deepcopy({"NumpyToTensor": {}}))
+    params = dict(transform=transform_lst, length=(16, 16, 16), stride=(16, 16, 16), disk_cache=False)
+    ds = MRI3DSubVolumeSegmentationDataset(filename_pairs, **params)
+    samples_ref = {key[::2]: sample for key, sample in _get_samples(ds[index] for index in range(len(ds))).items()}
+
+    # Subjects are not loaded up front
+    ds_stream = StreamingDataset(MRI3DSubVolumeSegmentationDataset(filename_pairs, load=False, **params))
+    assert not ds_stream.handlers
+    samples = {key[::2]: sample for key, sample in _get_samples(ds_stream).items()}
+    assert samples.keys() == samples_ref.keys() and len(samples) == 4
+    for key, sample in samples.items():
+        assert np.array_equal(sample, samples_ref[key])
+
+
+def test_streaming_workers():
+    filename_pairs = _create_filename_pairs(5, (16, 12, 2))
+    ds_stream = StreamingDataset(_get_2d_dataset(filename_pairs, []), shuffle_buffer_size=3)
+    loader = DataLoader(ds_stream, batch_size=None, num_workers=2)
+    # The subjects are split between the workers: each slice is returned once per epoch
+    for _ in range(2):
+        samples = _get_samples(loader)
+        assert len(samples) == 5 * 2
+
+
+def teardown_function():
+    remove_tmp_dir()
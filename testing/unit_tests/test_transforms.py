@@ -7,14 +7,17 @@ from math import isclose
 import numpy as np
 import pytest
 import torch
-from scipy.ndimage import center_of_mass, label
+from torch.utils.data import DataLoader, Dataset
+from scipy.ndimage import center_of_mass, gaussian_filter, label
 from ivadomed import maths as imed_maths
 
+from ivadomed.loader import utils as imed_loader_utils
 from ivadomed.loader.sample_meta_data import SampleMetadata
 from ivadomed.metrics import dice_score
 from ivadomed.transforms import Clahe, AdditiveGaussianNoise, RandomAffine, RandomReverse, \
     DilateGT, ElasticTransform, ROICrop, CenterCrop, NormalizeInstance, HistogramClipping, \
-    NumpyToTensor, Resample
+    NumpyToTensor, Resample, Compose, ComposedGeometry, get_control_grid_field, resample_scipy, \
+    resample_separable, resample_torch, TransformTimer, UndoCompose
 from ivadomed.keywords import MetadataKW
 
 DEBUGGING = False
@@ -201,7 +204,9 @@ def _test_Resample(im_seg, resample_transform, native_resolution, is_2D=False):
 
 @pytest.mark.parametrize('im_seg', [create_test_image(80, 100, 0, 2, rad_max=10)])
 @pytest.mark.parametrize('resample_transform', [Resample(0.8, 1.0),
-                                                Resample(1.0, 0.8)])
+                                                Resample(1.0, 0.8),
+                                                Resample(0.8, 1.0, backend="separable"),
+                                                Resample(1.0, 0.8, backend="torch")])
 @pytest.mark.parametrize('native_resolution', [(0.9, 1.0),
                                                (1.0, 0.9)])
 def test_Resample_2D(im_seg, resample_transform, native_resolution):
@@ -210,13 +215,45 @@ def test_Resample_2D(im_seg, resample_transform, native_resolution):
 
 @pytest.mark.parametrize('im_seg', [create_test_image(80, 100, 100, 1, rad_max=10)])
 @pytest.mark.parametrize('resample_transform', [Resample(0.8, 1.0, 0.5),
-                                                Resample(1.0, 0.8, 0.7)])
+                                                Resample(1.0, 0.8, 0.7),
+                                                Resample(0.8, 1.0, 0.5, backend="separable"),
+                                                Resample(1.0, 0.8, 0.7, backend="torch")])
 @pytest.mark.parametrize('native_resolution', [(0.9, 1.0, 0.8),
                                                (1.0, 0.9, 1.1)])
 def test_Resample_3D(im_seg, resample_transform, native_resolution):
     _test_Resample(im_seg, resample_transform, native_resolution)
 
 
+@pytest.mark.parametrize('shape, output_shape', [((40, 30), (52, 24)),
+                                                 ((20, 30, 25), (26, 30, 19))])
+@pytest.mark.parametrize('order', [1, 2])
+def test_resampling_backends(shape, output_shape, order):
+    data = np.random.rand(*shape).astype(np.float32)
+    data_ref = resample_scipy(data, output_shape, order)
+    assert data_ref.shape == output_shape
+
+    # Same interpolation as zoom
+    assert np.allclose(resample_separable(data, output_shape, order), data_ref, atol=1e-5)
+    # Linear interpolation
+    if order == 1:
+        assert np.allclose(resample_torch(data, output_shape, order), data_ref, atol=1e-5)
+
+    # Labels are rounded as by zoom
+    seg = (data > 0.5).astype(np.uint8)
+    zooms = [size_out / size_in for size_in, size_out in zip(shape, output_shape)] + [1.] * (3 - len(shape))
+    seg_ref, _ = Resample(1., 1., 1.)(seg, SampleMetadata({MetadataKW.ZOOMS: zooms, MetadataKW.DATA_TYPE: 'gt'}))
+    for backend in ["separable", "torch"]:
+        metadata = SampleMetadata({MetadataKW.ZOOMS: zooms, MetadataKW.DATA_TYPE: 'gt'})
+        seg_out, _ = Resample(1., 1., 1., backend=backend)(seg, metadata)
+        assert seg_out.dtype == seg.dtype
+        assert np.array_equal(seg_out, seg_ref)
+
+
+def test_Resample_backend():
+    with pytest.raises(ValueError):
+        Resample(1., 1., backend="unknown")
+
+
 @pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 100, 1),
                                     create_test_image(100, 100, 0, 2)])
 def test_NormalizeInstance(im_seg):
@@ -354,7 +391,10 @@ def test_RandomAffine(im_seg, transform):
 @pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 0, 1, rad_max=10),
                                     create_test_image(100, 100, 100, 1, rad_max=10)])
 @pytest.mark.parametrize('elastic_transform', [ElasticTransform(alpha_range=[150.0, 250.0],
-                                                                sigma_range=[100 * 0.06, 100 * 0.09])])
+                                                                sigma_range=[100 * 0.06, 100 * 0.09]),
+                                               ElasticTransform(alpha_range=[150.0, 250.0],
+                                                                sigma_range=[100 * 0.06, 100 * 0.09], p=1,
+                                                                control_grid=True)])
 def test_ElasticTransform(im_seg, elastic_transform):
     im, seg = im_seg
     metadata_in = [SampleMetadata({}) for _ in im] if isinstance(im, list) else SampleMetadata({})
@@ -373,6 +413,28 @@ def test_ElasticTransform(im_seg, elastic_transform):
     _check_shape(seg, [do_seg])
 
 
+def _get_field_stats(field, sigma):
+    """Standard deviation and correlation at a distance of sigma voxels, away from the borders."""
+    field = field[tuple(slice(int(4 * sigma), -int(4 * sigma)) if size > 1 else slice(None) for size in field.shape)]
+    lag = int(sigma)
+    return field.std(), np.corrcoef(field[:-lag].ravel(), field[lag:].ravel())[0, 1]
+
+
+@pytest.mark.parametrize('shape', [(200, 200, 1), (80, 80, 80)])
+@pytest.mark.parametrize('sigma', [2.0, 5.0])
+def test_control_grid_field(shape, sigma):
+    np.random.seed(0)
+    field = get_control_grid_field(shape, sigma)
+    assert field.shape == shape
+
+    # Same statistics as the smoothed noise
+    std, corr = _get_field_stats(field, sigma)
+    std_ref, corr_ref = _get_field_stats(gaussian_filter(np.random.rand(*shape) * 2 - 1, sigma, mode="constant"),
+                                         sigma)
+    assert abs(std / std_ref - 1) < 0.25
+    assert abs(corr - corr_ref) < 0.1
+
+
 @pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 0, 1, rad_max=10),
                                     create_test_image(100, 100, 100, 1, rad_max=10)])
 @pytest.mark.parametrize('dilate_transform', [DilateGT(dilation_factor=0.3)])
@@ -422,6 +484,142 @@ def test_RandomReverse(im_seg, reverse_transform):
     _check_shape(seg, [do_seg])
 
 
+@pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 0, 1, rad_max=10),
+                                    create_test_image(100, 100, 100, 1, rad_max=10)])
+def test_ComposedGeometry(im_seg):
+    im, seg = im_seg
+    affine = RandomAffine(degrees=10, translate=[0.1, 0.1], scale=[0.1, 0.1])
+    reverse = RandomReverse()
+    transform = ComposedGeometry([affine, reverse])
+    metadata_in = [SampleMetadata({}) for _ in im]
+
+    # Transform on Numpy
+    do_im, metadata_do = transform([im[0].copy(), im[0].copy()], metadata_in + [SampleMetadata({})])
+    do_seg, metadata_do_seg = transform(seg.copy(), metadata_do)
+    _check_dtype(im, [do_im])
+    _check_shape(im, [do_im])
+    _check_dtype(seg, [do_seg])
+    _check_shape(seg, [do_seg])
+    # The coordinate map is computed once, and applied to all the channels and to the GT
+    assert np.array_equal(do_im[0], do_im[1])
+    assert metadata_do_seg[0][MetadataKW.COMPOSED_GEOMETRY] is metadata_do[0][MetadataKW.COMPOSED_GEOMETRY]
+
+    # Same result as the transforms applied one after the other, with the same parameters
+    seq_seg, _ = affine(seg.copy(), metadata_do)
+    seq_seg, _ = reverse(seq_seg, metadata_do)
+    assert np.allclose(do_seg[0], seq_seg[0], atol=1e-3)
+
+    # The transforms are undone one after the other, without the coordinate map
+    imed_loader_utils.clear_sample_transform_params(metadata_do, metadata_do_seg)
+    assert MetadataKW.COMPOSED_GEOMETRY not in metadata_do[0] and MetadataKW.COMPOSED_GEOMETRY not in metadata_do_seg[0]
+    assert MetadataKW.ROTATION in metadata_do[0]
+    undo_seg, _ = transform.undo_transform(do_seg, metadata_do)
+    _check_shape(seg, [undo_seg])
+    assert dice_score(undo_seg[0], seg[0]) > 0.85
+
+
+@pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 0, 1, rad_max=10),
+                                    create_test_image(100, 100, 100, 1, rad_max=10)])
+def test_ComposedGeometry_elastic(im_seg):
+    im, seg = im_seg
+    elastic = ElasticTransform(alpha_range=[150.0, 250.0], sigma_range=[100 * 0.06, 100 * 0.09], p=1)
+    transform = ComposedGeometry([RandomAffine(degrees=10), elastic])
+    metadata_in = [SampleMetadata({}) for _ in im]
+
+    # The GT gets the same elastic deformation as the image
+    seg_float = [s.astype(np.float32) for s in seg]
+    do_im, metadata_do = transform([s.copy() for s in seg_float], metadata_in)
+    metadata_seg = imed_loader_utils.update_metadata(metadata_do, [SampleMetadata({})])
+    do_seg, _ = transform([s.copy() for s in seg_float], metadata_seg)
+    assert np.array_equal(do_im[0], do_seg[0])
+    assert not np.array_equal(do_im[0], seg_float[0])
+
+
+def test_Compose_geometry():
+    dict_transforms = {"RandomAffine": {"degrees": 5}, "ElasticTransform": {"alpha_range": [28.0, 30.0],
+                                                                             "sigma_range": [3.5, 4.5], "p": 0.1},
+                       "NormalizeInstance": {"applied_to": ["im"]}, "RandomReverse": {}}
+    transform = Compose(dict_transforms, compose_geometry=True)
+    list_tr_im = transform.transform["im"].transforms
+    assert [type(tr) for tr in list_tr_im] == [ComposedGeometry, NormalizeInstance, ComposedGeometry]
+    assert [type(tr) for tr in list_tr_im[0].transforms] == [RandomAffine, ElasticTransform]
+    assert [type(tr) for tr in transform.transform["gt"].transforms] == [ComposedGeometry]
+    assert len(transform.transform["gt"].transforms[0].transforms) == 3
+    assert len(Compose(dict_transforms).transform["im"].transforms) == 4
+
+
+@pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 0, 1, rad_max=10),
+                                    create_test_image(100, 100, 100, 1, rad_max=10)])
+def test_Compose_geometry_alignment(im_seg):
+    im, seg = im_seg
+    # The runs of spatial transforms differ between the image and the GT
+    dict_transforms = {"RandomAffine": {"degrees": 10, "translate": [0.1, 0.1], "scale": [0.1, 0.1]},
+                       "NormalizeInstance": {"applied_to": ["im"]}, "RandomReverse": {}}
+    transform = Compose(dict_transforms, compose_geometry=True)
+    assert len(transform.transform["im"].transforms) == 3 and len(transform.transform["gt"].transforms) == 1
+
+    np.random.seed(0)
+    seg_float = [s.astype(np.float32) for s in seg]
+    do_im, metadata_im = transform([s.copy() for s in seg_float], [SampleMetadata({})], data_type="im")
+    metadata_gt = imed_loader_utils.update_metadata(metadata_im, [SampleMetadata({})])
+    do_gt, metadata_gt = transform([s.copy() for s in seg_float], metadata_gt, data_type="gt")
+    assert MetadataKW.REVERSE in metadata_im[0] and MetadataKW.REVERSE in metadata_gt[0]
+
+    # The image and the GT get the same spatial transforms
+    im_np, gt_np = do_im[0].numpy(), do_gt[0].numpy()
+    assert dice_score(im_np > (im_np.min() + im_np.max()) / 2, gt_np > 0.5) > 0.95
+    undo_gt, _ = UndoCompose(transform)(do_gt, metadata_gt, data_type="gt")
+    assert dice_score(undo_gt[0] > 0.5, seg[0]) > 0.85
+
+
+def test_Compose_timer():
+    timer = TransformTimer()
+    transform = Compose({"CenterCrop": {"size": [40, 40]}, "NormalizeInstance": {"applied_to": ["im"]}}, timer=timer)
+    im = [np.random.rand(50, 60).astype(np.float32) for _ in range(2)]
+    for _ in range(3):
+        do_im, metadata = transform(im, [SampleMetadata({MetadataKW.CROP_PARAMS: {}}) for _ in im], data_type="im")
+    transform([np.zeros((50, 60), dtype=np.uint8)], [SampleMetadata({MetadataKW.CROP_PARAMS: {}})], data_type="gt")
+    UndoCompose(transform)(do_im, metadata, data_type="im")
+
+    stats = timer.get_stats()
+    assert set(stats["im"]) == {"CenterCrop", "NormalizeInstance", "NumpyToTensor", "CenterCrop.undo_transform",
+                                "NormalizeInstance.undo_transform", "NumpyToTensor.undo_transform"}
+    assert set(stats["gt"]) == {"CenterCrop", "NumpyToTensor"}
+    assert stats["im"]["CenterCrop"]["calls"] == 3
+    assert stats["im"]["CenterCrop"]["mean_size"] == 2 * 50 * 60
+    assert stats["im"]["NormalizeInstance"]["mean_size"] == 2 * 40 * 40
+    assert stats["im"]["CenterCrop"]["time"] >= stats["im"]["CenterCrop"]["mean_time"] > 0
+    assert MetadataKW.TRANSFORM_TIMINGS not in metadata[0]
+
+    timer.reset()
+    assert timer.get_stats() == {}
+
+
+class _TimedDataset(Dataset):
+    def __init__(self, transform):
+        self.transform = transform
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        sample, metadata = self.transform([np.random.rand(20, 20).astype(np.float32)], [SampleMetadata({})])
+        return {'input': sample, 'input_metadata': metadata}
+
+
+def test_TransformTimer_workers():
+    timer = TransformTimer()
+    ds = _TimedDataset(Compose({"NormalizeInstance": {}}, timer=timer))
+    loader = DataLoader(ds, batch_size=2, num_workers=1, collate_fn=imed_loader_utils.imed_collate)
+    for batch in loader:
+        # The calls of the workers are saved in the metadata
+        assert MetadataKW.TRANSFORM_TIMINGS in batch['input_metadata'][0][0]
+        timer.update([batch['input_metadata'], None])
+        assert MetadataKW.TRANSFORM_TIMINGS not in batch['input_metadata'][0][0]
+    assert timer.get_stats()["im"]["NormalizeInstance"]["calls"] == 4
+    assert timer.get_stats()["im"]["NumpyToTensor"]["calls"] == 4
+
+
 @pytest.mark.parametrize('im_seg', [create_test_image(100, 100, 0, 1, rad_max=10),
                                     create_test_image(100, 100, 100, 1, rad_max=10)])
 @pytest.mark.parametrize('noise_transform', [AdditiveGaussianNoise(mean=1., std=0.01)])